@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """ FirmwareUploader
-    Quick Wrapper to move us into the FirmwareUploader/ directory
+    Quick Wrapper to run FirmwareUploader/ in this interpreter
+    Use --noUI or --daemon as the first argument for the headless tools
 
     Author: Matt Lloyd
     Author: Marcos Amorim
@@ -21,13 +22,7 @@
 
 """
 import os
-import sys
-import inspect
-args = sys.argv[:]
-args[0] = 'FirmwareUploader.py'
-args.insert(0, sys.executable)
-if sys.platform == 'win32':
-    args = ['"%s"' % arg for arg in args]
+import runpy
 
-os.chdir(os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe()))) + '/FirmwareUploader/')
-os.execv(sys.executable, args)
+runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'FirmwareUploader'),
+               run_name='__main__')
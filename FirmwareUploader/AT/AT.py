@@ -23,12 +23,22 @@ import sys
 from time import time, sleep, gmtime, strftime
 import serial
 import logging
+from contextlib import contextmanager
+import Trace
+
+class CancelledError(Exception):
+    """ Raised by the waits and reads of AT (and FW) once the
+        event given to AT has been set by another thread
+    """
+    pass
 
 class AT():
 
     _inATMode = False
+    _waiting = False #inside waiting(), the port timeout is restored when it ends
+    timeoutSlack = 0.05 #seconds a read may end past its deadline before the port timeout is lowered
 
-    def __init__(self, serialHandle=None, logger=None, event=None):
+    def __init__(self, serialHandle=None, logger=None, event=None, trace=None, lineControl=None):
         self._serial = serialHandle or serial.Serial()
         if logger == None:
             logging.basicConfig(level=logging.DEBUG)
@@ -36,7 +46,9 @@ class AT():
         else:
             self.logger = logger
 
-        self.event = event
+        self.event = event #set by another thread to cancel any wait or read
+        self.trace = trace or Trace.Trace()
+        self.lineControl = lineControl
 
     def __del__(self):
         pass
@@ -57,11 +69,61 @@ class AT():
             self._sleep(0.1)
             return True
 
+    def setSerial(self, serialHandle):
+        """ Uses another (already open) serial handle
+        """
+        self._serial = serialHandle
+
+    def checkCancelled(self):
+        """ Raises CancelledError if the event was set
+        """
+        if self.event and self.event.is_set():
+            raise CancelledError("Cancelled")
+
+    @contextmanager
+    def waiting(self, deadline):
+        """ Groups the reads of one wait up to deadline (a time() value),
+            the port timeout they lower is restored once when the wait
+            ends, instead of after every read
+        """
+        if self._waiting:
+            yield
+            return
+        timeout = self._serial.timeout
+        self._waiting = True
+        try:
+            yield
+        finally:
+            self._waiting = False
+            if self._serial.timeout != timeout:
+                self._serial.timeout = timeout
+
+    def readUntil(self, deadline, size=1):
+        """ Reads up to size bytes, giving up at deadline (a time() value)
+            The port timeout is lowered to the time left when it would
+            overrun the deadline by more than timeoutSlack, so setting it
+            (a reconfiguration of the port) is rare within a wait
+            Raises CancelledError if cancelled before or during the read
+        """
+        self.checkCancelled()
+        remaining = deadline - time()
+        if remaining <= 0:
+            return ''
+        with self.waiting(deadline):
+            timeout = self._serial.timeout
+            if timeout is None or timeout > remaining + self.timeoutSlack:
+                self._serial.timeout = remaining
+            data = self._serial.read(size)
+        self.checkCancelled()
+        return data
+
     def _sleep(self, time):
         """ Sleep Helper to use therading event or sleep
+            Raises CancelledError if the event is set
         """
         if self.event:
             self.event.wait(time)
+            self.checkCancelled()
         else:
             sleep(time)
 
@@ -76,9 +138,14 @@ class AT():
             To enter AT mode we wait 1 seconds send +++
             wait 1 second
             we should get back an "OK\r"
+            With a line control driver the AT line is tried first
+            and the guard times are only used if the radio does not answer
         """
         self.logger.debug("AT: Enter Command Mode")
+        if self._enterATModeByLine():
+            return True
         for r in range(retries):
+            self.trace.record(self.trace.AT_ENTER, r + 1)
             self._serial.flushInput()
 
             self._sleep(1)
@@ -94,6 +161,22 @@ class AT():
                 return True
         return False
 
+    def _enterATModeByLine(self):
+        """ Asserts the AT line and checks the radio answers to "AT"
+        """
+        if not self.lineControl or not self.lineControl.atMode(True):
+            return False
+        self.trace.record(self.trace.AT_LINE, 1)
+        self._sleep(0.05)
+        self._serial.flushInput()
+        self._inATMode = True
+        if self.sendATWaitForOK("AT", 0.5, 1):
+            return True
+        self._inATMode = False
+        self.lineControl.atMode(False)
+        self.trace.record(self.trace.AT_LINE, 0)
+        return False
+
     def leaveATMode(self):
         """ Leave AT commnand Mode
             there are two ways to leave AT Mode
@@ -101,6 +184,8 @@ class AT():
             or wait the 5 second timeout
         """
         self.logger.debug("AT: Leave Command Mode")
+        if self.lineControl and self.lineControl.atMode(False):
+            self.trace.record(self.trace.AT_LINE, 0)
         if self._inATMode:
             self.sendATWaitForOK("ATDN", 5)
         return True
@@ -108,7 +193,7 @@ class AT():
     def sendAT(self, command):
         """ Send and AT command
         """
-        self.logger.debug("AT: Send command: {}".format(command))
+        self.trace.record(self.trace.AT_SEND, self.trace.intern(command))
         if self._inATMode:
             self._serial.flushInput();
             self._serial.write("{}\r".format(command))
@@ -137,33 +222,34 @@ class AT():
     def waitForOK(self, timeout=1.5):
         """ wait/look for an "OK\r" from the radio
         """
-        self.logger.debug("AT: Wait for OK")
-        starttime = time()
+        self.trace.record(self.trace.AT_WAIT_OK)
+        deadline = time() + timeout
         if not self._inATMode:
-            while (time() - starttime) < timeout:
-                if self._serial.read() == 'O':
-                    if self._serial.read() == 'K':
-                        if self._serial.read() == '\r':
-                            self.logger.debug("AT: Got OK")
-                            return True
-            self.logger.debug("AT: OK timed out")
+            with self.waiting(deadline):
+                while time() < deadline:
+                    if self.readUntil(deadline) == 'O':
+                        if self.readUntil(deadline) == 'K':
+                            if self.readUntil(deadline) == '\r':
+                                self.trace.record(self.trace.AT_OK)
+                                return True
+            self.trace.record(self.trace.AT_TIMEOUT)
             return False
         else:
             buf = ""
             char = ""
-            while (time() - starttime) < timeout and char != "\r":
-                char = self._serial.read()
-                #self.logger.debug("AT: RX:{}".format(char))
-                buf += char
+            with self.waiting(deadline):
+                while time() < deadline and char != "\r":
+                    char = self.readUntil(deadline)
+                    buf += char
 
             if "OK\r" in buf:
-                self.logger.debug("AT: Got OK")
+                self.trace.record(self.trace.AT_OK)
                 return True
             elif "ERR\r" in buf:
-                self.logger.debug("AT: Got ERR")
+                self.trace.record(self.trace.AT_ERR)
                 return False
             else:
-                self.logger.debug("AT: OK timed out")
+                self.trace.record(self.trace.AT_TIMEOUT)
                 return False
 
     def sendATWaitForResponse(self, command, timeout=1.5, retries=3):
@@ -189,27 +275,28 @@ class AT():
         """ wait/look for response from the radio
         """
 
-        self.logger.debug("AT: Wait for Response")
-        starttime = time()
+        deadline = time() + timeout
         buf = ""
         char = ""
-        while (time() - starttime) < timeout:
-            char = self._serial.read()
-            if char == '\r':
-                break
-            # self.logger.debug("AT: RX:{}".format(char))
-            buf += char
+        with self.waiting(deadline):
+            while time() < deadline:
+                char = self.readUntil(deadline)
+                if char == '\r':
+                    break
+                buf += char
 
         ### receive the first line, if there's no info (or ERR), return False
         if buf == "":
-            self.logger.debug("AT: OK timed out")
+            self.trace.record(self.trace.AT_TIMEOUT)
             return False
         elif buf == "OK":
             return False
         elif buf == "ERR":
-            self.logger.debug("AT: Got ERR")
+            self.trace.record(self.trace.AT_ERR)
             return False
 
+        self.trace.record(self.trace.AT_RESPONSE, self.trace.intern(buf))
+
         #receive the second line (expecting 'OK\r') to make sure that the data received is valid
         if self.waitForOK():
             return buf
@@ -1,3 +1,3 @@
-from AT import AT
+from AT import AT, CancelledError
 
-__ALL__ = ['AT']
+__ALL__ = ['AT', 'CancelledError']
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" AsyncLog Classes
+    Logging that never makes the thread logging wait for the console or
+    the disk, the serial threads only put their records on a queue and a
+    background thread hands them to the real handlers
+    (Python 2.7 has no logging.handlers.QueueHandler)
+
+        QueueHandler      puts the records on a queue, drops them if it is full
+        QueueListener     thread passing the queued records to the handlers
+        CompressedRotatingFileHandler  log file rotated by size and/or age,
+                          the old files are gzip compressed
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import os
+import gzip
+import shutil
+import logging
+import logging.handlers
+import threading
+import Queue
+from time import time
+
+class QueueHandler(logging.Handler):
+
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+        self.dropped = 0 #records lost because the queue was full
+
+    def prepare(self, record):
+        """ Merges the message with its arguments and the exception text,
+            the record can then be formatted on another thread
+        """
+        record.msg = self.format(record)
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+    def emit(self, record):
+        try :
+            self.queue.put_nowait(self.prepare(record))
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+class QueueListener():
+
+    _stop = None #put on the queue to end the thread
+
+    def __init__(self, handlers, maxsize=10000):
+        """ handlers get the records with their own level applied,
+            handler is the QueueHandler to add to the loggers
+        """
+        self.handlers = list(handlers)
+        self.queue = Queue.Queue(maxsize)
+        self.handler = QueueHandler(self.queue)
+        self.handler.setLevel(min(h.level for h in self.handlers) if self.handlers else logging.NOTSET)
+        self._thread = None
+        self._reported = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='AsyncLog')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is self._stop:
+                return
+            self._reportDropped(record)
+            self.handle(record)
+
+    def _reportDropped(self, record):
+        dropped = self.handler.dropped
+        if dropped != self._reported:
+            notice = logging.makeLogRecord({'name': record.name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                                            'msg': "{} log records dropped".format(dropped - self._reported)})
+            self._reported = dropped
+            self.handle(notice)
+
+    def handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def stop(self, timeout=5.0):
+        """ Writes the records still queued and ends the thread
+        """
+        if not self._thread:
+            return
+        try :
+            self.queue.put(self._stop, timeout=timeout)
+        except Queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+        for handler in self.handlers:
+            handler.flush()
+
+class CompressedRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+
+    def __init__(self, filename, maxBytes=0, interval=0, backupCount=5, compress=True, encoding=None):
+        """ The file is rotated when it would grow past maxBytes or
+            every interval seconds (0 turns either off), keeping
+            backupCount old files, gzip compressed with compress
+        """
+        logging.handlers.BaseRotatingHandler.__init__(self, filename, 'a', encoding)
+        self.maxBytes = maxBytes
+        self.interval = interval
+        self.backupCount = backupCount
+        self.compress = compress
+        started = os.path.getmtime(self.baseFilename) if os.path.exists(self.baseFilename) else time()
+        self.rolloverAt = started + interval
+
+    def shouldRollover(self, record):
+        if self.interval and time() >= self.rolloverAt:
+            return True
+        if self.maxBytes:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.seek(0, 2)
+            return self.stream.tell() + len(self.format(record)) + 1 >= self.maxBytes
+        return False
+
+    def _backupName(self, index):
+        return "{}.{}{}".format(self.baseFilename, index, '.gz' if self.compress else '')
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        if self.backupCount > 0:
+            for index in range(self.backupCount - 1, 0, -1):
+                if os.path.exists(self._backupName(index)):
+                    if os.path.exists(self._backupName(index + 1)):
+                        os.remove(self._backupName(index + 1))
+                    os.rename(self._backupName(index), self._backupName(index + 1))
+            if os.path.exists(self.baseFilename):
+                if self.compress:
+                    with open(self.baseFilename, 'rb') as source:
+                        with gzip.open(self._backupName(1), 'wb') as target:
+                            shutil.copyfileobj(source, target)
+                    os.remove(self.baseFilename)
+                else:
+                    if os.path.exists(self._backupName(1)):
+                        os.remove(self._backupName(1))
+                    os.rename(self.baseFilename, self._backupName(1))
+        elif os.path.exists(self.baseFilename):
+            os.remove(self.baseFilename)
+
+        self.stream = self._open()
+        self.rolloverAt = time() + self.interval
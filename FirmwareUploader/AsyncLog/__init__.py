@@ -0,0 +1,3 @@
+from AsyncLog import QueueHandler, QueueListener, CompressedRotatingFileHandler
+
+__ALL__ = ['QueueHandler', 'QueueListener', 'CompressedRotatingFileHandler']
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Catalog Class
+    Downloads the firmware catalog (firmwares.json) and the firmware images
+    listed on it, keeping them in memory for the next uploads
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import os
+import logging
+import threading
+import FW
+
+def firmwareFilename(deviceClass, fileBase, version, frequency, fileExtension) :
+    """
+        Builds the name of a firmware file as stored on the server
+    """
+    if deviceClass == 'LLAP' or deviceClass == 'LLAP2' :
+        return "{}{}-V{}-{}.bin".format(fileBase, fileExtension, version, frequency)
+    elif deviceClass == 'Serial' :
+        if fileExtension == '' : # if no fileExt, remove the last - from the filename
+            return "{}-V{}-{}.bin".format(fileBase, version, frequency)
+        return "{}-V{}-{}-{}.bin".format(fileBase, version, frequency, fileExtension)
+    elif deviceClass == 'USB':
+        if fileExtension == '': # if no fileExt, remove the last '-' from the filename
+            return "{}-V{}.bin".format(fileBase, version)
+        return "{}-V{}-{}.bin".format(fileBase, version, fileExtension)
+    return None
+
+def versionNumber(version) :
+    """
+        Removes the 0. of a catalog version ("0.94" -> "94"),
+        as the version is shown once parsed from ATVR
+    """
+    if '0.' in version :
+        version = version.split('.', 1)[1]
+    return version
+
+def _versionInt(version) :
+    try :
+        return int(versionNumber(version))
+    except ValueError :
+        return None
+
+def isOlder(version, latest) :
+    """
+        True when the version of a device is older than latest, compared
+        as numbers ("94" < "100"), a version that is not a number is
+        only up to date when it is the same as latest
+    """
+    if not version :
+        return True
+    number, latestNumber = _versionInt(version), _versionInt(latest)
+    if number is None or latestNumber is None :
+        return versionNumber(version) != versionNumber(latest)
+    return number < latestNumber
+
+class Catalog():
+
+    _deviceClasses = ['USB', 'LLAP', 'LLAP2', 'Serial']
+
+    def __init__(self, urlPath, jsonFile, logger=None):
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+        self._urlPath = urlPath
+        self._jsonFile = jsonFile
+        self._lock = threading.Lock()
+        self._images = {}
+        self._files = {}
+        self.classes = {}
+        self.devices = {}
+        self.loaded = False
+
+    def download(self, path) :
+        """
+            Downloads a file from the firmware server
+            Returns the status (200 when successful, otherwise
+            the error code or reason) and the contents of the file
+        """
+        import urllib2 #imported here so headless runs using local files never load it
+        import httplib
+        try:
+            request = urllib2.urlopen(self._urlPath + path)
+            data = request.read()
+        except urllib2.HTTPError as e:
+            self.logger.error('Unable to get file - HTTPError = ' + str(e.code))
+            return e.code, None
+        except urllib2.URLError as e:
+            self.logger.error('Unable to get file - URLError = ' + str(e.reason))
+            return e.reason, None
+        except httplib.HTTPException as e:
+            self.logger.error('Unable to get file - HTTPException')
+            return 'HTTPException', None
+        except Exception as e:
+            import traceback
+            self.logger.critical('Unable to get file - Exception = ' + traceback.format_exc())
+            return traceback.format_exc(), None
+
+        return request.getcode(), data
+
+    def load(self) :
+        """
+            Downloads and parses the catalog, returns the download status
+        """
+        import json
+        status, data = self.download(self._jsonFile)
+        if str(status) != '200' :
+            return status
+
+        try :
+            catalog = json.loads(data)
+            classes = dict((c, catalog[c]) for c in self._deviceClasses)
+            devices = catalog['Devices']
+        except (ValueError, KeyError) :
+            self.logger.error("Catalog: Could Not Load JSON File")
+            return 'Invalid JSON File'
+
+        with self._lock :
+            self.classes = classes
+            self.devices = devices
+            self._images = {}
+            self.loaded = True
+        return status
+
+    def latestVersion(self, deviceClass) :
+        """
+            Returns the newest version listed for a device class
+        """
+        return max(self.classes[deviceClass]['Versions'], key=lambda version: (_versionInt(version), version))
+
+    def findDevice(self, fwName, deviceName=None) :
+        """
+            Finds a device entry by the firmware name (as reported by ATVR)
+            and, when more than one device uses it, the device name
+            Returns the device class and the device entry (or None, None)
+        """
+        try :
+            devices = self.devices[fwName]
+        except KeyError :
+            return None, None
+
+        for dev in devices['Devices'] :
+            if deviceName is None or dev['Name'] == deviceName :
+                if deviceName is None and len(devices['Devices']) > 1 :
+                    self.logger.error("Catalog: {} is used by more than one device".format(fwName))
+                    return None, None
+                return devices['Device Class'], dev
+        return None, None
+
+    def deviceNames(self, fwName) :
+        """
+            Returns the names of the devices using a firmware
+        """
+        try :
+            return [dev['Name'] for dev in self.devices[fwName]['Devices']]
+        except KeyError :
+            return []
+
+    def resolve(self, fwName, deviceName=None, version=None, bootloaderFolder='BootloaderV3') :
+        """
+            Returns the server path of the firmware image for a device,
+            using the latest version when none is given (or None if not found)
+        """
+        deviceClass, dev = self.findDevice(fwName, deviceName)
+        if deviceClass is None :
+            return None
+        if version is None :
+            version = self.latestVersion(deviceClass)
+        filename = firmwareFilename(deviceClass, self.classes[deviceClass]['FileBase'],
+                                    version, dev['Frequency'], dev['Filename Extension'])
+        return bootloaderFolder + '/' + deviceClass + '/' + filename
+
+    def isCurrent(self, fwName, fwVersion, deviceName=None, version=None) :
+        """
+            True when a device running fwName at fwVersion (the version
+            number from ATVR) already has the given version of its
+            firmware, the latest one when no version is given
+        """
+        deviceClass, dev = self.findDevice(fwName, deviceName)
+        if deviceClass is None or not fwVersion :
+            return False
+        if version is None :
+            version = self.latestVersion(deviceClass)
+        return versionNumber(version) == versionNumber(fwVersion)
+
+    def currentCheck(self, fwName=None, deviceName=None, version=None) :
+        """
+            Returns a function telling from a DeviceIdentity if the device
+            can be skipped, being already on the version that would be
+            uploaded, fwName is the catalog firmware that would be uploaded
+            (a device running another firmware is never current)
+        """
+        def check(identity) :
+            if fwName and identity.fwName != fwName :
+                return False
+            return self.isCurrent(identity.fwName, identity.fwVersion, deviceName, version)
+        return check
+
+    def getImage(self, path) :
+        """
+            Returns the status and the lines of a firmware image from the
+            server, downloading it only the first time it is asked for
+        """
+        with self._lock :
+            if path in self._images :
+                return 200, self._images[path]
+
+        status, data = self.download(path)
+        if str(status) != '200' :
+            return status, None
+
+        firmware = data.splitlines()
+        if not FW.checkFirmwareLines(firmware, self.logger) :
+            return 'Invalid Firmware File', None
+
+        with self._lock :
+            self._images[path] = firmware
+        return status, firmware
+
+    def loadFile(self, fileName) :
+        """
+            Returns the lines of a local firmware file, reading it again
+            only if it changed since the last time (or False if fails)
+        """
+        try :
+            mtime = os.path.getmtime(fileName)
+        except OSError as e :
+            self.logger.error("Catalog: Could not open firmware file {}: {}".format(fileName, e.strerror))
+            return False
+
+        with self._lock :
+            cached = self._files.get(fileName)
+            if cached and cached[0] == mtime :
+                return cached[1]
+
+        firmware = FW.readFirmwareFile(fileName, self.logger)
+        if firmware :
+            with self._lock :
+                self._files[fileName] = (mtime, firmware)
+        return firmware
@@ -0,0 +1,3 @@
+from Catalog import Catalog, firmwareFilename, versionNumber, isOlder
+
+__ALL__ = ['Catalog', 'firmwareFilename', 'versionNumber', 'isOlder']
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Dashboard Class
+    Window listing every serial port with the device found on it, the
+    ports selected are flashed at the same time, each one in a FlashJob
+    on its own thread with its own progress bar, speed and status
+    The jobs only report through their result, progress() and an event
+    queue, the window polls them from the Tk main loop
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import logging
+import threading
+import Queue
+from time import time
+import Tkinter as tk
+import ttk
+import tkFileDialog
+import FlashJob
+import Inventory
+
+class Dashboard(tk.Toplevel):
+
+    refresh = 250 #ms between updates of the rows
+    columns = ('', 'Port', 'Device', 'Version', 'Progress', 'Speed', 'Status')
+
+    def __init__(self, master, catalog, jobOptions=None, portStats=None, logger=None, jobs=8):
+        """ catalog is the loaded Catalog the latest firmware of each
+            device is taken from, jobOptions are given to every FlashJob
+            (baudrate, transferBaudrate, timeout...), at most jobs ports
+            are flashed at the same time
+        """
+        tk.Toplevel.__init__(self, master)
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+        self.catalog = catalog
+        self.portStats = portStats
+        self.jobOptions = jobOptions or {}
+        self._slots = threading.Semaphore(max(1, jobs))
+        self._events = Queue.Queue()
+        self._rows = {} #port -> widgets and state of its row
+        self._nextRow = 1 #grid row of the next port, rows of removed ports are not reused
+        self._scanning = False
+
+        self.title("Devices")
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        toolbar = tk.Frame(self)
+        toolbar.pack(fill=tk.X, padx=4, pady=4)
+        self._scanButton = tk.Button(toolbar, text='Scan', command=self.scan)
+        self._scanButton.pack(side=tk.LEFT)
+        tk.Button(toolbar, text='Select all', command=self.selectAll).pack(side=tk.LEFT)
+        tk.Button(toolbar, text='Flash selected', command=self.flashSelected).pack(side=tk.LEFT)
+        tk.Button(toolbar, text='Stop', command=self.stop).pack(side=tk.LEFT)
+
+        images = tk.Frame(self)
+        images.pack(fill=tk.X, padx=4)
+        self._fileName = tk.StringVar()
+        self._useFile = tk.IntVar()
+        self._skipCurrent = tk.IntVar(value=1)
+        tk.Radiobutton(images, text='Latest firmware of each device', variable=self._useFile,
+                       value=0).pack(side=tk.LEFT)
+        tk.Radiobutton(images, text='File', variable=self._useFile, value=1).pack(side=tk.LEFT)
+        tk.Entry(images, textvariable=self._fileName, width=30).pack(side=tk.LEFT)
+        tk.Button(images, text='...', command=self._chooseFile).pack(side=tk.LEFT)
+        tk.Checkbutton(images, text='Skip current devices', variable=self._skipCurrent).pack(side=tk.LEFT)
+
+        self._table = tk.Frame(self, relief=tk.SUNKEN, bd=1)
+        self._table.pack(fill=tk.BOTH, expand=True, padx=4, pady=4)
+        for column, title in enumerate(self.columns):
+            tk.Label(self._table, text=title).grid(row=0, column=column, sticky=tk.W, padx=2)
+
+        self._message = tk.StringVar()
+        tk.Label(self, textvariable=self._message, anchor=tk.W).pack(fill=tk.X, padx=4)
+
+        self._job = self.after(self.refresh, self._update)
+        self.scan()
+
+    def _chooseFile(self):
+        fileName = tkFileDialog.askopenfilename(parent=self, filetypes=[('Firmware', '*.bin'), ('All', '*')])
+        if fileName:
+            self._fileName.set(fileName)
+            self._useFile.set(1)
+
+    def _running(self, port):
+        row = self._rows.get(port)
+        return bool(row and row['thread'] and row['thread'].is_alive())
+
+    def scan(self):
+        """ Identifies the devices on every port not being flashed,
+            in the background
+        """
+        if self._scanning:
+            return
+        self._scanning = True
+        self._scanButton.config(state=tk.DISABLED)
+        self._message.set("Scanning the serial ports...")
+        running = set(port for port in self._rows if self._running(port))
+        inventory = Inventory.Inventory(self.catalog, baudrate=self.jobOptions.get('baudrate', 9600),
+                                        logger=self.logger, portStats=self.portStats)
+
+        def probe():
+            # listing the ports opens each of them, keep it off the Tk main loop
+            try :
+                ports = [port for port in Inventory.listSerialPorts() if port not in running]
+                self._events.put(('scan', inventory.probe(ports)))
+            except Exception:
+                self.logger.exception("Dashboard: scan failed")
+                self._events.put(('scan', []))
+        thread = threading.Thread(target=probe)
+        thread.daemon = True
+        thread.start()
+
+    def _showEntries(self, entries):
+        self._scanning = False
+        self._scanButton.config(state=tk.NORMAL)
+        found = set()
+        for entry in entries:
+            found.add(entry['port'])
+            row = self._rows.get(entry['port']) or self._addRow(entry['port'])
+            row['entry'] = entry
+            if entry['busy']:
+                row['device'].set('')
+                row['version'].set('')
+                row['status'].set('busy')
+            elif not entry['found']:
+                row['device'].set('')
+                row['version'].set('')
+                row['status'].set('no device')
+            else:
+                row['device'].set(entry['device'] or entry['firmware'] or '-')
+                if entry['inBootloader']:
+                    row['version'].set('bootloader')
+                else:
+                    row['version'].set(entry['version'])
+                if entry['updateAvailable']:
+                    row['status'].set('update available' + (' ({})'.format(entry['latest']) if entry['latest'] else ''))
+                else:
+                    row['status'].set('current' if entry['latest'] else '')
+            row['bar']['value'] = 0
+            row['speed'].set('')
+
+        for port in list(self._rows):
+            if port not in found and not self._running(port):
+                self._removeRow(port)
+        self._message.set("{} ports, {} devices found".format(len(entries), len([e for e in entries if e['found']])))
+
+    def _addRow(self, port):
+        index = self._nextRow
+        self._nextRow += 1
+        row = {'port': port, 'entry': None, 'job': None, 'thread': None, 'started': None, 'cancelled': False,
+               'selected': tk.IntVar(), 'device': tk.StringVar(), 'version': tk.StringVar(),
+               'speed': tk.StringVar(), 'status': tk.StringVar()}
+        row['widgets'] = [
+            tk.Checkbutton(self._table, variable=row['selected']),
+            tk.Label(self._table, text=port),
+            tk.Label(self._table, textvariable=row['device']),
+            tk.Label(self._table, textvariable=row['version']),
+            ttk.Progressbar(self._table, orient='horizontal', mode='determinate', length=120),
+            tk.Label(self._table, textvariable=row['speed'], width=10),
+            tk.Label(self._table, textvariable=row['status'], width=28, anchor=tk.W),
+        ]
+        row['bar'] = row['widgets'][4]
+        for column, widget in enumerate(row['widgets']):
+            widget.grid(row=index, column=column, sticky=tk.W, padx=2)
+        self._rows[port] = row
+        return row
+
+    def _removeRow(self, port):
+        for widget in self._rows.pop(port)['widgets']:
+            widget.destroy()
+
+    def selectAll(self):
+        for row in self._rows.values():
+            if row['entry'] and row['entry']['found']:
+                row['selected'].set(1)
+
+    def flashSelected(self):
+        """ Starts a job on every selected port that is not running one
+        """
+        started = 0
+        for port, row in sorted(self._rows.items()):
+            if not row['selected'].get() or self._running(port):
+                continue
+            row['job'] = None
+            row['cancelled'] = False
+            row['bar']['value'] = 0
+            row['speed'].set('')
+            row['status'].set('queued')
+            row['thread'] = threading.Thread(target=self._flash, args=(row, row['entry'],
+                                             self._fileName.get() if self._useFile.get() else None,
+                                             bool(self._skipCurrent.get())))
+            row['thread'].daemon = True
+            row['thread'].start()
+            started += 1
+        self._message.set("Flashing {} devices".format(started) if started else "No device selected")
+
+    def _image(self, entry, fileName):
+        """ Returns the firmware lines for a device (or None and an error)
+        """
+        if fileName:
+            firmware = self.catalog.loadFile(fileName)
+            if not firmware:
+                return None, "Unable to read {}".format(fileName)
+            return firmware, None
+
+        if not entry or not entry['firmware']:
+            return None, "Unknown firmware, choose a file"
+        path = self.catalog.resolve(entry['firmware'])
+        if path is None:
+            return None, "No catalog entry, choose a file"
+        status, firmware = self.catalog.getImage(path)
+        if str(status) != '200':
+            return None, "Error downloading {}: {}".format(path, status)
+        return firmware, None
+
+    def _flash(self, row, entry, fileName, skipCurrent):
+        """ Runs on the thread of one port, always ends with a 'done' event
+        """
+        result = {'status': 'failed', 'error': None}
+        try :
+            with self._slots:
+                if row['cancelled']:
+                    result = {'status': 'cancelled', 'error': None}
+                    return
+                self._events.put(('status', row['port'], 'loading firmware'))
+                firmware, error = self._image(entry, fileName)
+                if firmware is None:
+                    result = {'status': 'failed', 'error': error}
+                    return
+
+                skipIfCurrent = None
+                if skipCurrent and not fileName:
+                    skipIfCurrent = self.catalog.currentCheck(entry['firmware'])
+                job = FlashJob.FlashJob(row['port'], firmware, logger=self.logger, portStats=self.portStats,
+                                        skipIfCurrent=skipIfCurrent, **self.jobOptions)
+                row['started'] = time()
+                row['job'] = job
+                if row['cancelled']:
+                    job.cancel()
+                result = job.run()
+        except Exception as e:
+            self.logger.exception("Dashboard: {} failed".format(row['port']))
+            result = {'status': 'failed', 'error': str(e)}
+        finally:
+            self._events.put(('done', row['port'], result))
+
+    def _update(self):
+        """ Applies the events of the jobs and their progress,
+            called from the Tk main loop
+        """
+        while True:
+            try :
+                event = self._events.get_nowait()
+            except Queue.Empty:
+                break
+            if event[0] == 'scan':
+                self._showEntries(event[1])
+            elif event[1] in self._rows:
+                row = self._rows[event[1]]
+                if event[0] == 'status':
+                    row['status'].set(event[2])
+                elif event[0] == 'done':
+                    self._showResult(row, event[2])
+
+        for row in self._rows.values():
+            job = row['job']
+            if not job or job.result['status'] != 'running':
+                continue
+            total = job.result['totalLines'] or 1
+            lines = job.progress()
+            row['bar']['maximum'] = total
+            row['bar']['value'] = min(lines, total)
+            elapsed = time() - row['started']
+            if elapsed > 0 and lines:
+                row['speed'].set("{:.1f} rec/s".format(lines / elapsed))
+            row['status'].set("flashing {}%".format(100 * min(lines, total) / total))
+
+        self._job = self.after(self.refresh, self._update)
+
+    def _showResult(self, row, result):
+        status = result['status']
+        if status == 'ok':
+            row['bar']['value'] = row['bar']['maximum']
+            row['selected'].set(0)
+            version = (result.get('fwVersion') or '').strip()
+            row['status'].set("ok {}".format(version).strip())
+            if version:
+                row['version'].set(version.split(' ', 1)[0])
+        elif status == 'skipped':
+            row['selected'].set(0)
+            row['status'].set("already current")
+        else:
+            row['status'].set("{}: {}".format(status, result['error']) if result.get('error') else status)
+        if result.get('elapsed') and result.get('lines'):
+            row['speed'].set("{:.1f} rec/s".format(result['lines'] / result['elapsed']))
+        if not any(self._running(port) for port in self._rows if self._rows[port] is not row):
+            self._message.set("Done")
+
+    def stop(self):
+        """ Cancels the queued and running jobs
+        """
+        for row in self._rows.values():
+            row['cancelled'] = True
+            if row['job']:
+                row['job'].cancel()
+
+    def close(self):
+        self.stop()
+        self.after_cancel(self._job)
+        self.destroy()
@@ -0,0 +1,3 @@
+from Dashboard import Dashboard
+
+__ALL__ = ['Dashboard']
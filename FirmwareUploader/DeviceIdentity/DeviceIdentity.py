@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" DeviceIdentity Class
+    Finds out the firmware and bootloader of a device in one pass,
+    polling the bootloader instead of waiting a fixed time for it
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import string
+import logging
+from time import time
+
+BOOTLOADER_VERSIONS = list("123456789") #answers to ~Y
+BOOTLOADER_SUBVERSIONS = list(string.ascii_letters) #answers to S
+
+def parseVersion(response):
+    """ Splits an ATVR response ("0.94B XRF\r") into the version
+        number ("94B"), with the letters, and the firmware name ("XRF")
+    """
+    version, _, name = response.partition(' ')
+    name = name.rsplit('\r', 1)[0] # removes the \r at end of fw name
+    if '0.' in version: #removes the 0. of the version number
+        version = version.split('.', 1)[1]
+    return version, name
+
+class DeviceIdentity():
+    """ Result of identify()
+    """
+
+    def __init__(self, port=None):
+        self.port = port
+        self.response = None #the ATVR response as received
+        self.fwVersion = None #version number only, 'Unknown' when found in bootloader mode
+        self.fwName = ''
+        self.oldDevice = False
+        self.usbMode = False
+        self.inBootloader = False #was already in bootloader mode
+        self.bootloaderVersion = None
+        self.bootloaderSubVersion = None
+        self.commFail = False
+        self.busy = None #who holds the port when it could not be opened
+        self.skipped = False #left alone by the skip check of identify()
+        self.error = None
+        self.elapsed = None
+
+    def setVersion(self, response):
+        """ Fills the firmware fields from an ATVR response
+        """
+        self.response = response
+        version, self.fwName = parseVersion(response)
+        if self.fwName == '' or "B" not in version:
+            self.oldDevice = True
+        elif "U" in version:
+            self.usbMode = True
+        self.fwVersion = version.split('B', 1)[0] #leaves only the version number
+
+    def setBootloaderVersion(self, version):
+        """ Takes the answer to ~Y, anything but a digit is a
+            communication failure and not an old bootloader
+        """
+        if not version.isdigit():
+            self.commFail = True
+            self.error = "Invalid bootloader version {!r}".format(version)
+            return
+        self.bootloaderVersion = int(version)
+        if self.bootloaderVersion < 3:
+            self.oldDevice = True
+
+    def isOldBootloader(self):
+        """ Bootloader 3 other than 3d must be updated first
+        """
+        return (self.bootloaderVersion == 3 and self.bootloaderSubVersion is not None and
+                self.bootloaderSubVersion not in ["d", "D"])
+
+    def needsBootloaderUpdate(self):
+        """ True for a device found in a bootloader older than 3d,
+            only from versions actually read from the bootloader
+        """
+        if self.bootloaderVersion is None or self.commFail:
+            return False
+        return self.bootloaderVersion < 3 or self.isOldBootloader()
+
+    def bootloaderFolder(self):
+        """ Server folder of the firmware images for this bootloader
+        """
+        if not self.bootloaderVersion:
+            return None
+        return 'BootloaderV{}'.format(self.bootloaderVersion)
+
+    def asDict(self):
+        return {
+            'port': self.port,
+            'response': self.response,
+            'fwVersion': self.fwVersion,
+            'fwName': self.fwName,
+            'oldDevice': self.oldDevice,
+            'usbMode': self.usbMode,
+            'inBootloader': self.inBootloader,
+            'bootloaderVersion': self.bootloaderVersion,
+            'bootloaderSubVersion': self.bootloaderSubVersion,
+            'oldBootloader': self.isOldBootloader(),
+            'needsBootloaderUpdate': self.needsBootloaderUpdate(),
+            'commFail': self.commFail,
+            'busy': self.busy,
+            'skipped': self.skipped,
+            'error': self.error,
+            'elapsed': self.elapsed,
+        }
+
+def _poll(fw, send, responses, timeout, interval=0.25):
+    """ Sends a bootloader command until one of responses is answered
+        or timeout, anything else (noise after a reset) is ignored,
+        returns the answer ('' if none)
+    """
+    deadline = time() + timeout
+    while time() < deadline:
+        received = fw.sendStrWaitingResponse(send, responses, retries=1,
+                                             timeout=min(interval, max(deadline - time(), 0.01)))
+        if received in responses:
+            return received
+    return ''
+
+def identify(session, inBootloader=False, enterBootloader=True, bootTimeout=2.0, logger=None, skip=None):
+    """ Identifies the device on an open SerialSession
+        Reads the firmware version in AT mode and, unless enterBootloader is
+        False, restarts the device in the bootloader and reads its version,
+        leaving the port at 9600 ready to upload
+        A device that does not answer in AT mode is looked for in the bootloader
+        skip(identity) is called once the firmware version is known, when it
+        returns True the bootloader is not entered and identity.skipped is set
+        Returns a DeviceIdentity
+    """
+    if logger == None:
+        logging.basicConfig(level=logging.DEBUG)
+        logger = logging.getLogger()
+
+    started = time()
+    identity = DeviceIdentity(session.port)
+    try:
+        _identify(session, identity, inBootloader, enterBootloader, bootTimeout, logger, skip)
+    finally:
+        identity.elapsed = round(time() - started, 3)
+    return identity
+
+def _identify(session, identity, inBootloader, enterBootloader, bootTimeout, logger, skip):
+    at = session.at
+    fw = session.fw
+
+    if not inBootloader:
+        if at.enterATMode():
+            response = fw.checkFWVersion()
+            if not response:
+                identity.commFail = True
+                identity.error = "Unable to check the FW version"
+                fw.exitATMode() #make sure device quit AT Mode
+                return
+            identity.setVersion(response)
+            logger.debug("{}: Firmware {}".format(session.port, response.strip()))
+
+            if not (identity.oldDevice or identity.usbMode) and skip and skip(identity):
+                logger.info("{}: Firmware {} is current, skipped".format(session.port, response.strip()))
+                identity.skipped = True
+
+            if identity.oldDevice or identity.usbMode or identity.skipped or not enterBootloader:
+                fw.exitATMode()
+                return
+
+            if not fw.enterProgramMode():
+                identity.commFail = True
+                identity.error = "enterProgramMode: Invalid response received"
+                return
+            if session.lineControl:
+                session.lineControl.atMode(False)
+        else:
+            logger.debug("{}: Failed to enter AT mode, checking if device is in bootloader mode".format(session.port))
+            inBootloader = True
+
+    session.reconfigure(9600) #the bootloader only talks at 9600
+
+    version = _poll(fw, "~Y", BOOTLOADER_VERSIONS, bootTimeout)
+    if not version and fw.resetToBootloader(): #the device stopped answering, restart it into the bootloader
+        version = _poll(fw, "~Y", BOOTLOADER_VERSIONS, bootTimeout)
+    if not version:
+        identity.commFail = True
+        if inBootloader:
+            identity.error = "Failed to enter on AT mode"
+        else:
+            identity.error = "checkBootloaderVersion: Error on enter in Bootloader mode"
+        return
+
+    if inBootloader:
+        identity.inBootloader = True
+        identity.fwVersion = 'Unknown'
+    identity.setBootloaderVersion(version)
+    logger.debug("{}: Bootloader Version: {}".format(session.port, version))
+
+    if identity.bootloaderVersion == 3: #the sub version tells if the bootloader must be updated
+        subVersion = _poll(fw, "S", BOOTLOADER_SUBVERSIONS, bootTimeout)
+        if not subVersion:
+            identity.commFail = True
+            identity.error = "Unable to check the bootloader sub version"
+            return
+        identity.bootloaderSubVersion = subVersion
+        logger.debug("{}: Sub Version: {}".format(session.port, subVersion))
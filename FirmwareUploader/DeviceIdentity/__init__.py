@@ -0,0 +1,3 @@
+from DeviceIdentity import DeviceIdentity, identify, parseVersion
+
+__ALL__ = ['DeviceIdentity', 'identify', 'parseVersion']
@@ -24,14 +24,47 @@ import serial
 import sys
 from time import time, sleep
 import AT
+import LineControl
 import logging
+from RetryPolicy import RetryPolicy
+
+def checkFirmwareLines(firmware, logger) :
+    """
+        Checks every line of a firmware image
+        has the length expected by the bootloader
+    """
+    for line in firmware:
+        if len(line) != 67 :
+            logger.error("FW: Line with invalid length of {} in firmware file\n".format(len(line)))
+            return False
+    return True
+
+def readFirmwareFile(fwFileName, logger) :
+    """
+        Reads and checks a FW File (.bin file),
+        returns the list of lines (or False if fails)
+    """
+    try :
+        f = open(fwFileName, "r")
+    except IOError as e:
+        logger.error("FW: Could not open firmware file {} for reading: {}\n".format(fwFileName,e.strerror))
+        return False
+    firmware = [line.rstrip() for line in f] #rstrip() removes the whitespaces \f , \n , \r , \t , \v , \x and blank on the end of the line
+    f.close()
+    if not checkFirmwareLines(firmware, logger):
+        return False
+    return firmware
 
 class FW():
 
     _device = "COM3"
     _timeout = 1.5 #timeout for receiving bytes functions
+    _line_number = 0 #line being sent by sendFirmware, read by the progress bars
+    _rttTotal = 0 #seconds between the records sent and their answers
+    _rttCount = 0
+    _refused = False #the last sendFirmware stopped on a record the device NAKed
 
-    def __init__(self, atHandle=None, serialHandle=None, logger=None, gpioPin=None, event=None):
+    def __init__(self, atHandle=None, serialHandle=None, logger=None, gpioPin=None, event=None, wireRecorder=None, retryPolicy=None, lineControl=None):
         if logger == None:
             logging.basicConfig(level=logging.DEBUG)
             self.logger = logging.getLogger()
@@ -39,12 +72,21 @@ class FW():
             self.logger = logger
 
         self.event = event
+        self.wireRecorder = wireRecorder
+        self.retryPolicy = retryPolicy or RetryPolicy()
+
+        if lineControl is None and gpioPin is not None:
+            lineControl = LineControl.SysfsGPIO(gpioPin, logger=self.logger)
+        if lineControl is None and atHandle is not None:
+            lineControl = atHandle.lineControl
+        self.lineControl = lineControl
 
         self._serial = serialHandle or self.startSerial(self._device, 9600, self._timeout)
         if not self._serial:
             sys.exit(1)
 
-        self._at = atHandle or AT.AT(self._serial, self.logger, gpioPin, self.event)
+        self._at = atHandle or AT.AT(self._serial, self.logger, event=self.event, lineControl=self.lineControl)
+        self.trace = self._at.trace
 
     def startSerial(self, port, baudrate, timeout) :
         """
@@ -57,6 +99,12 @@ class FW():
             self.logger.error ("Failed to open port {}: {}".format(self._device,e.strerror))
             return False
 
+        if self.wireRecorder:
+            ser = self.wireRecorder.tap(ser)
+
+        if self.lineControl:
+            self.lineControl.attach(ser)
+
         return ser
 
     def error(self, message, code=1) :
@@ -65,20 +113,23 @@ class FW():
             exits the program
         """
         self.logger.error(message)
+        self.trace.dump()
         self._at.endSerial()
         sys.exit(code)
 
-    def sendStrWaitingResponse(self, send, response, retries=3) :
+    def sendStrWaitingResponse(self, send, response, retries=3, timeout=_timeout) :
         """
             Sends an string through the serial port and
-            waits for their response
+            waits for their response, up to timeout seconds each try
         """
         retry = 0
         received = False
         while not received and retry < retries:
             self._serial.flushInput();
             self._serial.write(send)
-            received = self._serial.read()
+            self.trace.record(self.trace.FW_SEND, self.trace.intern(send))
+            received = self._at.readUntil(time() + timeout)
+            self.trace.record(self.trace.FW_RECEIVED, self.trace.char(received))
             retry += 1
 
             if received in response:
@@ -114,12 +165,52 @@ class FW():
 
         return self.sendStrWaitingResponse("~Y",["3","4"])
 
+    def resetToBootloader(self):
+        """
+            Restarts the device straight into the bootloader
+            with the line control, False if there is no reset line
+        """
+        if not self.lineControl or not self.lineControl.reset(bootloader=True):
+            return False
+        self.trace.record(self.trace.FW_RESET)
+        return True
+
     def checkBootloaderSubVersion(self):
         """
             Checks the Bootloader Version of the device
         """
         return self.sendStrWaitingResponse("S",["d","D"])
 
+    def measureRtt(self, count=5) :
+        """
+            Returns the average seconds the bootloader takes to answer
+            the version probe (None if it does not answer)
+        """
+        total = 0
+        for i in range(count) :
+            started = time()
+            if not self.sendStrWaitingResponse("~Y", ["3","4"], retries=1) :
+                return None
+            total += time() - started
+        return total / count
+
+    def recordRtt(self) :
+        """
+            Returns the average seconds between sending a record
+            and its answer on the last sendFirmware (None if none sent)
+        """
+        if not self._rttCount :
+            return None
+        return self._rttTotal / self._rttCount
+
+    def refusedRecord(self) :
+        """
+            Returns True when the last sendFirmware stopped because
+            the device NAKed a record, False when it stopped on a
+            timeout or an unexpected answer
+        """
+        return self._refused
+
     def enterWriteMode(self) :
         """
         Starts write mode
@@ -138,61 +229,98 @@ class FW():
         else :
             return False
 
-    def waitResponse(self, response) :
+    def waitResponse(self, response, timeout=_timeout) :
         """
         Waits on the serial for the response
         until timeout or response received
         """
         data = None
-        data = self._serial.read()
+        data = self._at.readUntil(time() + timeout)
         if data == response :
             return True
         else :
             return False
 
+    def _resync(self, timeout) :
+        """
+        Drains the input and waits for the next R,
+        returns True when the device is ready for a record
+        """
+        pending = self._serial.read(self._serial.inWaiting())
+        if pending.endswith("R") :
+            return True
+        deadline = time() + timeout
+        with self._at.waiting(deadline) :
+            while time() < deadline :
+                if self._at.readUntil(deadline) == "R" :
+                    return True
+        return False
+
     def sendFirmware(self, fwFile, debug=True) :
         """
         Sends the firmware file stored before to
         the device line by line, then returns the
-        total number of lines are sent (or false if fails)
+        total number of lines acknowledged
+        Records that are not acknowledged are retried
+        following the retry policy
         """
         currentLine = 0
+        self._line_number = 0
+        self._rttTotal = 0
+        self._rttCount = 0
+        self._refused = False
         self._at._sleep(1.5)
         fwLength = len(fwFile)
+        policy = self.retryPolicy
         i = 10
 
         for fwLine in fwFile :
+            attempt = 0
             data = None
-            data = self._serial.read()
-            if data == None:
-                self.logger.debug ("FW: returned blank expecting R")
-                break
-            elif data != "R" :
-                self.logger.debug ("FW: sendFirmware data = {}".format(ord(data)))
-                break
-
-            currentLine += 1
-            self._serial.write(fwLine) #send the line
-            data = None
-            data = self._serial.read()
-            # TODO: try to improve this part, be more readable
-            if data == None:
-                self.logger.debug ("FW: returned blank expecting A")
-                break
-            elif data != "A" :
-                if data == "N" : # retry once
-                    self._serial.write(fwLine)
+            data = self._at.readUntil(time() + self._timeout)
+            ready = data == "R"
+            if ready :
+                self.trace.record(self.trace.FW_READY, currentLine + 1)
+            else :
+                self.trace.record(self.trace.FW_UNEXPECTED, self.trace.char(data), currentLine + 1)
+
+            while True :
+                if ready :
+                    self._line_number = currentLine + 1
+                    self._serial.write(fwLine) #send the line
+                    self.trace.record(self.trace.FW_RECORD, currentLine + 1)
+                    sent = time()
                     data = None
-                    data = self._serial.read()
+                    data = self._at.readUntil(sent + self._timeout)
+                    self._rttTotal += time() - sent
+                    self._rttCount += 1
                     if data == "A" :
-                        continue
-                    elif data in ["n","N"] :    #if still not working, restarts the device
-                        self.logger.debug ("FW: Restarting device...")
-                        self._at.endSerial()
-                        #TODO reset and try again (not tested yet)
-                        sys.exit(1)
-                    else :    #if doesn't receive any acceptable answer, exits the program
+                        self.trace.record(self.trace.FW_ACK, currentLine + 1)
                         break
+                    elif data in ["n","N"] :
+                        self.trace.record(self.trace.FW_NAK, self.trace.char(data), currentLine + 1)
+                    else :
+                        self.trace.record(self.trace.FW_UNEXPECTED, self.trace.char(data), currentLine + 1)
+
+                attempt += 1
+                if not policy.allow(attempt) :
+                    self.trace.record(self.trace.FW_GIVE_UP, currentLine + 1, policy.used)
+                    self.logger.debug ("FW: Giving up on line {}".format(currentLine + 1))
+                    self._refused = data in ["n","N"]
+                    return currentLine
+                self.trace.record(self.trace.FW_RETRY, attempt, currentLine + 1)
+                self._at._sleep(policy.delay(attempt))
+
+                if data in ["n","N","R"] : #the device is waiting for the record again
+                    self._serial.flushInput()
+                    ready = True
+                else : #lost track of the handshake, wait for the device to ask for a record
+                    self.trace.record(self.trace.FW_RESYNC, currentLine + 1)
+                    ready = self._resync(policy.resyncTimeout)
+                    if ready :
+                        self.trace.record(self.trace.FW_READY, currentLine + 1)
+
+            currentLine += 1
 
             if (currentLine >= ((fwLength*i)/100)) and debug :
                 self.logger.debug ("FW: {}% Completed".format(i))    # debug
@@ -214,6 +342,12 @@ class FW():
 
         return self._serial
 
+    def setSerial(self, serialHandle) :
+        """
+        Uses another (already open) serial handle
+        """
+        self._serial = serialHandle
+
     def sendCommit(self) :
         """
             Sends the commit command "X"
@@ -230,20 +364,7 @@ class FW():
             Store the content of the FW File (.bin file)
             to be written on the device
         """
-
-        try :
-            f = open(fwFileName, "r")
-        except IOError as e:
-            self.logger.error("FW: Could not open firmware file {} for reading: {}\n".format(fwFileName,e.strerror))
-            return False
-        firmware = [line.rstrip() for line in f] #rstrip() removes the whitespaces \f , \n , \r , \t , \v , \x and blank on the end of the line
-        line = ""
-        for line in firmware:
-            if len(line) != 67 :
-                self.logger.error("FW: Line with invalid length of {} in firmware file\n".format(len(line)))
-                return False
-        f.close()
-        return firmware
+        return readFirmwareFile(fwFileName, self.logger)
 
             ##### not implemented
     """
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" RetryPolicy Class
+    Decides how FW.sendFirmware recovers when a record is not acknowledged,
+    a NAK resends the record after a backoff, a missing or garbled answer
+    drains the input and waits for the next R before resending
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+class RetryPolicy():
+
+    def __init__(self, recordRetries=3, sessionBudget=32, backoff=0.05,
+                 backoffFactor=2.0, maxBackoff=1.0, resyncTimeout=3.0):
+        """ recordRetries   retries allowed for one record
+            sessionBudget   retries allowed for the whole session (every pass
+                            sent with this policy), 0 for no retries at all
+            backoff         delay before the first retry of a record, in seconds,
+                            multiplied by backoffFactor on each further retry
+                            up to maxBackoff
+            resyncTimeout   time to wait for the next R when resynchronising
+        """
+        self.recordRetries = recordRetries
+        self.sessionBudget = sessionBudget
+        self.backoff = backoff
+        self.backoffFactor = backoffFactor
+        self.maxBackoff = maxBackoff
+        self.resyncTimeout = resyncTimeout
+        self.used = 0
+
+    def reset(self):
+        """ Starts a new session with the whole budget
+        """
+        self.used = 0
+
+    def allow(self, attempt):
+        """ Returns True (and takes it from the budget) if the
+            given retry of a record can be made
+        """
+        if attempt > self.recordRetries or self.used >= self.sessionBudget:
+            return False
+        self.used += 1
+        return True
+
+    def delay(self, attempt):
+        """ Returns the backoff before the given retry of a record
+        """
+        return min(self.backoff * self.backoffFactor ** (attempt - 1), self.maxBackoff)
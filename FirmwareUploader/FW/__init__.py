@@ -1,3 +1,4 @@
-from FW import FW
+from FW import FW, checkFirmwareLines, readFirmwareFile
+from RetryPolicy import RetryPolicy
 
-__ALL__ = ['FW']
+__ALL__ = ['FW', 'checkFirmwareLines', 'readFirmwareFile', 'RetryPolicy']
@@ -21,25 +21,35 @@
 
 import Tkinter as tk
 import ttk
-from ScrolledText import *
 import sys
 import os
 import argparse
-import json
-import urllib2
-import httplib
 import ConfigParser
 import tkMessageBox
 import threading
 import Queue
 import string
-import glob
 from time import sleep, asctime, time
 import logging
 from collections import OrderedDict
 import serial
 import FW
 import AT
+import SerialTap
+import Catalog
+import Resources
+import PortStats
+import LineControl
+import SerialSession
+import PortLock
+import DeviceIdentity
+import Inventory
+import FlashJob
+import FlashPlan
+import LogView
+import Dashboard
+import AsyncLog
+import SerialWorker
 
 """
     Big TODO list
@@ -91,6 +101,13 @@ OLDDEVICE = """This Device is too old for this program"""
 
 OLDBOOTLOADER = """Bootloader update needed first"""
 
+UPDATEBOOTLOADER = """Bootloader update needed first.
+Would you like to update the bootloader now?"""
+
+UPDATINGBOOTLOADER = """Updating the bootloader..."""
+
+BOOTLOADERUPDATED = """Bootloader updated"""
+
 BOOTLOADERNOTSUPPORTED = """Device using bootloader v4 is not supported yet"""
 
 NODEVREPLY = """No reply from the Device.
@@ -167,6 +184,7 @@ class FirmwareUploader:
             setup variables
         """
         self._running = False
+        self._screens = {} #frames of the screens already built, by name
 
         self._detectSystem() #sets the OS running
 
@@ -177,6 +195,8 @@ class FirmwareUploader:
         self._formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         self._ch.setFormatter(self._formatter)
         self.logger.addHandler(self._ch)
+        self._fh = None
+        self._logListener = None
 
     def _initLogging(self):
         """ now we have the config file loaded and the command line args setup
@@ -207,21 +227,92 @@ class FirmwareUploader:
         else:
             self._ch.setLevel(100)
 
-        # add file logging if enabled
-        # TODO: look at rotating log files
-        # http://docs.python.org/2/library/logging.handlers.html#logging.handlers.TimedRotatingFileHandler
+        handlers = [self._ch]
+        # add file logging if enabled, rotated by size and age
         if (self.config.getboolean('Debug', 'file_debug')):
             self.logger.debug("Setting file debugger")
-            self._fh = logging.FileHandler(self.config.get('Debug', 'log_file'))
+            self._fh = AsyncLog.CompressedRotatingFileHandler(Resources.resourcePath(self.config.get('Debug', 'log_file')),
+                                                              maxBytes=self._configInt('Debug', 'log_max_kbytes', 1024)*1024,
+                                                              interval=self._configInt('Debug', 'log_rotate_hours', 24)*3600,
+                                                              backupCount=self._configInt('Debug', 'log_backup_count', 5),
+                                                              compress=self._configBoolean('Debug', 'log_compress', True))
             self._fh.setFormatter(self._formatter)
             logLevel = self.config.get('Debug', 'file_level')
             numeric_level = getattr(logging, logLevel.upper(), None)
             if not isinstance(numeric_level, int):
                 raise ValueError('Invalid console log level: %s' % loglevel)
             self._fh.setLevel(numeric_level)
-            self.logger.addHandler(self._fh)
+            handlers.append(self._fh)
+
+        # the serial threads only queue their records, writing them is
+        # left to a background thread so they never wait for the disk
+        self._logListener = AsyncLog.QueueListener(handlers)
+        self._logListener.start()
+        self.logger.removeHandler(self._ch)
+        self.logger.addHandler(self._logListener.handler)
+        if self._fh:
             self.logger.info("File Logging started")
 
+    def _configInt(self, section, option, default):
+        if self.config.has_option(section, option) and self.config.get(section, option):
+            return self.config.getint(section, option)
+        return default
+
+    def _configBoolean(self, section, option, default):
+        if self.config.has_option(section, option) and self.config.get(section, option):
+            return self.config.getboolean(section, option)
+        return default
+
+    def _initWireRecorder(self):
+        """ Start recording the serial traffic if a record file is configured
+        """
+        self.wireRecorder = None
+        if (self.config.has_option('Debug', 'wire_record_file') and
+            self.config.get('Debug', 'wire_record_file')):
+            try:
+                self.wireRecorder = SerialTap.WireRecorder(Resources.resourcePath(self.config.get('Debug', 'wire_record_file')))
+                self.logger.info("Recording serial traffic")
+            except IOError as e:
+                self.logger.error("Unable to create wire recording: {}".format(e.strerror))
+
+    def _initPortStats(self):
+        """ Loads what is known about the serial ports from previous uploads
+        """
+        portStatsFile = None
+        if (self.config.has_option('FirmwareUploader', 'port_stats_file') and
+            self.config.get('FirmwareUploader', 'port_stats_file')):
+            portStatsFile = Resources.statePath(self.config.get('FirmwareUploader', 'port_stats_file'))
+        self.portStats = PortStats.PortStats(portStatsFile, self.logger)
+
+    def _configTransferBaudrate(self):
+        """ Returns the transfer baudrate of the config file, None when
+            not set so the last one that worked on the port is used
+        """
+        if (self.config.has_option('FirmwareUploader', 'transfer_baudrate') and
+            self.config.get('FirmwareUploader', 'transfer_baudrate')):
+            return self.config.getint('FirmwareUploader', 'transfer_baudrate')
+        return None
+
+    def _initLineControl(self):
+        """ Sets up the lines used to force AT mode and reset the device if configured
+        """
+        self.lineControl = None
+        if self.config.has_option('FirmwareUploader', 'line_control'):
+            try:
+                self.lineControl = LineControl.openLineControl(self.config.get('FirmwareUploader', 'line_control'), self.logger)
+            except LineControl.LineControlError as e:
+                self.logger.error("Unable to use line control: {}".format(e))
+
+    def _openSerial(self, port, baudrate, timeout=None):
+        """ Opens the serial port, recording it's traffic if enabled
+        """
+        ser = serial.Serial(port, baudrate, timeout=timeout or self._serialTimeout)
+        if self.wireRecorder:
+            ser = self.wireRecorder.tap(ser)
+        if self.lineControl:
+            self.lineControl.attach(ser)
+        return ser
+
     def _detectSystem(self) :
         """ Detects what OS are using
         """
@@ -243,64 +334,24 @@ class FirmwareUploader:
         :returns:
             A list of available serial ports
         """
-        global WINDOWS, MACOSX, LINUX
-        result = []
-
-        if WINDOWS:
-            #ports = ['COM' + str(i + 1) for i in range(256)]
-            import _winreg
-            try:
-                path = "HARDWARE\\DEVICEMAP\\SERIALCOMM"
-                key = _winreg.OpenKey(_winreg.HKEY_LOCAL_MACHINE, path)
-            except WindowsError:
-                raise IterationError
-            i = 0
-            while True:
-                try:
-                    port = _winreg.EnumValue(key, i)
-                    result.append(str(port[1]))
-                    i += 1
-                except EnvironmentError:
-                    # if reachs here, means the key is empty now
-                    return sorted(result)
-        elif LINUX:
-            # this is to exclude your current terminal "/dev/tty"
-            ports = glob.glob('/dev/tty[A-Za-z]*')
-
-        elif MACOSX:
-            ports = glob.glob('/dev/tty.*')
-
-        else:
-            raise EnvironmentError('Unsupported platform')
+        return Inventory.listSerialPorts()
 
-        for port in ports:
-            if port == '/dev/ttyprintk': ## don't need to check for this port
-                continue
-            try:
-                s = serial.Serial(port)
-                s.close()
-                result.append(port)
-            except (OSError, serial.SerialException):
-                pass
-        return sorted(result)
-
-    def downloadFile(self, type):
+    def downloadFile(self, type, deviceClass=None, fileName=None):
+        import urllib2
+        import httplib
         try:
-            if type == 'json' :
-                request = urllib2.urlopen(self.config.get('FirmwareUploader', 'url_path') +
-                                          self.config.get('FirmwareUploader', 'json_file'))
-                self.jsonFile = request.read()
+            if type == 'bin' :
+                path = self._bootloaderFolder + '/' + (deviceClass or self._deviceClass) + '/' + (fileName or self._firmwareFilename)
 
-            elif type == 'bin' :
-                url = (self.config.get('FirmwareUploader', 'url_path') +
-                                  self._bootloaderFolder + '/' + self._deviceClass +
-                                  '/' + self._firmwareFilename)
-
-                self.logger.info (url) #debug
+                self.logger.info (path) #debug
                 self.updateDownloadStatus('start')
 
-                request = urllib2.urlopen(url)
-                self.firmwareFile = request.read().splitlines() #splitlines removes the aditional '\n' on the end of file added by read() mode
+                status, self.firmwareFile = self.catalog.getImage(path) #reuses the image if already downloaded
+                if str(status) != '200' :
+                    return status
+
+                self.updateDownloadStatus('end')
+                return status
 
             elif type == 'txt' :
                 request = urllib2.urlopen(self.config.get('FirmwareUploader', 'url_path') + self._releaseNotes)
@@ -329,9 +380,6 @@ class FirmwareUploader:
                             traceback.format_exc())
             return traceback.format_exc()
 
-        if type == 'bin' :
-            self.updateDownloadStatus('end')
-
         return request.getcode()
 
     def updateDownloadStatus (self, state):
@@ -361,6 +409,9 @@ class FirmwareUploader:
         self._checkArgs()
         self._readConfig()
         self._initLogging()
+        self._initWireRecorder()
+        self._initPortStats()
+        self._initLineControl()
         self._loadDevices()
 
         self._running = True
@@ -405,11 +456,11 @@ class FirmwareUploader:
             self._displayIntro()
 
             if WINDOWS :
-                icon = 'wt.ico'
+                icon = Resources.resourcePath('wt.ico')
                 self.master.wm_iconbitmap(icon)
             elif LINUX :
             ### TODO test on MACOSX #####
-                icon = 'wt.gif'
+                icon = Resources.resourcePath('wt.gif')
                 img = tk.PhotoImage(file=icon)
                 self.master.tk.call('wm', 'iconphoto', self.master._w, img)
 
@@ -434,6 +485,7 @@ class FirmwareUploader:
                                 height=self._heightMain)
         self.iframe.pack()
         self._currentFrame = 'introFrame'
+        self._screens['introFrame'] = self.iframe
         self._buildGrid(self.iframe)
 
         tk.Label(self.iframe, name='introText', text=INTRO
@@ -461,6 +513,26 @@ class FirmwareUploader:
                 ).grid(row=self._rows-4, column=1, columnspan=3,
                 sticky=tk.E+tk.W)
 
+        tk.Button(self.iframe, text='All Devices', command=lambda :self._openDashboard()
+                ).grid(row=self._rows-2, column=1, columnspan=3,
+                sticky=tk.E+tk.W)
+
+
+    def _openDashboard(self) :
+        """
+            Opens the window flashing many devices at the same time
+        """
+        if getattr(self, 'dashboard', None) and self.dashboard.winfo_exists() :
+            self.dashboard.lift()
+            return
+        transferBaudrate = self._configTransferBaudrate()
+        # the line control lines belong to one device, they are not used here
+        self.dashboard = Dashboard.Dashboard(self.master, self.catalog,
+                                             jobOptions={'baudrate': int(self.baudrateCombobox.get()),
+                                                         'transferBaudrate': transferBaudrate,
+                                                         'timeout': self._serialTimeout},
+                                             portStats=self.portStats,
+                                             logger=self.logger)
 
     def reListSerialPorts(self) :
         try :
@@ -553,20 +625,23 @@ class FirmwareUploader:
             if self.tLocatingDeviceSerialStop.is_set():
                 return
             self._port = port
+            session = SerialSession.SerialSession(port, self._baudrate, self._serialTimeout, self.logger,
+                                                  opener=self._openSerial, lineControl=self.lineControl)
             try :
-                self.ser = serial.Serial(self._port, self._baudrate,timeout=self._serialTimeout)
-                self.at = AT.AT(serialHandle=self.ser, logger=self.logger)
+                self.ser = session.open()
+                self.at = session.at
+            except PortLock.PortBusyError as e:
+                self.logger.info("Skipping {}".format(e)) #someone else is using it
+                continue
             except serial.SerialException as e:
-                self.ser.close()
-                self.logger.critical ("Failed to open port {}: {}".format(port,e.strerror))
-                return
+                self.logger.error ("Failed to open port {}: {}".format(port,e))
+                continue
             try :
                 if self.at.enterATMode() : #if comm succeed
                     #ask the device for FW Version and add to a list of devices
                     self.deviceFound = True
                     fwVersion = self.at.sendATWaitForResponse("ATVR")
                     self.at.sendATWaitForOK("ATDN")
-                    self.ser.close()
                     if fwVersion:
                         if '0.' in fwVersion:
                             fwVersion = fwVersion.split('0.',1)[1]
@@ -578,10 +653,10 @@ class FirmwareUploader:
                     #self.deviceAndCommPort.append("port, fwVersion])
                     #break
             except:
-                self.logger.critical ("Failed to open port {}: {}".format(port,e.strerror))
-                self.ser.close()
+                self.logger.exception ("Failed to search port {}".format(port))
+            finally:
+                session.close()
 
-        self.ser.close()
         return
 
 
@@ -615,11 +690,11 @@ class FirmwareUploader:
         self.master.after(2000, self._checkDeviceFound)
 
         if WINDOWS :
-            icon = 'wt.ico'
+            icon = Resources.resourcePath('wt.ico')
             self.searchWindow.wm_iconbitmap(icon)
         elif LINUX :
         ### TODO test on MACOSX #####
-            icon = 'wt.gif'
+            icon = Resources.resourcePath('wt.gif')
             img = tk.PhotoImage(file=icon)
             self.searchWindow.tk.call('wm', 'iconphoto', self.searchWindow._w, img)
         self.searchWindow.update_idletasks()
@@ -639,22 +714,18 @@ class FirmwareUploader:
         self.master.after(1000, self._checkSerialGetVersionError)
 
 
-    def startCommunicatingScreen(self) :
-        self.master.children[self._currentFrame].pack_forget()
-
-        self.cframe = tk.Frame(self.master, name='communicatingFrame', relief=tk.RAISED,
-                               borderwidth=2, width=self._widthMain,
-                               height=self._heightMain)
-        self.cframe.pack()
-        self._currentFrame = 'communicatingFrame'
+    def startCommunicatingScreen(self, text="Connecting with device...") :
+        self.cframe, built = self._showScreen('communicatingFrame')
+        if built :
+            self._communicatingText = tk.StringVar()
+            tk.Label(self.cframe, textvariable=self._communicatingText
+                    ).grid(row=7, column=0, columnspan=self._columns, rowspan=1)
 
-        self._buildGrid(self.cframe)
+            self.commProgressBar = ttk.Progressbar(self.cframe, orient='horizontal', mode='indeterminate', length=self._widthMain/2.5)
+            self.commProgressBar.grid(row=9, column=0, columnspan=self._columns)
 
-        tk.Label(self.cframe, text="Connecting with device..."
-                ).grid(row=7, column=0, columnspan=self._columns, rowspan=1)
-
-        self.commProgressBar = ttk.Progressbar(self.cframe, orient='horizontal', mode='indeterminate', length=self._widthMain/2.5)
-        self.commProgressBar.grid(row=9, column=0, columnspan=self._columns)
+        self._communicatingText.set(text)
+        self.commProgressBar.stop()
         self.commProgressBar.start()
         return
 
@@ -715,62 +786,44 @@ class FirmwareUploader:
 
 
     def startListDeviceScreen(self) :
-        self.master.children[self._currentFrame].pack_forget()
+        self.lframe, built = self._showScreen('lFrame')
+        if built :
+            self._listHeading = tk.StringVar()
+            self._listVersion = tk.StringVar()
+            self._listHeadingLabel = tk.Label(self.lframe, textvariable=self._listHeading)
+            self._listVersionLabel = tk.Label(self.lframe, textvariable=self._listVersion)
+            self._listVersionLabel.grid(row=3, column=0, columnspan=self._columns, rowspan=4)
 
-        self.lframe = tk.Frame(self.master, name='lFrame', relief=tk.RAISED,
-                               borderwidth=2, width=self._widthMain,
-                               height=self._heightMain)
-        self.lframe.pack()
-        self._currentFrame = 'lFrame'
-        self._listboxSelection = ''
-        self._buildGrid(self.lframe)
+            tk.Label(self.lframe, text=CHOOSEDEVICEBELOW1
+                        ).grid(row=5, column=0, columnspan=self._columns, rowspan=4)
+
+            self._listboxDevices, lbframe = self._buildListbox(self.lframe, self._onDeviceSelect)
+            lbframe.grid(row=8, column=1, columnspan=self._columns-2, rowspan=6, sticky=tk.W+tk.E+tk.N+tk.S)
+
+            tk.Button(self.lframe, text='Back',
+                  command=lambda :self._startOver(),
+                  ).grid(row=self._rows-2, column=1, sticky=tk.W)
 
+            self.listNextButton = tk.Button(self.lframe, text='Next', state=tk.DISABLED,
+                 command=lambda :self._checkAcceptsLLAP())
+            self.listNextButton.grid(row=self._rows-2, column=2, columnspan=2, sticky=tk.E+tk.W)
+
+        self._listboxSelection = ''
         self._supportLLAP = False
 
         if self._inBootloaderMode :
         #if not identify the version, list all devices
-            tk.Label(self.lframe, text=UNABLEFINDDEVICE
-                    ).grid(row=2, column=0, columnspan=self._columns, rowspan=4)
+            self._listHeading.set(UNABLEFINDDEVICE)
+            self._listHeadingLabel.grid(row=2, column=0, columnspan=self._columns, rowspan=4)
+            self._listVersionLabel.grid_remove()
         else :
-            tk.Label(self.lframe, text="Your Device Firmware Version is"
-                    ).grid(row=1, column=0, columnspan=self._columns, rowspan=4)
-
-            tk.Label(self.lframe, text=('v'+self._fwVersion+' '+self._deviceFwName)
-                        ).grid(row=3, column=0, columnspan=self._columns, rowspan=4)
-
-        tk.Label(self.lframe, text=CHOOSEDEVICEBELOW1
-                    ).grid(row=5, column=0, columnspan=self._columns, rowspan=4)
-
-        lbframe = tk.Frame(self.lframe, bd=1, relief=tk.SUNKEN)
-
-        self._listboxDevices = tk.Listbox(lbframe, selectmode=tk.SINGLE, bd=0, height=9)
-
-        for r in range(0,len(self._deviceList))        :
-            self._listboxDevices.insert(r,self._deviceList[r])
-
-        self._listboxDevices.bind('<<ListboxSelect>>', self._onDeviceSelect)
-
-        sV = tk.Scrollbar(lbframe)
-        sV.pack(side=tk.RIGHT, fill=tk.Y)
-        sV.config(command=self._listboxDevices.yview)
-        self._listboxDevices.config(yscrollcommand=sV.set)
-
-        sH = tk.Scrollbar(lbframe, orient=tk.HORIZONTAL)
-        sH.pack(side=tk.BOTTOM, fill=tk.X)
-        sH.config(command=self._listboxDevices.xview)
-        self._listboxDevices.config(xscrollcommand=sH.set)
+            self._listHeading.set("Your Device Firmware Version is")
+            self._listHeadingLabel.grid(row=1, column=0, columnspan=self._columns, rowspan=4)
+            self._listVersion.set('v'+self._fwVersion+' '+self._deviceFwName)
+            self._listVersionLabel.grid()
 
-        self._listboxDevices.pack(fill=tk.X)
-
-        lbframe.grid(row=8, column=1, columnspan=self._columns-2, rowspan=6, sticky=tk.W+tk.E+tk.N+tk.S)
-
-        tk.Button(self.lframe, text='Back',
-              command=lambda :self._startOver(),
-              ).grid(row=self._rows-2, column=1, sticky=tk.W)
-
-        self.listNextButton = tk.Button(self.lframe, text='Next', state=tk.DISABLED,
-             command=lambda :self._checkAcceptsLLAP())
-        self.listNextButton.grid(row=self._rows-2, column=2, columnspan=2, sticky=tk.E+tk.W)
+        self._fillListbox(self._listboxDevices, self._deviceList)
+        self.listNextButton.config(state=tk.DISABLED)
 
 
     def _checkAcceptsLLAP(self) :
@@ -781,24 +834,33 @@ class FirmwareUploader:
 
 
     def _startMainScreen(self) :
-        self.master.children[self._currentFrame].pack_forget()
-
-        self.mframe = tk.Frame(self.master, name='mFrame', relief=tk.RAISED,
-                               borderwidth=2, width=self._widthMain,
-                               height=self._heightMain)
-        self.mframe.pack()
-        self._currentFrame = 'mFrame'
-
-        self._buildGrid(self.mframe)
-
-        if self._deviceClass == 'USB' :
-            devClass = self._usbCommon
-        elif self._deviceClass == 'LLAP' :
-            devClass = self._llapCommon
-        elif self._deviceClass == 'LLAP2':
-            devClass = self._llap2Common
-        elif self._deviceClass == 'Serial':
-            devClass = self._serialCommon
+        self.mframe, built = self._showScreen('mFrame')
+        if built :
+            self._mainDevice = tk.StringVar()
+            self._mainLatest = tk.StringVar()
+            self._mainStatus = tk.StringVar()
+            tk.Label(self.mframe, textvariable=self._mainDevice
+                    ).grid(row=0, column=0, columnspan=self._columns, rowspan=2)
+            tk.Label(self.mframe, textvariable=self._mainLatest
+                    ).grid(row=2, column=0, columnspan=self._columns, rowspan=1)
+            tk.Label(self.mframe, textvariable=self._mainStatus
+                    ).grid(row=4, column=0, columnspan=self._columns, rowspan=1)
+
+            # every button is placed once, the ones a device needs are shown by _assignRows
+            self._mainButtons = OrderedDict()
+            for name, text, command in (
+                    ('upgrade', 'Upgrade to Latest Firmware', lambda :self.askConfirmation("Upgrade")),
+                    ('olderVersion', 'Change to Older Version', lambda :self._startOlderVersionScreen()),
+                    ('changeToSerial', 'Change to Serial', lambda :self.askConfirmation("Serial")),
+                    ('changeToLLAP', 'Change LLAP Type', lambda :self._startLLAPScreen()),
+                    ('releaseNotes', 'Release Notes', lambda :self._startReleaseNoteScreen()),
+                    ('back', 'Back', lambda :self._mainBack())):
+                button = tk.Button(self.mframe, text=text, command=command)
+                button.grid(column=1, columnspan=self._columns-2, rowspan=1, sticky=tk.N+tk.S+tk.W+tk.E)
+                button.grid_remove()
+                self._mainButtons[name] = button
+
+        devClass = self._classCommon(self._deviceClass)
 
         versions = devClass['Versions']
         #starts create the firmware filename
@@ -812,83 +874,60 @@ class FirmwareUploader:
         if self._inBootloaderMode :
             self._deviceFwName = ''
 
-        deviceList = []
-        i = 0
-
-        if self._fwVersion == "Unknown":
-            tk.Label(self.mframe, text=self._deviceName+"     "+self._fwVersion+' '+self._deviceFwName
-                    ).grid(row=0, column=0, columnspan=self._columns, rowspan=2)
-        else:
-            tk.Label(self.mframe, text=self._deviceName+"     v"+self._fwVersion+' '+self._deviceFwName
-                    ).grid(row=0, column=0, columnspan=self._columns, rowspan=2)
-
-        latestFwLabel = tk.Label(self.mframe, text="Latest "+self._deviceClass+" Version Available: "+self.showVersion)
-        latestFwLabel.grid(row=2, column=0, columnspan=self._columns, rowspan=1)
-
-        releaseNotesButton = tk.Button(self.mframe, text='Release Notes',
-                                            command=lambda :self._startReleaseNoteScreen())
-        releaseNotesButton.grid(column=1, columnspan=self._columns-2, rowspan=1, sticky=tk.N+tk.S+tk.W+tk.E)
-
-        olderVersionButton = tk.Button(self.mframe, text='Change to Older Version',
-                                            command=lambda :self._startOlderVersionScreen())
-        olderVersionButton.grid(column=1, columnspan=self._columns-2, rowspan=1, sticky=tk.N+tk.S+tk.W+tk.E)
+        self._mainDevice.set(self._deviceText())
+        self._mainLatest.set("Latest "+self._deviceClass+" Version Available: "+self.showVersion)
 
         #extrem test
         #self._fwVersion = "78"
 
+        deviceList = []
         if self._fwVersion == self.showVersion :
-            txt = "Your device is up to date"
-            tk.Label(self.mframe, text=txt).grid(row=4, column=0, columnspan=self._columns, rowspan=1)
-
+            self._mainStatus.set("Your device is up to date")
         elif self._fwVersion < self.showVersion or self._inBootloaderMode:
-            txt = "Version "+self.showVersion+" available"
-            tk.Label(self.mframe, text=txt).grid(row=4, column=0, columnspan=self._columns, rowspan=1)
-
-            upgradeButton = tk.Button(self.mframe, text='Upgrade to Latest Firmware',
-                                            #command=lambda :self._startUploading())
-                                            command=lambda :self.askConfirmation("Upgrade"))
-            upgradeButton.grid(column=1, columnspan=self._columns-2, rowspan=1, sticky=tk.N+tk.S+tk.W+tk.E)
-            deviceList.insert(i, upgradeButton)
-            i += 1
+            self._mainStatus.set("Version "+self.showVersion+" available")
+            deviceList.append('upgrade')
+        else :
+            self._mainStatus.set('')
 
-        deviceList.insert(i,olderVersionButton)
-        i += 1
+        deviceList.append('olderVersion')
 
         if self._deviceClass in ['LLAP','LLAP2'] : #shows serial button and change llap type button
-            changeToSerialButton = tk.Button(self.mframe, text='Change to Serial',
-                                                    command=lambda :self.askConfirmation("Serial"))
-            changeToSerialButton.grid(column=1, columnspan=self._columns-2, rowspan=1, sticky=tk.N+tk.S+tk.W+tk.E)
-            deviceList.insert(i, changeToSerialButton)
-            i += 1
-
-            changeToLLAPButton = tk.Button(self.mframe, text='Change LLAP Type',
-                                                command=lambda :self._startLLAPScreen())
-            changeToLLAPButton.grid(column=1, columnspan=self._columns-2, rowspan=1, sticky=tk.N+tk.S+tk.W+tk.E)
-            deviceList.insert(i, changeToLLAPButton)
-            i += 1
+            deviceList.append('changeToSerial')
+            self._mainButtons['changeToLLAP'].config(text='Change LLAP Type')
+            deviceList.append('changeToLLAP')
         elif self._supportLLAP: #if device is not LLAP but has support for that, show the change LLAP button
-            changeToLLAPButton = tk.Button(self.mframe, text='Change to LLAP Type',
-                                                command=lambda :self._startLLAPScreen())
-            changeToLLAPButton.grid(column=1, columnspan=self._columns-2, rowspan=1, sticky=tk.N+tk.S+tk.W+tk.E)
-            deviceList.insert(i, changeToLLAPButton)
-            i += 1
+            self._mainButtons['changeToLLAP'].config(text='Change to LLAP Type')
+            deviceList.append('changeToLLAP')
 
-        deviceList.insert(i,releaseNotesButton)
-        i+=1
+        deviceList.append('releaseNotes')
+        deviceList.append('back')
 
+        for button in self._mainButtons.values() :
+            button.grid_remove()
+        self._assignRows([self._mainButtons[name] for name in deviceList],5,self._rows)
+
+    def _mainBack(self) :
         if self.singleDevice :
-            backButton = tk.Button(self.mframe, text='Back',
-                    command=lambda :self._startOver())
-            backButton.grid(column=1, columnspan=self._columns-2,
-                    sticky=tk.E+tk.W)
+            self._startOver()
         else :
-            backButton = tk.Button(self.mframe, text='Back',
-                    command=lambda :self.startListDeviceScreen())
-            backButton.grid(column=1, columnspan=self._columns-2,
-                    sticky=tk.E+tk.W)
+            self.startListDeviceScreen()
 
-        deviceList.insert(i, backButton)
-        self._assignRows(deviceList,5,self._rows)
+    def _classCommon(self, deviceClass) :
+        """
+            Returns the catalog information of a device class
+        """
+        return {'USB': self._usbCommon,
+                'LLAP': self._llapCommon,
+                'LLAP2': self._llap2Common,
+                'Serial': self._serialCommon}.get(deviceClass)
+
+    def _deviceText(self) :
+        """
+            Returns the device name and firmware shown at the top of the screens
+        """
+        if self._fwVersion == "Unknown":
+            return self._deviceName+"     "+self._fwVersion+' '+self._deviceFwName
+        return self._deviceName+"     v"+self._fwVersion+' '+self._deviceFwName
 
 
     def _assignRows (self, deviceList, initialRow, finalRow):
@@ -937,60 +976,42 @@ class FirmwareUploader:
 
 
     def _startLLAPScreen(self) :
-        self.master.children[self._currentFrame].pack_forget()
-
-        self.llapframe = tk.Frame(self.master, name='llapFrame', relief=tk.RAISED,
-                               borderwidth=2, width=self._widthMain,
-                               height=self._heightMain)
-        self.llapframe.pack()
-        self._currentFrame = 'llapFrame'
-
-        self._buildGrid(self.llapframe)
-
-        if self._fwVersion == "Unknown":
-            tk.Label(self.llapframe, text=self._deviceName+"     "+self._fwVersion+' '+self._deviceFwName
-                    ).grid(row=1, column=0, columnspan=self._columns, rowspan=2)
-        else:
-            tk.Label(self.llapframe, text=self._deviceName+"     v"+self._fwVersion+' '+self._deviceFwName
+        self.llapframe, built = self._showScreen('llapFrame')
+        if built :
+            self._llapDevice = tk.StringVar()
+            tk.Label(self.llapframe, textvariable=self._llapDevice
                     ).grid(row=1, column=0, columnspan=self._columns, rowspan=2)
 
-        tk.Label(self.llapframe, text="LLAP Mode"
-                    ).grid(row=3, column=0, columnspan=self._columns, rowspan=2)
+            tk.Label(self.llapframe, text="LLAP Mode"
+                        ).grid(row=3, column=0, columnspan=self._columns, rowspan=2)
 
-        tk.Label(self.llapframe, text=CHOOSEDEVICEBELOW
-                    ).grid(row=5, column=0, columnspan=self._columns, rowspan=1)
+            tk.Label(self.llapframe, text=CHOOSEDEVICEBELOW
+                        ).grid(row=5, column=0, columnspan=self._columns, rowspan=1)
 
+            self._listboxLLAP, lbframe = self._buildListbox(self.llapframe, self._onLLAPSelect)
+            lbframe.grid(row=8, column=1, columnspan=self._columns-2, rowspan=6, sticky=tk.W+tk.E+tk.N+tk.S)
 
-        lbframe = tk.Frame(self.llapframe, bd=1, relief=tk.SUNKEN)
+            tk.Button(self.llapframe, text='Back',
+                  command=lambda :self._setDevClassBack()
+                  ).grid(row=self._rows-2, column=1, sticky=tk.W)
 
-        self._listboxLLAP = tk.Listbox(lbframe, selectmode=tk.SINGLE, bd=0, height=9)
+            self.listLLAPNextButton = tk.Button(self.llapframe, text='Next', state=tk.DISABLED,
+                              command=lambda :self.askConfirmation(self._llapFirmware))
+            self.listLLAPNextButton.grid(row=self._rows-2, column=2, columnspan=2,
+                        sticky=tk.E+tk.W)
 
-        self._llapFirmware = ''
-        index = 0
+        self._llapDevice.set(self._deviceText())
 
+        self._llapFirmware = ''
+        llapTypes = []
         for id, devices in self.ordDevices.items() :
             if id == self._deviceFwName :
                 continue
             if devices['Device Class'] == 'LLAP' :
                 for dev in devices['Devices'] :
                     if (self._xrfVersion in dev['Name']) :
-                        self._listboxLLAP.insert(index, devices['Description'])
-                        index += 1
-
-            self._listboxLLAP.bind('<<ListboxSelect>>', self._onLLAPSelect)
-
-        sH = tk.Scrollbar(lbframe, orient=tk.HORIZONTAL)
-        sH.config(command=self._listboxLLAP.xview)
-        self._listboxLLAP.config(xscrollcommand=sH.set)
-        sH.pack(side=tk.BOTTOM, fill=tk.X)
-
-        sV = tk.Scrollbar(lbframe)
-        sV.config(command=self._listboxLLAP.yview)
-        self._listboxLLAP.config(yscrollcommand=sV.set)
-        sV.pack(side=tk.RIGHT, fill=tk.Y)
-
-        self._listboxLLAP.pack(fill=tk.X)
-        lbframe.grid(row=8, column=1, columnspan=self._columns-2, rowspan=6, sticky=tk.W+tk.E+tk.N+tk.S)
+                        llapTypes.append(devices['Description'])
+        self._fillListbox(self._listboxLLAP, llapTypes)
 
         self._deviceClass = 'LLAP'
         self._fileBase = self._llapCommon['FileBase']
@@ -999,14 +1020,7 @@ class FirmwareUploader:
         if '0.' in self.showVersion :
             self.showVersion = self.showVersion.split('.',1)[1]
 
-        tk.Button(self.llapframe, text='Back',
-              command=lambda :self._setDevClassBack()
-              ).grid(row=self._rows-2, column=1, sticky=tk.W)
-
-        self.listLLAPNextButton = tk.Button(self.llapframe, text='Next', state=tk.DISABLED,
-                          command=lambda :self.askConfirmation(self._llapFirmware))
-        self.listLLAPNextButton.grid(row=self._rows-2, column=2, columnspan=2,
-                    sticky=tk.E+tk.W)
+        self.listLLAPNextButton.config(state=tk.DISABLED)
 
 
     def _setDevClassBack(self) :
@@ -1055,154 +1069,127 @@ class FirmwareUploader:
         text.pack(side="left", fill="both", expand=True)
 
         if WINDOWS :
-            icon = 'wt.ico'
+            icon = Resources.resourcePath('wt.ico')
             self.releaseNotesWindow.wm_iconbitmap(icon)
         elif LINUX :
         ### TODO test on MACOSX #####
-            icon = 'wt.gif'
+            icon = Resources.resourcePath('wt.gif')
             img = tk.PhotoImage(file=icon)
             self.releaseNotesWindow.tk.call('wm', 'iconphoto', self.releaseNotesWindow._w, img)
 
 
     def _startOlderVersionScreen(self):
-        self.master.children[self._currentFrame].pack_forget()
-
-        self.ovframe = tk.Frame(self.master, name='ovFrame', relief=tk.RAISED,
-                               borderwidth=2, width=self._widthMain,
-                               height=self._heightMain)
-        self.ovframe.pack()
-        self._currentFrame = 'ovFrame'
-
-        self._buildGrid(self.ovframe)
-
-        if self._fwVersion == "Unknown":
-            tk.Label(self.ovframe, text=self._deviceName+"     "+self._fwVersion+' '+self._deviceFwName
+        self.ovframe, built = self._showScreen('ovFrame')
+        if built :
+            self._olderDevice = tk.StringVar()
+            self._olderClass = tk.StringVar()
+            tk.Label(self.ovframe, textvariable=self._olderDevice
                     ).grid(row=0, column=0, columnspan=self._columns, rowspan=2)
-        else:
-            tk.Label(self.ovframe, text=self._deviceName+"     v"+self._fwVersion+' '+self._deviceFwName
-                    ).grid(row=0, column=0, columnspan=self._columns, rowspan=2)
-
-        tk.Label(self.ovframe, text=self._deviceClass+" Firmware Versions"
-                    ).grid(row=2, column=0, columnspan=self._columns, rowspan=2)
-
-        lbframe = tk.Frame(self.ovframe, bd=1, relief=tk.SUNKEN)
-
-        self._listboxOlderVer = tk.Listbox(lbframe, selectmode=tk.SINGLE, bd=0, height=9)
-
-        try :
-            if self._deviceClass == 'USB' :
-                devClass = self._usbCommon
-            elif self._deviceClass == 'Serial':
-                devClass = self._serialCommon
-            elif self._deviceClass == 'LLAP' :
-                devClass = self._llapCommon
-            elif self._deviceClass == 'LLAP2':
-                devClass = self._llap2Common
-        except :
-            pass
-        else:
-            ods = OrderedDict(sorted(devClass.items(), key=lambda t: t[0]))
-            index = 0
 
-            ods['Versions'] = sorted(ods['Versions'], key=lambda t: t, reverse=True)
-            self._verlist = [] #ods['Versions']
-            for version in ods['Versions'] :
+            tk.Label(self.ovframe, textvariable=self._olderClass
+                        ).grid(row=2, column=0, columnspan=self._columns, rowspan=2)
+
+            self._listboxOlderVer, self._olderListFrame = self._buildListbox(self.ovframe, self._onOlderVersionSelect)
+            self._olderListFrame.grid(row=8, column=1, columnspan=self._columns-2,
+                                      rowspan=6, sticky=tk.W+tk.E+tk.N+tk.S)
+            self._olderListLabel = tk.Label(self.ovframe, text="Please select the version listed below")
+            self._olderListLabel.grid(row=4, column=0, columnspan=self._columns, rowspan=2)
+            self._noOlderLabel = tk.Label(self.ovframe, text="No older versions found")
+            self._noOlderLabel.grid(row=6, column=1, columnspan=self._columns-2,
+                                    rowspan=6, sticky=tk.W+tk.E+tk.N+tk.S)
+
+            tk.Button(self.ovframe, text='Back',
+                  command=lambda :self._startMainScreen(),
+                  ).grid(row=self._rows-2, column=1, sticky=tk.W)
+
+            self.olderVersionNextButton = tk.Button(self.ovframe, text='Next', state=tk.DISABLED,
+                 command=lambda :self._startUploading())
+            self.olderVersionNextButton.grid(row=self._rows-2, column=2, columnspan=2,
+                        sticky=tk.E+tk.W)
+
+        self._olderDevice.set(self._deviceText())
+        self._olderClass.set(self._deviceClass+" Firmware Versions")
+
+        self._verlist = []
+        versions = []
+        devClass = self._classCommon(self._deviceClass)
+        if devClass :
+            for version in sorted(devClass['Versions'], key=lambda t: t, reverse=True) :
                 fullVersion = version
                 if '0.' in version :
                     version = version.split('.',1)[1]
 
                 if (version != self._fwVersion) :
-                    self._verlist.insert(index,fullVersion)
-                    self._listboxOlderVer.insert(index, version)
-                    index += 1
-
-            self._listboxOlderVer.bind('<<ListboxSelect>>', self._onOlderVersionSelect)
-
-        sV = tk.Scrollbar(lbframe)
-        sV.pack(side=tk.RIGHT, fill=tk.Y)
-        sV.config(command=self._listboxOlderVer.yview)
-        self._listboxOlderVer.config(yscrollcommand=sV.set)
-
-        sH = tk.Scrollbar(lbframe, orient=tk.HORIZONTAL)
-        sH.pack(side=tk.BOTTOM, fill=tk.X)
-        sH.config(command=self._listboxOlderVer.xview)
-        self._listboxOlderVer.config(xscrollcommand=sH.set)
-
-        self._listboxOlderVer.pack(fill=tk.X)
+                    self._verlist.append(fullVersion)
+                    versions.append(version)
+        self._fillListbox(self._listboxOlderVer, versions)
 
         if self._listboxOlderVer.size() > 1 :
-            tk.Label(self.ovframe, text="Please select the version listed below"
-                        ).grid(row=4, column=0, columnspan=self._columns, rowspan=2)
-            lbframe.grid(row=8, column=1, columnspan=self._columns-2,
-                            rowspan=6, sticky=tk.W+tk.E+tk.N+tk.S)
+            self._olderListLabel.grid()
+            self._olderListFrame.grid()
+            self._noOlderLabel.grid_remove()
         else :
-            tk.Label(self.ovframe, text="No older versions found"
-                    ).grid(row=6, column=1, columnspan=self._columns-2,
-                            rowspan=6, sticky=tk.W+tk.E+tk.N+tk.S)
-
-        tk.Button(self.ovframe, text='Back',
-              command=lambda :self._startMainScreen(),
-              ).grid(row=self._rows-2, column=1, sticky=tk.W)
-
-        self.olderVersionNextButton = tk.Button(self.ovframe, text='Next', state=tk.DISABLED,
-             command=lambda :self._startUploading())
-        self.olderVersionNextButton.grid(row=self._rows-2, column=2, columnspan=2,
-                    sticky=tk.E+tk.W)
+            self._olderListLabel.grid_remove()
+            self._olderListFrame.grid_remove()
+            self._noOlderLabel.grid()
+        self.olderVersionNextButton.config(state=tk.DISABLED)
 
     def _startUploading (self) :
         self._initSerialUploadThread()
         self._startUploadingScreen()
+        self._checkProgress = True
+        self.master.after(100, self._updateProgressBar)
 
     def _startUploadingScreen(self):
-        self.master.children[self._currentFrame].pack_forget()
-
-        self.upframe = tk.Frame(self.master, name='upFrame', relief=tk.RAISED,
-                               borderwidth=2, width=self._widthMain,
-                               height=self._heightMain)
-        self.upframe.pack()
-        self._currentFrame = 'upFrame'
+        self.upframe, built = self._showScreen('upFrame')
+        if built :
+            self.labelDebug = tk.StringVar()
+            self.labelUploading = tk.StringVar()
+            self._uploadDevice = tk.StringVar()
+            self._uploadReplacing = tk.StringVar()
+
+            tk.Label(self.upframe, textvariable=self._uploadDevice
+                    ).grid(row=0, column=0, columnspan=self._columns, rowspan=1)
 
-        self._buildGrid(self.upframe)
+            tk.Label(self.upframe, textvariable=self._uploadReplacing
+                    ).grid(row=1, column=0, columnspan=self._columns, rowspan=1)
 
-        self.labelDebug = tk.StringVar()
-        self.labelUploading = tk.StringVar()
+            tk.Label(self.upframe, textvariable=self.labelUploading).grid(row=3, column=0, columnspan=self._columns, rowspan=2)
 
+            self.uploadBar = ttk.Progressbar(self.upframe, orient='horizontal', mode='determinate', length=self._widthMain-16)
+            self.uploadBar.grid(row=5, column=0, columnspan=self._columns)
 
-        if self._fwVersion == "Unknown":
-            tk.Label(self.upframe, text=self._deviceName+"     "+self._fwVersion+' '+self._deviceFwName
-                    ).grid(row=0, column=0, columnspan=self._columns, rowspan=1)
-        else:
-            tk.Label(self.upframe, text=self._deviceName+"     v"+self._fwVersion+' '+self._deviceFwName
-                    ).grid(row=0, column=0, columnspan=self._columns, rowspan=1)
+            tk.Button(self.upframe, text='Debug',
+                 command=lambda: self._enableDebugWindow()
+                 ).grid(row=6, column=4, columnspan=1, rowspan=1, sticky=tk.E+tk.W)
 
-        tk.Label(self.upframe, text="Replacing with v"+self.showVersion+" "+self._newFwName
-                ).grid(row=1, column=0, columnspan=self._columns, rowspan=1)
+            self.debugTextVisible = False
+            self.debugText = LogView.LogView(self.upframe, logger=self.logger,
+                                             width=self._widthMain/9, height=self._heightMain/50)
 
-        self.labelUploading.set(PREPARING)
-        tk.Label(self.upframe, textvariable=self.labelUploading).grid(row=3, column=0, columnspan=self._columns, rowspan=2)
+            tk.Label(self.upframe, name='clickDebugLabel', textvariable=self.labelDebug
+                        ).grid(row=9, column=0, columnspan=self._columns, rowspan=2)
 
-        self.uploadBar = ttk.Progressbar(self.upframe, orient='horizontal', mode='determinate', length=self._widthMain-16)
-        self.uploadBar.grid(row=5, column=0, columnspan=self._columns)
-        self.percent = STEP
+            self.finishButton = tk.Button(self.upframe, text='Finish', state=tk.DISABLED,
+                 command=lambda: self._endUpWiz())
+            self.finishButton.grid(row=self._rows-2, column=1, columnspan=self._columns-2, sticky=tk.E+tk.W)
 
-        debugButton = tk.Button(self.upframe, text='Debug', state=tk.DISABLED,
-             command=lambda: self._enableDebugWindow())
-        debugButton.grid(row=6, column=4, columnspan=1, rowspan=1,
-                    sticky=tk.E+tk.W)
+        self._uploadDevice.set(self._deviceText())
+        self._uploadReplacing.set("Replacing with v"+self.showVersion+" "+self._newFwName)
+        self.debugText.clear() #the screen is reused, drop the log of the previous upload
 
-        self.debugTextVisible = False
-        self.debugText = ScrolledText(self.upframe, width=self._widthMain/9, height=self._heightMain/50)
+        self.labelUploading.set(PREPARING)
+        self.uploadBar.stop()
+        self.uploadBar['value'] = 0
+        self.percent = STEP
+        self._uploadPhase = None
 
+        if self.debugTextVisible :
+            self._enableDebugWindow() #starts with the debug text hidden
         self.fDebugTextCreated.set()
-        debugButton.config(state=tk.ACTIVE)
 
         self.labelDebug.set(UPPROGRESS+'\n'+CLICKDEBUG)
-        tk.Label(self.upframe, name='clickDebugLabel', textvariable=self.labelDebug
-                    ).grid(row=9, column=0, columnspan=self._columns, rowspan=2)
-
-        self.finishButton = tk.Button(self.upframe, text='Finish', state=tk.DISABLED,
-             command=lambda: self._endUpWiz())
-        self.finishButton.grid(row=self._rows-2, column=1, columnspan=self._columns-2, sticky=tk.E+tk.W)
+        self.finishButton.config(state=tk.DISABLED, text='Finish')
 
 
     def _enableDebugWindow(self) :
@@ -1219,10 +1206,7 @@ class FirmwareUploader:
 
 
     def _updateDebugText(self, message) :
-        self.debugText.config(state=tk.NORMAL)
-        self.debugText.insert(tk.END,message)
-        self.debugText.see(tk.END)
-        self.debugText.config(state=tk.DISABLED)
+        self.debugText.write(message) #shown on the next refresh of the view
 
 
 #    def _updateProgressBar(self):
@@ -1254,20 +1238,30 @@ class FirmwareUploader:
                     self.uploadBar[msg[0]] = msg[1]
                 else:
                     self.uploadBar[msg[0]] = msg[1]
-
-            if (self.fw._line_number > ((self.firmware_lines*self.percent)/100)) :
-                self.qSerialUpload.put_nowait(['Debug',"{}% Completed\n".format(self.percent)])
-                self.percent+=STEP
-
-            if (self.fw._line_number == self.firmware_lines) :
-                self.percent = STEP
-                self.uploadBar['value'] = self.uploadBar['maximum']
-                self._checkProgress = False
-
-            elif (self.fw._line_number != self.uploadBar['value']) :
-                self.uploadBar.step(self.fw._line_number-self.uploadBar['value'])
             self.master.after(100, self._updateProgressBar)
 
+    def _showUploadProgress(self, phase, lines, totalLines):
+        """ Moves the progress bar with a progress event of the serial worker,
+            lines count every image of the plan
+        """
+        if not totalLines :
+            return
+        lines = min(lines, totalLines)
+
+        percent = lines*100/totalLines
+        if phase != self._uploadPhase :
+            if phase == 'Verify' :
+                self.labelUploading.set(VERIFYING)
+            elif phase == 'Write' :
+                self.labelUploading.set(UPLOADING)
+            self._uploadPhase = phase
+            self.percent = percent - percent%STEP + STEP #counts from where the pass starts
+        elif percent >= self.percent :
+            self._updateDebugText("{}% Completed\n".format(percent - percent%STEP))
+            self.percent = percent - percent%STEP + STEP
+        self.uploadBar['maximum'] = totalLines
+        self.uploadBar['value'] = lines
+
 
     def _checkSerialUploadMessage(self) :
         if self._checkUploadQueue :
@@ -1277,10 +1271,14 @@ class FirmwareUploader:
                 if (msg[0] == 'Debug') :
                     self._updateDebugText(msg[1])
                     self.qSerialUpload.task_done()
+                elif (msg[0] == 'Flash') :
+                    self._startSerialWorker(msg[1])
+                    self.qSerialUpload.task_done()
                 elif (msg[0] == 'Error') :
                     self._updateDebugText(msg[1])
                     tkMessageBox.showerror('Error',message=msg[1], parent=self.master)
                     self._checkUploadQueue = False
+                    self._checkProgress = False
                     self.qSerialUpload.task_done()
                     self.labelUploading.set(ERRUPLOADING)
                     self.labelDebug.set(ERRUPLOADING+'\n'+CLICKDEBUG)
@@ -1288,21 +1286,19 @@ class FirmwareUploader:
             if not self.tSerialUpload.isAlive() :
                 self._checkDebugText = False
 
+    def _dumpTrace(self, trace) :
+        """ Shows the protocol events that led to a failure
+        """
+        if trace :
+            self._updateDebugText("\n" + "\n".join(trace) + "\n")
+            self.logger.error("Protocol trace:\n" + "\n".join(trace))
+
     def _initSerialUploadThread(self) :
         self.logger.info("Serial Upload Thread Init")
 
-        if self._deviceClass == 'LLAP' or self._deviceClass == 'LLAP2' :
-            self._firmwareFilename = "{}{}-V{}-{}.bin".format(self._fileBase, self.fileExtension, self._lastFwVersion, self.frequency)
-        elif self._deviceClass == 'Serial' :
-            if self.fileExtension == '' : # if no fileExt, remove the last - from the filename
-                self._firmwareFilename = "{}-V{}-{}.bin".format(self._fileBase, self._lastFwVersion, self.frequency)
-            else :
-                self._firmwareFilename = "{}-V{}-{}-{}.bin".format(self._fileBase, self._lastFwVersion, self.frequency, self.fileExtension)
-        elif self._deviceClass == 'USB':
-            if self.fileExtension == '': # if no fileExt, remove the last '-' from the filename
-                self._firmwareFilename = "{}-V{}.bin".format(self._fileBase, self._lastFwVersion)
-            else :
-                self._firmwareFilename = "{}-V{}-{}.bin".format(self._fileBase, self._lastFwVersion, self.fileExtension)
+        self._firmwareFilename = Catalog.firmwareFilename(self._deviceClass, self._fileBase, self._lastFwVersion,
+                                                          self.frequency, self.fileExtension)
+        self._uploadImages = [(self._deviceClass, self._firmwareFilename)]
 
         self.qSerialUpload = Queue.Queue()
         self.qUploadProgressBar = Queue.Queue()
@@ -1319,176 +1315,95 @@ class FirmwareUploader:
 
 
     def _SerialUploadThread(self):
+        """ Downloads the images, the upload itself is left to
+            the serial worker started by the GUI
+        """
         self.logger.info("tSerialUpload: Serial Upload thread started")
         self.fDebugTextCreated.wait() #waits until debugText is created
 
         self._checkUploadQueue = True
         self.master.after(1000,self._checkSerialUploadMessage)
 
-        # setup the Serial and AT and FW classes
-        self.at = AT.AT(serialHandle=self.ser, logger=self.logger)
-        self.fw = FW.FW(serialHandle=self.ser, atHandle=self.at, logger=self.logger)
-
         if self._inBootloaderMode :
             self.qSerialUpload.put(['Debug','Device is in Bootloader Mode\n'])
 
         self.qSerialUpload.put(['Debug','Starting Upload Process\n'])
-        sleep(1)
-        self._uploadFwAndVerify()
-
-    def _uploadFwAndVerify(self) :
-        self.qSerialUpload.put_nowait(['Debug','Entering Write Mode\n'])
-
-        writeMode = False
-        try :
-            writeMode = self.fw.enterWriteMode()
-            self.logger.debug("writeMode = {}".format(writeMode))
-            if not writeMode:
-                self.qSerialUpload.put(['Error',"Error on enter in Write Mode\n"])
-                return
-        except serial.SerialException as e:
-            self.qSerialUpload.put(['Error',"Communication Error"])
-            return
-
-        request = self.downloadFile('bin')
-
-        if str(request) != '200' :
-            self.qSerialUpload.put(['Error',"Error Downloading Firmware File.\nError "+str(request)])
-            #self.uploadBar.stop()
-            self.qUploadProgressBar.put_nowait(["stop"])
-            return
-
-        self.firmware_lines = len(self.firmwareFile)
-
-        self.logger.debug ("Writing FW on {}... Please wait...".format(self._port))
-        self._checkProgress = True
-        self.qUploadProgressBar.put_nowait(["value",0])
-        self.qUploadProgressBar.put_nowait(["maximum",self.firmware_lines])
-        #self.uploadBar['value'] = 0
-        #self.uploadBar['maximum'] = self.firmware_lines
-        self.master.after(100, self._updateProgressBar)
-        lines = 0
-        try :
-            lines = self.fw.sendFirmware(self.firmwareFile)
-        except :
-            self.qSerialUpload.put(['Error',"Communication Error"])
-            return
-
-        if  lines != self.firmware_lines :
-            self.qSerialUpload.put(['Error',"Error while uploading file. Line {}\n".format(lines)])
-            return
-        try :
-            if not self.fw.waitResponse("R") :
-                self.qSerialUpload.put(['Error',"Invalid response received\n"])
+        images = []
+        for deviceClass, fileName in self._uploadImages :
+            request = self.downloadFile('bin', deviceClass, fileName)
+            if str(request) != '200' :
+                self.qSerialUpload.put(['Error',"Error Downloading Firmware File.\nError "+str(request)])
+                self.qUploadProgressBar.put_nowait(["stop"])
                 return
-        except :
-            self.qSerialUpload.put(['Error',"Communication Error"])
-            return
-        try :
-            if not self.fw.waitResponse("y") :
-                self.qSerialUpload.put(['Error',"Invalid response received\n"])
-                return
-        except :
-            self.qSerialUpload.put(['Error',"Communication Error"])
-            return
-
-        #if verify :
-        try :
-            if not self.fw.enterVerifyMode() :
-                self.qSerialUpload.put(['Error',"Invalid response received\n"])
-                return
-        except :
-            self.qSerialUpload.put(['Error',"Communication Error"])
-            return
-        try :
-            self.labelUploading.set(VERIFYING)
-            self.qSerialUpload.put_nowait(['Debug',"100% Completed\n\n"])
-            self.qSerialUpload.put_nowait(['Debug',"Start the Verify process (3/3)\n"])
-            sleep(2)
-            self._checkProgress = True
-            self.master.after(1000, self._updateProgressBar)
-            self.qUploadProgressBar.put_nowait(["value",0])
-            #self.uploadBar['value'] = 0
-            self.qSerialUpload.put_nowait(['Debug',"Enter Verifying Mode\n"])
-        except :
-            self.qSerialUpload.put(['Error',"Error setting Verify Mode"])
-            return
-
-        lines = 0
-        try :
-            lines = self.fw.sendFirmware(self.firmwareFile)
-        except :
-            self.qSerialUpload.put(['Error',"Communication Error"])
-            return
+            images.append((fileName, self.firmwareFile))
 
-        if  lines != self.firmware_lines :
-            self.qSerialUpload.put(['Error',"Invalid response received\n"])
-            return
-        try :
-            if not self.fw.sendCommit() :
-                self.qSerialUpload.put(['Error',"Error sending commit\n"])
-                return
-        except :
-            self.qSerialUpload.put(['Error',"Communication Error"])
-            return
-
-        self.qSerialUpload.put_nowait(['Debug',"100% Completed\n\n"])
-        self.qSerialUpload.put_nowait(['Debug',"All OK, Device successfully reprogrammed!\n"])
-        self.qSerialUpload.put_nowait(['Debug',"Waiting for device to settle...\n\n"])
+        self.qSerialUpload.put(['Flash', FlashPlan.FlashPlan.chain(images)])
+        self.logger.info("tSerialUpload: Thread stopping")
 
-        try :
-            if self._baudrate != 9600: #if is different than 9600, change the baudrate of the port to given baudrate again
-                self.ser = self.fw.restartSerial(self._port, self._baudrate, timeout=self._serialTimeout)#due to a driver error on OSX, we need to restart 2 times
-                self.ser = self.fw.restartSerial(self._port, self._baudrate, timeout=self._serialTimeout)
-                self.at = AT.AT(serialHandle=self.ser, logger=self.logger)
-                self.fw = FW.FW(serialHandle=self.ser, atHandle=self.at, logger=self.logger)
-        except :
-            self.qSerialUpload.put(['Error',"Error opening Comm port"])
+    def _startSerialWorker(self, plan) :
+        """ Writes and verifies the images of plan from a SerialWorker,
+            a process of its own that the GUI only follows
+        """
+        transferBaudrate = self._configTransferBaudrate()
+
+        self._uploadPlan = plan
+        self.session.close() #the worker opens the port itself
+        job = FlashJob.FlashJob(self._port, plan,
+                                baudrate=self._baudrate,
+                                verify=True,
+                                timeout=self._serialTimeout,
+                                logger=self.logger,
+                                serialFactory=self._openSerial,
+                                transferBaudrate=transferBaudrate,
+                                portStats=self.portStats,
+                                lineControl=self.lineControl,
+                                force=True,
+                                identity=self._identity)
+        self.serialWorker = SerialWorker.SerialWorker(job,
+                                                      priority=self._configInt('FirmwareUploader', 'worker_priority', 0),
+                                                      logger=self.logger,
+                                                      wireRecorder=self.wireRecorder)
+        self.serialWorker.start()
+        self.master.after(100, self._checkSerialWorker)
+
+    def _checkSerialWorker(self) :
+        for event in self.serialWorker.poll() :
+            if event[0] == 'log' and event[1].levelno >= logging.INFO :
+                self._updateDebugText(event[1].getMessage()+"\n")
+            elif event[0] == 'progress' :
+                self._showUploadProgress(*event[1:])
+
+        if self.serialWorker.done() :
+            self._uploadFinished(self.serialWorker.result)
+        else :
+            self.master.after(100, self._checkSerialWorker)
+
+    def _uploadFinished(self, result) :
+        self._checkProgress = False
+        self._checkUploadQueue = False
+        self.finishButton.config(state=tk.NORMAL, text="Finish")
+
+        # every stage is added once committed, a failure after the
+        # last one is only the new version not being read back
+        written = len(result.get('stages', [])) == len(self._uploadPlan.stages)
+        if result['status'] != 'ok' and not written :
+            self._dumpTrace(result.get('trace'))
+            tkMessageBox.showerror('Error', message=result['error'] or COMMERROR, parent=self.master)
+            self.labelUploading.set(ERRUPLOADING)
+            self.labelDebug.set(ERRUPLOADING+'\n'+CLICKDEBUG)
             return
 
-        self.ser.flushInput()
-        sleep(3) #waits for the device restart
-        try :
-            if not self.at.enterATMode() :
-                self.qSerialUpload.put(['Debug',"Error obtaining new Version\n"])
-                try:
-                    self.ser.close()
-                    self.finishButton.config(state=tk.NORMAL, text="Finish") #enable the Next button if successfully update
-                    self.labelUploading.set(UPFINISHED+"\n\nError obtain the new firmware version")
-                except serial.SerialException as e:
-                    self.logger.exception("Error closing Comm port")
-                return
-        except :
-            self.qSerialUpload.put(['Error',"Communication Error"])
+        self._showUploadProgress(self._uploadPhase, self._uploadPlan.totalLines(), self._uploadPlan.totalLines())
+        self.labelDebug.set(UPFINISHED+'\n'+CLICKDEBUG)
+        if result['status'] != 'ok' :
+            self._updateDebugText("Error obtaining new Version\n")
+            self.labelUploading.set(UPFINISHED+"\n\nError obtain the new firmware version")
             return
-        try :
-            fwVersion = self.fw.checkFWVersion()
-            if not fwVersion :
-                self.qSerialUpload.put_nowait(['Debug',"Invalid response received\nCan't check for the new version"])
-                self.ser.close()
-                self.finishButton.config(state=tk.NORMAL, text="Finish") #enable the Next button if successfully update
-                return
-            else :
-                newFwNumber = fwVersion.split(' ',1) # split into version and fw name
-                newDevFw = newFwNumber[1].rsplit('\r',1)[0] # removes the \r at end of fw name
-                newFwNumber = newFwNumber[0] # "converts" to string
-                newFwNumber = newFwNumber.split('B',1)[0] # removes anything after the version number
-                if '0.' in newFwNumber : #removes the 0. of the version number
-                    newFwNumber = newFwNumber.split('.',1)[1]
-
-                self.qSerialUpload.put_nowait(['Debug',"Update Finished\n\nNew Firmware Version: "+newFwNumber+' '+newDevFw])
-        except :
-            self.qSerialUpload.put_nowait(['Debug',"Invalid response received\nCan't check for the new version"])
 
-        self.logger.info("tSerialUpload: Thread stopping")
-
-        try:
-            self.ser.close()
-            self.finishButton.config(state=tk.NORMAL, text="Finish") #enable the Next button if successfully update
-            self.labelUploading.set(UPFINISHED+"\n\nNew Firmware Version: "+newFwNumber+' '+newDevFw)
-            self.labelDebug.set(UPFINISHED+'\n'+CLICKDEBUG)
-        except serial.SerialException as e:
-            self.logger.exception("Error closing Comm port")
+        newFwNumber, newDevFw = DeviceIdentity.parseVersion(result['fwVersion'])
+        newFwNumber = newFwNumber.split('B',1)[0] # removes anything after the version number
+        self._updateDebugText("Update Finished\n\nNew Firmware Version: "+newFwNumber+' '+newDevFw)
+        self.labelUploading.set(UPFINISHED+"\n\nNew Firmware Version: "+newFwNumber+' '+newDevFw)
 
 
 
@@ -1512,6 +1427,13 @@ class FirmwareUploader:
 
 
     def _checkSerialInitErrors(self):
+        if self._needsBootloaderUpdate and self._bootloaderUpdateFile() :
+            if tkMessageBox.askyesno(ERRDEV, UPDATEBOOTLOADER, parent=self.master) :
+                self._startBootloaderUpdate()
+            else:
+                self._startOver()
+            return False
+
         if self._oldDevice :
             tkMessageBox.showerror(ERRDEV,OLDDEVICE, parent=self.master)
             self._startOver()
@@ -1573,162 +1495,111 @@ class FirmwareUploader:
         self._commFail = False
         self._inBootloaderMode = False
         self._oldBootloader = False
+        self._needsBootloaderUpdate = False
         self._bootloader4 = False
 
         # setup the Serial and AT and FW classes
+        self.session = SerialSession.SerialSession(self._port, self._baudrate, self._serialTimeout, self.logger,
+                                                   opener=self._openSerial,
+                                                   lineControl=self.lineControl)
         try :
-            self.ser = serial.Serial(self._port, self._baudrate,timeout=self._serialTimeout)
+            self.ser = self.session.open()
         except serial.SerialException as e:
             self.qSerialGetVersion.put("Failed to open port {}: {}".format(self._port,e.strerror))
             return
-
-        try :
-            self.at = AT.AT(serialHandle=self.ser, logger=self.logger)
-            self.fw = FW.FW(serialHandle=self.ser, atHandle=self.at, logger=self.logger)
         except :
             self.qSerialGetVersion.put("Communication Error")
             return
-
-
-        if self.args.bootloader :
-            self._inBootloaderMode = True
-            self._setBootloaderFolder(False)
-            self._fwVersion = 'Unknown'
-            self.tSerialGetVersionStop.set()
-            return
+        self.at = self.session.at
+        self.fw = self.session.fw
 
         try :
-            if not self.at.enterATMode() : #if comm fails
-                if self._baudrate != 9600 : #changes the port baudrate to check if device is in bootloader mode
-                    try :
-                        self.ser = self.fw.restartSerial(self._port, baudrate=9600,timeout=self._serialTimeout) #due to a driver error on OSX, we need to restart 2 times
-                        self.ser = self.fw.restartSerial(self._port, baudrate=9600,timeout=self._serialTimeout)
-                    except serial.SerialException as e:
-                        self.qSerialGetVersion.put("Failed to open port {}: {}".format(self._port,e.strerror))
-                        return
-                self.logger.debug("Failed to enter on AT mode.")
-                self.logger.debug("Checking if device is in bootloader mode")
-                try :
-                    bootloaderVersion = int(self.fw.checkBootloaderVersion())
-                    if not bootloaderVersion:
-                        self.logger.info("tSerialGetVersion: Thread stopping")
-                        self._commFail = True
-                        return
-                except serial.SerialException as e:
-                    self.qSerialGetVersion.put("Failed to close port {}: {}".format(self._port,e.strerror))
-                    return
-
-                self._inBootloaderMode = True
-                self._setBootloaderFolder(bootloaderVersion)
-                self._fwVersion = 'Unknown'
-                self.tSerialGetVersionStop.set()
-                return
-        except :
-            self.qSerialGetVersion.put("Communication Error")
+            identity = DeviceIdentity.identify(self.session, inBootloader=self.args.bootloader, logger=self.logger)
+        except serial.SerialException as e:
+            self.qSerialGetVersion.put("Failed to open port {}: {}".format(self._port,e.strerror))
             return
-
-        try :
-            self._fwVersion = self.fw.checkFWVersion()
         except :
-            self.qSerialGetVersion.put("Error obtaining the FW Version")
+            self.qSerialGetVersion.put("Communication Error")
             return
-
-        if self._fwVersion :
-            try :
-                self._fwVersion = self._fwVersion.split(' ',1)  # divides the version in two list elements, Firmware Version and Device Name
-                self._deviceFwName = self._fwVersion[1].rsplit('\r',1)[0] # Eliminates the '\n' of the end of the name
-                self._fwVersion = self._fwVersion[0] #store the version with the, possibly, letters (B and U)
-                if '0.' in self._fwVersion : #removes the 0. of the version number
-                    self._fwVersion = self._fwVersion.split('.',1)[1]
-
-                if self._deviceFwName == '':
-                    self._oldDevice = True
-                    self.fw.exitATMode()
-                    return
-                if "B" not in self._fwVersion :
-                    self._oldDevice = True
-                    self.fw.exitATMode()
-                    return
-                elif "U" in self._fwVersion :
-                    self._usbMode = True
-                    self.fw.exitATMode()
-                    return
-
-                self._fwVersion = self._fwVersion.split('B',1)[0] #leaves only the version number on string
-            except :
-                self.qSerialGetVersion.put("Error Setting Version")
-                return
-
-            try :
-                self.fw.enterProgramMode()
-            except :
-                self.qSerialGetVersion.put("Communication Error")
-                return
-
-            if self._baudrate != 9600 :
-                try :
-                    self.ser = self.fw.restartSerial(self._port, 9600,timeout=self._serialTimeout)
-                    self.at = AT.AT(serialHandle=self.ser, logger=self.logger)
-                    self.fw = FW.FW(serialHandle=self.ser, atHandle=self.at, logger=self.logger)
-                except serial.SerialException as e:
-                    self.qSerialGetVersion.put("Failed to open port {}: {}".format(self._port,e.strerror))
-                    return
-
-            sleep(0.05) #time for device reboot
-            self._setBootloaderFolder()
-        else : #in case of response from AT but no fwVersion response, sends comm error
+        self.ser = self.session.ser
+        self._identity = identity
+        self.logger.debug("Device identified in {}s".format(identity.elapsed))
+
+        self._inBootloaderMode = identity.inBootloader
+        self._oldDevice = identity.oldDevice
+        self._usbMode = identity.usbMode
+        self._commFail = identity.commFail
+        self._needsBootloaderUpdate = identity.needsBootloaderUpdate()
+        if self._oldDevice or self._usbMode or self._commFail :
             self.logger.info("tSerialGetVersion: Thread stopping")
-            self._commFail = True
-            self.fw.exitATMode() #make sure device quit AT Mode, if fails
             return
 
+        self._fwVersion = identity.fwVersion
+        self._deviceFwName = identity.fwName
+        self._bootloader4 = identity.bootloaderVersion == 4
+        self._oldBootloader = identity.isOldBootloader()
+        if not self._bootloader4 and not self._oldBootloader :
+            self._bootloaderFolder = identity.bootloaderFolder() #only reaches here if is bootloader v3d
+
         self.logger.info("tSerialGetVersion: Thread stopping")
         self.tSerialGetVersionStop.set()
 
 
-    def _setBootloaderFolder(self, version=False) :
-        bootloaderVersion = version
-        if not version:
-            try :
-                bootloaderVersion = int(self.fw.checkBootloaderVersion())
-                if not bootloaderVersion:
-                    self.logger.info("tSerialGetVersion: Thread stopping")
-                    self._commFail = True
-                    return
-            except serial.SerialException as e:
-                self.qSerialGetVersion.put("Failed to close port {}: {}".format(self._port,e.strerror))
-                return
-            sleep(2)
-
-        self.logger.debug ("Bootloader Version: {}".format(bootloaderVersion))
-
-        if (bootloaderVersion < 3) :
-            self._oldDevice = True
+    def _bootloaderUpdateFile(self):
+        """ Returns the bootloader update image configured (or None)
+        """
+        if (self.config.has_option('FirmwareUploader', 'bootloader_update') and
+            self.config.get('FirmwareUploader', 'bootloader_update')):
+            return Resources.resourcePath(self.config.get('FirmwareUploader', 'bootloader_update'))
+        return None
+
+    def _startBootloaderUpdate(self):
+        """ Writes the bootloader update on the device from a SerialWorker,
+            the device is identified again once it is done
+        """
+        updater = FW.readFirmwareFile(self._bootloaderUpdateFile(), self.logger)
+        if not updater :
+            tkMessageBox.showerror(ERRDEV, "Unable to read the bootloader update", parent=self.master)
+            self._startOver()
             return
 
-        if (bootloaderVersion == 4) :
-            self._bootloader4 = True
+        self.session.close() #the job opens the port itself
+        job = FlashJob.FlashJob(self._port, FlashPlan.FlashPlan.bootloaderUpdate(updater),
+                                baudrate=self._baudrate,
+                                timeout=self._serialTimeout,
+                                logger=self.logger,
+                                serialFactory=self._openSerial,
+                                portStats=self.portStats,
+                                lineControl=self.lineControl,
+                                force=True)
+        self.serialWorker = SerialWorker.SerialWorker(job,
+                                                      priority=self._configInt('FirmwareUploader', 'worker_priority', 0),
+                                                      logger=self.logger,
+                                                      wireRecorder=self.wireRecorder)
+        self.serialWorker.start()
+
+        self.startCommunicatingScreen(UPDATINGBOOTLOADER)
+        self.master.after(1000, self._checkBootloaderUpdate)
+
+    def _checkBootloaderUpdate(self):
+        self.serialWorker.poll()
+        if not self.serialWorker.done() :
+            self.master.after(1000, self._checkBootloaderUpdate)
             return
 
-        if bootloaderVersion == 3 : #should check for the subversion is equals d, otherwise bootloader must be updated
-            try :
-                bootloaderSubVersion = self.fw.checkBootloaderSubVersion()
-                if not bootloaderSubVersion:
-                    self.logger.info("tSerialGetVersion: Thread stopping")
-                    self._commFail = True
-                    return
-            except serial.SerialException as e:
-                self.qSerialGetVersion.put("Failed to close port {}: {}".format(self._port,e.strerror))
-                return
-
-            self.logger.debug ("Sub Version: {}".format(bootloaderSubVersion))
-            if bootloaderSubVersion not in ["d","D"] :
-                self._oldBootloader = True
-                return
-
-        self._bootloaderFolder = 'BootloaderV{}'.format(bootloaderVersion) #only reaches here if is bootloader v3d
-        return
+        self.commProgressBar.stop()
+        result = self.serialWorker.result
+        if result['status'] == 'ok' :
+            tkMessageBox.showinfo(BOOTLOADERMODE, BOOTLOADERUPDATED, parent=self.master)
+            self._setCOMPort()
+            return
 
+        tkMessageBox.showerror(ERRDEV, result['error'] or COMMERROR, parent=self.master)
+        try :
+            self.ser = self.session.reopen()
+        except serial.SerialException:
+            self.logger.exception("Unable to open the port again")
+        self._startOver()
 
     def _onDeviceSelect(self, evt):
         w = evt.widget
@@ -1805,9 +1676,7 @@ class FirmwareUploader:
 
     def _startOver(self):
         self.logger.debug("Starting over")
-        self.master.children[self._currentFrame].pack_forget()
-        self.iframe.pack()
-        self._currentFrame = 'introFrame'
+        self._showScreen('introFrame')
         self.fw.sendCommit() #send commit to try remove device from bootloader mode
         self.ser.close()
         self.bootloaderVersion = False
@@ -1819,6 +1688,56 @@ class FirmwareUploader:
         self.baudrateCombobox.set(str(self._baudrate))
 
 
+    def _showScreen(self, name) :
+        """
+            Shows the frame of a screen in place of the current one,
+            the frame is built the first time only and kept for reuse
+            Returns the frame and True when it was just built, the
+            caller then creates its widgets
+        """
+        if self._currentFrame and self._currentFrame != name :
+            self.master.children[self._currentFrame].pack_forget()
+
+        frame = self._screens.get(name)
+        built = frame is None
+        if built :
+            frame = tk.Frame(self.master, name=name, relief=tk.RAISED,
+                             borderwidth=2, width=self._widthMain,
+                             height=self._heightMain)
+            self._buildGrid(frame)
+            self._screens[name] = frame
+        frame.pack()
+        self._currentFrame = name
+        return frame, built
+
+    def _buildListbox(self, frame, onSelect) :
+        """
+            Creates a listbox with scrollbars, returns it and the
+            frame holding it
+        """
+        lbframe = tk.Frame(frame, bd=1, relief=tk.SUNKEN)
+
+        listbox = tk.Listbox(lbframe, selectmode=tk.SINGLE, bd=0, height=9)
+        listbox.bind('<<ListboxSelect>>', onSelect)
+
+        sV = tk.Scrollbar(lbframe)
+        sV.pack(side=tk.RIGHT, fill=tk.Y)
+        sV.config(command=listbox.yview)
+        listbox.config(yscrollcommand=sV.set)
+
+        sH = tk.Scrollbar(lbframe, orient=tk.HORIZONTAL)
+        sH.pack(side=tk.BOTTOM, fill=tk.X)
+        sH.config(command=listbox.xview)
+        listbox.config(xscrollcommand=sH.set)
+
+        listbox.pack(fill=tk.X)
+        return listbox, lbframe
+
+    def _fillListbox(self, listbox, items) :
+        listbox.delete(0, tk.END)
+        for item in items :
+            listbox.insert(tk.END, item)
+
     def _buildGrid(self, frame, quit=False, halfSize=False):
         self.logger.debug("Building Grid for {}".format(frame.winfo_name()))
         canvas = tk.Canvas(frame, bd=0, width=self._widthMain-4,
@@ -1853,13 +1772,30 @@ class FirmwareUploader:
         self._running = False
 
 
+    def _cancelSerial(self):
+        """ Interrupts any serial thread still using the device
+        """
+        if getattr(self, 'session', None):
+            self.session.cancel()
+        if getattr(self, 'serialWorker', None):
+            self.serialWorker.stop()
+
     def _cleanUp(self):
         self.logger.debug("Clean up and exit")
+        self._cancelSerial()
+        if getattr(self, 'dashboard', None) :
+            self.dashboard.stop()
         if hasattr(self,'fw'):
             self.fw.sendCommit() #try to remove the device from bootloader mode
         if hasattr(self,'ser'):
             self.ser.close()
+        if getattr(self, 'wireRecorder', None):
+            self.wireRecorder.close()
+        if getattr(self, 'lineControl', None):
+            self.lineControl.close()
         self._writeConfig()
+        if self._logListener:
+            self._logListener.stop()
 
 
     def _checkArgs(self):
@@ -1884,12 +1820,12 @@ class FirmwareUploader:
 
         # load defaults
         try:
-            self.config.readfp(open(self._configFileDefault))
+            self.config.readfp(open(Resources.resourcePath(self._configFileDefault)))
         except:
             self.logger.debug("Could Not Load Default Settings File")
 
         # read the user config file
-        if not self.config.read(self._configFile):
+        if not self.config.read(Resources.resourcePath(self._configFile)):
             self.logger.debug("Could Not Load User Config, One Will be Created on Exit")
 
         if not self.config.sections():
@@ -1899,28 +1835,26 @@ class FirmwareUploader:
 
     def _writeConfig(self):
         self.logger.debug("Writing Config")
-        with open(self._configFile, 'wb') as _configFile:
+        with open(Resources.resourcePath(self._configFile), 'wb') as _configFile:
             self.config.write(_configFile)
 
     def _loadDevices(self):
         self.logger.debug("Loading device List")
         self.logger.debug("Downloading JSON File")
-        request = self.downloadFile('json')
+        self.catalog = Catalog.Catalog(self.config.get('FirmwareUploader', 'url_path'),
+                                       self.config.get('FirmwareUploader', 'json_file'),
+                                       self.logger)
+        request = self.catalog.load()
 
         if str(request) != '200' :
             tkMessageBox.showerror("Error","Error downloading JSON File\nError "+str(request), parent=self.master)
             sys.exit(1)
 
-        try:
-            self._usbCommon = json.loads(self.jsonFile)['USB']
-            self._llapCommon = json.loads(self.jsonFile)['LLAP']
-            self._llap2Common = json.loads(self.jsonFile)['LLAP2']
-            self._serialCommon = json.loads(self.jsonFile)['Serial']
-            self._devices = json.loads(self.jsonFile)['Devices']
-
-        except :
-            self.logger.debug("Could Not Load JSON File")
-            sys.exit(1)
+        self._usbCommon = self.catalog.classes['USB']
+        self._llapCommon = self.catalog.classes['LLAP']
+        self._llap2Common = self.catalog.classes['LLAP2']
+        self._serialCommon = self.catalog.classes['Serial']
+        self._devices = self.catalog.devices
 
 
 
@@ -1929,6 +1863,7 @@ class FirmwareUploader:
             Try cleaning up what we can and exit
         """
         self.logger.critical("DIE")
+        self._cancelSerial()
         if hasattr(self, 'ser') :
             self.logger.debug("Trying to close serial port")
             self.ser.close()
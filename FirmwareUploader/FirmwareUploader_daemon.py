@@ -0,0 +1,559 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Firmware Uploader Daemon
+    Stays resident with the firmware catalog and images in memory and
+    runs flash jobs submitted over a local Unix socket
+
+    Requests and replies are JSON objects, one per line:
+        {"cmd": "flash", "port": "/dev/ttyUSB0", "file": "/path/fw.bin", "verify": true}
+        {"cmd": "flash", "port": "/dev/ttyUSB0", "file": "/path/fw.bin", "transferBaudrate": 115200}
+        {"cmd": "flash", "port": "/dev/ttyUSB0", "file": "/path/fw.bin", "lineControl": "serial:dtr,rts"}
+        {"cmd": "flash", "port": "/dev/ttyUSB0", "file": "/path/fw.bin", "verifyOnly": true}
+        {"cmd": "flash", "port": "/dev/ttyUSB0", "file": "/path/fw.bin", "bootloaderUpdate": "/path/boot.bin"}
+        {"cmd": "flash", "port": "/dev/ttyUSB0", "file": "/path/setup.bin", "then": ["/path/fw.bin"]}
+        {"cmd": "flash", "port": "/dev/ttyUSB0", "catalog": {"firmware": "LLAPTHERM"}, "skipCurrent": true}
+        {"cmd": "flash", "port": "/dev/ttyUSB0", "catalog": {"firmware": "LLAPTHERM", "device": "XRF v2.0"}}
+        {"cmd": "status", "job": 1}
+        {"cmd": "wait", "job": 1, "timeout": 60}
+        {"cmd": "cancel", "job": 1}
+        {"cmd": "jobs"}
+        {"cmd": "ports"}
+        {"cmd": "release", "port": "/dev/ttyUSB0"}
+        {"cmd": "reload"}
+        {"cmd": "shutdown"}
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import os
+import sys
+import json
+import errno
+import socket
+import argparse
+import logging
+import threading
+import Queue
+import SocketServer
+import ConfigParser
+from time import time
+from collections import OrderedDict, deque
+import FW
+import Catalog
+import Resources
+import FlashJob
+import FlashPlan
+import PortStats
+import LineControl
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+    """ Reads one JSON request per line and writes one JSON reply per line
+    """
+
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            if not line.strip():
+                continue
+            try :
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("expected a JSON object")
+                reply = self.server.daemon.handleRequest(request)
+            except ValueError as e:
+                reply = {'ok': False, 'error': "Invalid request: {}".format(e)}
+            except Exception as e:
+                self.server.daemon.logger.exception("Error handling request {}".format(line.strip()))
+                reply = {'ok': False, 'error': "Invalid request: {}".format(e)}
+            self.wfile.write(json.dumps(reply) + '\n')
+            self.wfile.flush()
+            if self.server.daemon.stopping:
+                break
+
+    def finish(self):
+        SocketServer.StreamRequestHandler.finish(self)
+        if self.server.daemon.stopping:
+            self.server.shutdown()
+
+
+class _UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+class FWDaemon():
+
+    _configFileDefault = "FirmwareUploader_defaults.cfg"
+    _configFile = "FirmwareUploader.cfg"
+    _jobHistory = 1000 #finished jobs kept for status requests
+
+    def __init__(self):
+        self._checkArgs()
+        self._initLogging()
+        self._readConfig()
+
+        self._jobs = OrderedDict()
+        self._jobsLock = threading.Lock()
+        self._jobsDone = threading.Condition(self._jobsLock)
+        self._nextJobId = 1
+        self._queue = Queue.PriorityQueue() #jobs ready to run, on degraded ports last
+        self._portQueues = {} #port -> jobs waiting for the one queued or running there
+        self.stopping = False
+
+    def _checkArgs(self):
+        parser = argparse.ArgumentParser(description="FW Uploader Daemon")
+        parser.add_argument("-s", "--socket",
+                            help="Path of the Unix socket to listen on",
+                            default="/tmp/FirmwareUploader.sock"
+                            )
+        parser.add_argument("-w", "--workers",
+                            help="Number of jobs run at the same time",
+                            type=int,
+                            default=4
+                            )
+        parser.add_argument("-t", "--timeout",
+                            help="Sets the serial timeout",
+                            type=int,
+                            default=1
+                            )
+        parser.add_argument('-d', '--debug',
+                            help="Enable debug output to console",
+                            action='store_true'
+                            )
+        parser.add_argument("--bootloader-update",
+                            help="Default bootloader update image, written first on devices with a bootloader older than 3d"
+                            )
+        parser.add_argument("--transfer-baudrate",
+                            help="Default baudrate to try for the bootloader transfer, falls back to 9600 "
+                                 "(default: the last one that worked on the port, else 9600)",
+                            type=int
+                            )
+        parser.add_argument("--no-low-latency",
+                            help="Leave the latency timer of USB serial adapters unchanged",
+                            dest="low_latency",
+                            action="store_false"
+                            )
+        parser.add_argument("--measure-latency",
+                            help="Report the bootloader round trip with the original and the low latency port settings",
+                            action="store_true"
+                            )
+        parser.add_argument("--retries",
+                            help="Times a firmware line that is not acknowledged is sent again",
+                            type=int,
+                            default=3
+                            )
+        parser.add_argument("--retry-budget",
+                            help="Total retries allowed for one device before giving up",
+                            type=int,
+                            default=32
+                            )
+        parser.add_argument("--line-control",
+                            metavar="SPEC",
+                            help="Default lines used to force AT mode and reset the devices: "
+                                 "gpio:AT[,RESET], gpiochip:CHIP:AT[,RESET], serial[:dtr,rts] or fake"
+                            )
+        parser.add_argument("--port-stats",
+                            help="File remembering which transfer baudrate works on each port",
+                            default=Resources.statePath("FirmwareUploader_ports.json")
+                            )
+        parser.add_argument("--quarantine-after",
+                            help="Failed sessions in a row before a port is quarantined",
+                            type=int,
+                            default=PortStats.PortStats.quarantineAfter
+                            )
+        parser.add_argument("--max-nak-rate",
+                            help="NAKs per firmware line past which a port is degraded and used last",
+                            type=float,
+                            default=PortStats.PortStats.thresholds['nakRate']
+                            )
+        parser.add_argument("--max-failure-rate",
+                            help="Failed sessions past which a port is degraded and used last",
+                            type=float,
+                            default=PortStats.PortStats.thresholds['failureRate']
+                            )
+        parser.add_argument("-c", "--client",
+                            metavar="REQUEST",
+                            help="Send a JSON request to a running daemon and print the reply"
+                            )
+
+        self.args = parser.parse_args()
+
+    def _initLogging(self):
+        logging.getLogger().setLevel(logging.NOTSET)
+        self.logger = logging.getLogger('FW Uploader Daemon')
+        _ch = logging.StreamHandler()
+
+        if (self.args.debug):
+            _ch.setLevel(logging.DEBUG)
+        else:
+            _ch.setLevel(logging.INFO)
+            self.logger.setLevel(logging.INFO)
+
+        _formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        _ch.setFormatter(_formatter)
+        self.logger.addHandler(_ch)
+
+    def _readConfig(self):
+        self.config = ConfigParser.SafeConfigParser()
+        try:
+            self.config.readfp(open(Resources.resourcePath(self._configFileDefault)))
+        except IOError:
+            self.logger.debug("Could Not Load Default Settings File")
+        self.config.read(Resources.resourcePath(self._configFile))
+
+    def _retryPolicy(self):
+        """ Returns a new retry policy for one device
+        """
+        return FW.RetryPolicy(recordRetries=self.args.retries, sessionBudget=self.args.retry_budget)
+
+    def _portStats(self, fileName):
+        """ Loads the port statistics with the health limits given
+        """
+        return PortStats.PortStats(fileName, self.logger,
+                                   thresholds={'nakRate': self.args.max_nak_rate,
+                                               'failureRate': self.args.max_failure_rate},
+                                   quarantineAfter=self.args.quarantine_after)
+
+    def _loadCatalog(self):
+        """ Downloads the catalog, failures are reported but
+            jobs using local files can still run
+        """
+        status = self.catalog.load()
+        if str(status) != '200':
+            self.logger.warning("Unable to load the firmware catalog: {}".format(status))
+        return status
+
+    def on_execute(self):
+        if self.args.client:
+            self.client(self.args.client)
+            return
+
+        self.catalog = Catalog.Catalog(self.config.get('FirmwareUploader', 'url_path'),
+                                       self.config.get('FirmwareUploader', 'json_file'),
+                                       self.logger)
+        self._loadCatalog()
+        self.portStats = self._portStats(self.args.port_stats)
+        self._removeStaleSocket()
+
+        for w in range(self.args.workers):
+            worker = threading.Thread(target=self._worker)
+            worker.daemon = True
+            worker.start()
+
+        self.server = _UnixServer(self.args.socket, _RequestHandler)
+        self.server.daemon = self
+
+        self.logger.info("Listening on {}".format(self.args.socket))
+        try :
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            self.logger.info("Keyboard Interrupt - Exiting")
+        finally:
+            self.server.server_close()
+            os.unlink(self.args.socket)
+            self._cancelJobs()
+
+    def _removeStaleSocket(self):
+        """ Removes the socket left by a daemon that is no longer running,
+            exits if a daemon still listens on it
+        """
+        if not os.path.exists(self.args.socket):
+            return
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try :
+            sock.connect(self.args.socket)
+        except socket.error as e:
+            if e.errno != errno.ECONNREFUSED:
+                self.logger.error("Unable to use {}: {}".format(self.args.socket, e))
+                sys.exit(1)
+            os.unlink(self.args.socket)
+            return
+        finally:
+            sock.close()
+        self.logger.error("A daemon is already listening on {}".format(self.args.socket))
+        sys.exit(1)
+
+    def client(self, request):
+        """ Sends one request to a running daemon and prints the reply
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try :
+            sock.connect(self.args.socket)
+        except socket.error as e:
+            self.logger.error("Unable to connect to {}: {}".format(self.args.socket, e))
+            sys.exit(1)
+        f = sock.makefile('rw')
+        f.write(request.strip() + '\n')
+        f.flush()
+        reply = f.readline()
+        sock.close()
+        print(reply.strip())
+        try :
+            sys.exit(0 if json.loads(reply).get('ok') else 1)
+        except ValueError:
+            sys.exit(1)
+
+    def handleRequest(self, request):
+        cmd = request.get('cmd')
+        if cmd == 'flash':
+            return self._submit(request)
+        elif cmd == 'status':
+            job = self._getJob(request.get('job'))
+            if job is None:
+                return {'ok': False, 'error': "Unknown job"}
+            return {'ok': True, 'job': self._jobStatus(job)}
+        elif cmd == 'wait':
+            return self._wait(request.get('job'), request.get('timeout'))
+        elif cmd == 'cancel':
+            job = self._getJob(request.get('job'))
+            if job is None:
+                return {'ok': False, 'error': "Unknown job"}
+            job['flash'].cancel()
+            return {'ok': True, 'job': self._jobStatus(job)}
+        elif cmd == 'jobs':
+            with self._jobsLock:
+                return {'ok': True, 'jobs': [self._jobStatus(job) for job in self._jobs.values()]}
+        elif cmd == 'ports':
+            return {'ok': True, 'ports': dict((port, self.portStats.health(port)) for port in self.portStats.ports())}
+        elif cmd == 'release':
+            return {'ok': self.portStats.release(request.get('port'))}
+        elif cmd == 'reload':
+            status = self._loadCatalog()
+            return {'ok': str(status) == '200', 'status': str(status)}
+        elif cmd == 'shutdown':
+            self.stopping = True
+            return {'ok': True}
+        return {'ok': False, 'error': "Unknown command {}".format(cmd)}
+
+    def _cancelJobs(self, timeout=2.0):
+        """ Cancels every queued or running job and waits
+            a little for the running ones to free their ports
+        """
+        deadline = time() + timeout
+        with self._jobsLock:
+            for job in self._jobs.values():
+                if job['state'] in ('queued', 'running'):
+                    job['flash'].cancel()
+            while any(job['state'] == 'running' for job in self._jobs.values()):
+                remaining = deadline - time()
+                if remaining <= 0:
+                    break
+                self._jobsDone.wait(remaining)
+
+    def _getJob(self, jobId):
+        with self._jobsLock:
+            return self._jobs.get(jobId)
+
+    def _jobStatus(self, job):
+        status = dict((k, v) for k, v in job.items() if k != 'flash')
+        if job['flash'] is not None:
+            status.update(job['flash'].result)
+            status['progress'] = job['flash'].progress()
+        return status
+
+    def _loadImage(self, request):
+        """ Returns the firmware lines of a request and the
+            name they were loaded from (or None and an error)
+        """
+        if request.get('file'):
+            firmware = self.catalog.loadFile(request['file'])
+            if not firmware:
+                return None, "Unable to read firmware file {}".format(request['file'])
+            return firmware, request['file']
+
+        selection = request.get('catalog')
+        if not selection:
+            return None, "No firmware file or catalog entry given"
+        if not self.catalog.loaded:
+            return None, "Firmware catalog not loaded"
+        path = self.catalog.resolve(selection.get('firmware'), selection.get('device'), selection.get('version'))
+        if path is None:
+            return None, "No catalog entry for {}".format(selection)
+        status, firmware = self.catalog.getImage(path)
+        if str(status) != '200':
+            return None, "Error Downloading Firmware File {}: {}".format(path, status)
+        return firmware, path
+
+    def _flashPlan(self, request, firmware):
+        """ Adds the bootloader update and the following images of a request
+            around its firmware, returns the plan (or None and an error)
+        """
+        updaterFile = request.get('bootloaderUpdate', self.args.bootloader_update)
+        chainedFiles = request.get('then') or []
+        if not updaterFile and not chainedFiles:
+            return firmware, None
+
+        plan = FlashPlan.FlashPlan()
+        if updaterFile:
+            updater = self.catalog.loadFile(updaterFile)
+            if not updater:
+                return None, "Unable to read bootloader update {}".format(updaterFile)
+            plan = FlashPlan.FlashPlan.bootloaderUpdate(updater)
+
+        images = [('firmware', firmware)]
+        for fileName in chainedFiles:
+            lines = self.catalog.loadFile(fileName)
+            if not lines:
+                return None, "Unable to read firmware file {}".format(fileName)
+            images.append((fileName, lines))
+        return FlashPlan.FlashPlan.chain(images, plan), None
+
+    def _submit(self, request):
+        if not request.get('port'):
+            return {'ok': False, 'error': "No port given"}
+
+        firmware, image = self._loadImage(request)
+        if firmware is None:
+            return {'ok': False, 'error': image}
+
+        if not request.get('verifyOnly'):
+            firmware, error = self._flashPlan(request, firmware)
+            if firmware is None:
+                return {'ok': False, 'error': error}
+
+        transferBaudrate = request.get('transferBaudrate', self.args.transfer_baudrate)
+        if transferBaudrate is not None:
+            transferBaudrate = int(transferBaudrate)
+
+        skipIfCurrent = None
+        if request.get('skipCurrent'):
+            if not self.catalog.loaded:
+                return {'ok': False, 'error': "Firmware catalog not loaded"}
+            selection = request.get('catalog') or {}
+            if request.get('file') and not selection.get('firmware'):
+                return {'ok': False, 'error': "skipCurrent with a file needs catalog firmware naming its firmware"}
+            skipIfCurrent = self.catalog.currentCheck(selection.get('firmware'), selection.get('device'),
+                                                      selection.get('version', request.get('version')))
+
+        with self._jobsLock:
+            jobId = self._nextJobId
+            self._nextJobId += 1
+            job = {
+                'id': jobId,
+                'state': 'queued',
+                'image': image,
+                'submitted': time(),
+                'lineControl': request.get('lineControl', self.args.line_control), #opened while the job runs
+                'flash': FlashJob.FlashJob(request['port'], firmware,
+                                           baudrate=int(request.get('baudrate', 9600)),
+                                           verify=bool(request.get('verify', False)),
+                                           timeout=self.args.timeout,
+                                           logger=self.logger,
+                                           debug=self.args.debug,
+                                           transferBaudrate=transferBaudrate,
+                                           portStats=self.portStats,
+                                           retryPolicy=self._retryPolicy(),
+                                           verifyOnly=bool(request.get('verifyOnly', False)),
+                                           skipIfCurrent=skipIfCurrent,
+                                           lowLatency=bool(request.get('lowLatency', self.args.low_latency)),
+                                           force=bool(request.get('force', False)),
+                                           measureLatency=bool(request.get('measureLatency', self.args.measure_latency))),
+            }
+            self._jobs[jobId] = job
+            while len(self._jobs) > self._jobHistory:
+                oldest = next(iter(self._jobs))
+                if self._jobs[oldest]['state'] in ('queued', 'running'):
+                    break
+                del self._jobs[oldest]
+        priority = 0 if self.portStats.health(request['port'])['state'] == 'ok' else 1
+        self.logger.info("Job {} queued: {} on {}".format(jobId, image, request['port']))
+        self._dispatch(request['port'], (priority, jobId, job))
+        return {'ok': True, 'job': jobId}
+
+    def _wait(self, jobId, timeout=None):
+        deadline = time() + float(timeout) if timeout else None
+        with self._jobsLock:
+            job = self._jobs.get(jobId)
+            if job is None:
+                return {'ok': False, 'error': "Unknown job"}
+            while job['state'] in ('queued', 'running'):
+                remaining = deadline - time() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    break
+                self._jobsDone.wait(remaining)
+        return {'ok': True, 'job': self._jobStatus(job)}
+
+    def _dispatch(self, port, entry):
+        """ Hands a job to the workers, or keeps it back while another job
+            of its port is queued or running, so a worker never waits for
+            a port while jobs on the other ports are ready
+        """
+        with self._jobsLock:
+            if port in self._portQueues:
+                self._portQueues[port].append(entry)
+                return
+            self._portQueues[port] = deque()
+            self._queue.put(entry)
+
+    def _portDone(self, port):
+        """ Hands the next job kept back for the port to the workers
+            (called with _jobsLock held)
+        """
+        if self._portQueues[port]:
+            self._queue.put(self._portQueues[port].popleft())
+        else:
+            del self._portQueues[port]
+
+    def _worker(self):
+        while True:
+            priority, jobId, job = self._queue.get()
+            try :
+                self._runJob(job)
+            finally:
+                self._queue.task_done()
+
+    def _runFlash(self, flash, lineControlSpec):
+        """ Runs a FlashJob with its line control open only while it runs,
+            so the next job using the same lines can have them
+        """
+        try :
+            flash.lineControl = LineControl.openLineControl(lineControlSpec, self.logger)
+        except LineControl.LineControlError as e:
+            self.logger.error("{}: {}".format(flash.port, e))
+            flash.result.update(status='failed', error=str(e), elapsed=0)
+            return flash.result
+        try :
+            return flash.run()
+        finally:
+            if flash.lineControl:
+                flash.lineControl.close()
+
+    def _runJob(self, job):
+        flash = job['flash']
+        try :
+            job['state'] = 'running'
+            job['started'] = time()
+            result = self._runFlash(flash, job['lineControl'])
+        except Exception as e:
+            # keeps the worker alive, the job must not stay 'running'
+            self.logger.exception("Job {} stopped by an unexpected error".format(job['id']))
+            result = flash.result
+            result['status'] = 'failed'
+            result['error'] = "Unexpected error: {}".format(e)
+        with self._jobsLock:
+            if result['status'] == 'ok':
+                job['state'] = 'done'
+            elif result['status'] in ('cancelled', 'mismatch', 'skipped', 'busy', 'quarantined'):
+                job['state'] = result['status']
+            else:
+                job['state'] = 'failed'
+            job['finished'] = time()
+            self._portDone(flash.port) #only one job at a time on each port
+            self._jobsDone.notify_all()
+        self.logger.info("Job {} {} in {}s".format(job['id'], job['state'], result['elapsed']))
+
+if __name__ == "__main__":
+    app = FWDaemon()
+    app.on_execute()
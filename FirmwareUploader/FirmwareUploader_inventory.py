@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Firmware Inventory
+    Lists the firmware of every radio plugged into the host, probing all
+    the serial ports at the same time, and whether an update is available
+
+        $ python FirmwareUploader_inventory.py
+        $ python FirmwareUploader_inventory.py --json /dev/ttyUSB0 /dev/ttyUSB1
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import sys
+import json
+import argparse
+import logging
+import ConfigParser
+from time import time
+import Catalog
+import Resources
+import Inventory
+import PortStats
+
+class FWInventory():
+
+    _configFileDefault = "FirmwareUploader_defaults.cfg"
+    _configFile = "FirmwareUploader.cfg"
+
+    def __init__(self):
+        self._checkArgs()
+        self._initLogging()
+
+    def _checkArgs(self):
+        parser = argparse.ArgumentParser(description="FW Inventory")
+        parser.add_argument("ports",
+                            nargs="*",
+                            help="Ports to probe, all the serial ports by default"
+                            )
+        parser.add_argument("-b", "--baudrate",
+                            help="Sets the baudrate",
+                            type=int,
+                            default=9600
+                            )
+        parser.add_argument("-t", "--timeout",
+                            help="Sets the timeout",
+                            type=int,
+                            default=1
+                            )
+        parser.add_argument("-j", "--jobs",
+                            help="Number of ports probed at the same time",
+                            type=int,
+                            default=8
+                            )
+        parser.add_argument("--json",
+                            help="Print the inventory as JSON instead of a table",
+                            action="store_true"
+                            )
+        parser.add_argument("--no-catalog",
+                            help="Do not download the firmware catalog",
+                            action="store_true"
+                            )
+        parser.add_argument("--port-stats",
+                            help="File with the port health kept by the uploader",
+                            default=Resources.statePath("FirmwareUploader_ports.json")
+                            )
+        parser.add_argument('-d', '--debug',
+                            help="Enable debug output to console",
+                            action='store_true'
+                            )
+
+        self.args = parser.parse_args()
+
+    def _initLogging(self):
+        logging.getLogger().setLevel(logging.NOTSET)
+        self.logger = logging.getLogger('FW Inventory')
+        _ch = logging.StreamHandler()
+
+        if (self.args.debug):
+            _ch.setLevel(logging.DEBUG)
+        else:
+            _ch.setLevel(logging.WARN)
+            self.logger.setLevel(logging.WARN)
+
+        _formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        _ch.setFormatter(_formatter)
+        self.logger.addHandler(_ch)
+
+    def _readConfig(self):
+        self.config = ConfigParser.SafeConfigParser()
+        try:
+            self.config.readfp(open(Resources.resourcePath(self._configFileDefault)))
+        except IOError:
+            self.logger.debug("Could Not Load Default Settings File")
+        self.config.read(Resources.resourcePath(self._configFile))
+
+    def _loadCatalog(self):
+        """ Downloads the catalog, without it the ports are
+            still listed but not compared with it
+        """
+        self._readConfig()
+        catalog = Catalog.Catalog(self.config.get('FirmwareUploader', 'url_path'),
+                                  self.config.get('FirmwareUploader', 'json_file'),
+                                  self.logger)
+        status = catalog.load()
+        if str(status) != '200':
+            self.logger.warning("Unable to load the firmware catalog: {}".format(status))
+            return None
+        return catalog
+
+    def on_execute(self):
+        catalog = None
+        if not self.args.no_catalog:
+            catalog = self._loadCatalog()
+
+        started = time()
+        inventory = Inventory.Inventory(catalog, self.args.baudrate, self.args.timeout,
+                                        self.args.jobs, self.logger,
+                                        portStats=PortStats.PortStats(self.args.port_stats, self.logger))
+        try :
+            entries = inventory.probe(self.args.ports or None)
+        except KeyboardInterrupt:
+            sys.exit(1)
+
+        if self.args.json:
+            print(json.dumps({'elapsed': round(time() - started, 3),
+                              'catalog': catalog is not None,
+                              'ports': entries}, indent=2))
+        else:
+            print(Inventory.Inventory.formatTable(entries))
+        sys.exit(0)
+
+if __name__ == "__main__":
+    app = FWInventory()
+    app.on_execute()
@@ -21,19 +21,31 @@
 """
 
 import serial
+import os
+import re
 import sys
-from time import sleep
+import atexit
 import argparse
-import AT
 import logging
+import threading
+import Queue
+from time import time
+from collections import OrderedDict
 import FW
+import SerialTap
+import FlashJob
+import FlashPlan
+import Catalog
+import Resources
+import PortStats
+import LineControl
 
 class FWUploader() :
 
-    isRFu = False
+    _configFileDefault = "FirmwareUploader_defaults.cfg"
+    _configFile = "FirmwareUploader.cfg"
 
     def __init__(self):
-        #self._readConfig() #TODO
         self._checkArgs()
         self._initLogging()
 
@@ -50,8 +62,13 @@ class FWUploader() :
                             default="/dev/ttyAMA0"
                             )
         parser.add_argument("-f", "--filename",
-                            help="Sets the bin file",
-                            required=True
+                            help="Sets the bin file"
+                            )
+        parser.add_argument("--then",
+                            help="Another bin file written once the first one has run, can be repeated",
+                            metavar="FILENAME",
+                            action="append",
+                            default=[]
                             )
         parser.add_argument("-t", "--timeout",
                             help="Sets the timeout",
@@ -62,6 +79,11 @@ class FWUploader() :
                             type=int,
                             help='GPIO pin to set AT Mode'
                             )
+        parser.add_argument("--line-control",
+                            metavar="SPEC",
+                            help="Lines used to force AT mode and reset the device: "
+                                 "gpio:AT[,RESET], gpiochip:CHIP:AT[,RESET], serial[:dtr,rts] or fake"
+                            )
         parser.add_argument('-d', '--debug',
                             help="Enable debug output to console",
                             action='store_true'
@@ -70,15 +92,116 @@ class FWUploader() :
                             help="Use the method to verify the firmware",
                             action="store_true"
                             )
+        parser.add_argument("--verify-only",
+                            help="Only compare the device with the firmware file, nothing is written",
+                            action="store_true"
+                            )
+        parser.add_argument("--skip-current",
+                            help="Leave devices already on the latest catalog version of their firmware",
+                            action="store_true"
+                            )
+        parser.add_argument("--firmware",
+                            help="Catalog firmware name of the bin file, needed by --skip-current with -f"
+                            )
+        parser.add_argument("--bootloader-update",
+                            help="Bootloader update image written first on devices with a bootloader older than 3d"
+                            )
+        parser.add_argument("--transfer-baudrate",
+                            help="Baudrate to try for the bootloader transfer, falls back to 9600 "
+                                 "(default: the last one that worked on the port, else 9600)",
+                            type=int
+                            )
+        parser.add_argument("--no-low-latency",
+                            help="Leave the latency timer of USB serial adapters unchanged",
+                            dest="low_latency",
+                            action="store_false"
+                            )
+        parser.add_argument("--measure-latency",
+                            help="Report the bootloader round trip with the original and the low latency port settings",
+                            action="store_true"
+                            )
+        parser.add_argument("--retries",
+                            help="Times a firmware line that is not acknowledged is sent again",
+                            type=int,
+                            default=3
+                            )
+        parser.add_argument("--retry-budget",
+                            help="Total retries allowed for one device before giving up",
+                            type=int,
+                            default=32
+                            )
+        parser.add_argument("--port-stats",
+                            help="File remembering which transfer baudrate works on each port",
+                            default=Resources.statePath("FirmwareUploader_ports.json")
+                            )
+        parser.add_argument("--quarantine-after",
+                            help="Failed sessions in a row before a port is quarantined",
+                            type=int,
+                            default=PortStats.PortStats.quarantineAfter
+                            )
+        parser.add_argument("--max-nak-rate",
+                            help="NAKs per firmware line past which a port is degraded and used last",
+                            type=float,
+                            default=PortStats.PortStats.thresholds['nakRate']
+                            )
+        parser.add_argument("--max-failure-rate",
+                            help="Failed sessions past which a port is degraded and used last",
+                            type=float,
+                            default=PortStats.PortStats.thresholds['failureRate']
+                            )
+        parser.add_argument("--include-quarantined",
+                            help="Also flash devices on quarantined ports",
+                            action="store_true"
+                            )
+        parser.add_argument("--release-port",
+                            metavar="PORT",
+                            action="append",
+                            help="Take a port out of quarantine, can be repeated"
+                            )
+        parser.add_argument("--record",
+                            help="Record the serial traffic to the given file, one file per port in batch mode"
+                            )
+        parser.add_argument("--replay",
+                            help="Replay a recorded session instead of opening the device, in batch mode for a single entry"
+                            )
+        parser.add_argument("--replay-speed",
+                            help="Speed factor for --replay, 0 replays without delays",
+                            type=float,
+                            default=1.0
+                            )
+
+        parser.add_argument("--batch",
+                            metavar="MANIFEST",
+                            help="Flash every device listed on a CSV or JSON manifest"
+                            )
+        parser.add_argument("-j", "--jobs",
+                            help="Number of devices flashed at the same time in batch mode",
+                            type=int,
+                            default=4
+                            )
+        parser.add_argument("--report",
+                            help="Write the batch results as JSON to this file instead of the console"
+                            )
 
         self.args = parser.parse_args()
 
-        if self.args.baudrate != 9600 :
-            self.logger.debug("Baudrate different from 9600")
-            self.isRFu = True
+        if self.args.skip_current and self.args.filename and not self.args.firmware:
+            parser.error("--skip-current with -f needs --firmware to name the firmware of the file")
+
+        if not self.args.line_control and self.args.gpio is not None:
+            self.args.line_control = "gpio:{}".format(self.args.gpio)
+
+        if not self.args.filename and not self.args.batch and not self.args.release_port:
+            parser.error("one of the arguments -f/--filename --batch is required")
 
     def _readConfig(self):
-        pass
+        import ConfigParser
+        self.config = ConfigParser.SafeConfigParser()
+        try:
+            self.config.readfp(open(Resources.resourcePath(self._configFileDefault)))
+        except IOError:
+            self.logger.debug("Could Not Load Default Settings File")
+        self.config.read(Resources.resourcePath(self._configFile))
 
     def _initLogging(self):
         logging.getLogger().setLevel(logging.NOTSET)
@@ -106,122 +229,393 @@ class FWUploader() :
         # set console level
 
 
-    def _restartClasses(self, baudrate):
+    def _initWireTap(self):
+        self.recorder = None
+        self.recorders = {} #port -> WireRecorder in batch mode
+        self.replay = None
+        if self.args.replay:
+            try :
+                self.replay = SerialTap.SerialReplay(self.args.replay, self.args.replay_speed, self.logger)
+            except (IOError, ValueError) as e:
+                self.logger.error ("Failed to load recording {}: {}".format(self.args.replay, e))
+                sys.exit(1)
+        elif self.args.record and not self.args.batch:
+            self.recorder = self._createRecorder(self.args.record)
+
+    def _createRecorder(self, fileName):
         try :
-            self.ser = serial.Serial(self.args.device, baudrate, timeout=self.args.timeout)
-        except serial.SerialException as e:
-            self.logger.error ("Failed to open port {}: {}".format(self.args.device, e.strerror))
+            recorder = SerialTap.WireRecorder(fileName)
+        except IOError as e:
+            self.logger.error ("Failed to create recording {}: {}".format(fileName, e.strerror))
             sys.exit(1)
+        atexit.register(recorder.close)
+        return recorder
+
+    def _recordPorts(self, ports):
+        """ Records each port of a batch to its own file, named after
+            the --record one ("session.wtr" -> "session-ttyUSB0.wtr"),
+            as the traffic of parallel ports would mix in a single file
+        """
+        base, ext = os.path.splitext(self.args.record)
+        for port in ports:
+            name = re.sub(r'[^\w.-]', '_', port[len('/dev/'):] if port.startswith('/dev/') else port)
+            self.recorders[port] = self._createRecorder("{}-{}{}".format(base, name, ext))
+
+    def _openSerial(self, port, baudrate, timeout):
+        """ Opens the port for the FlashJob, recording
+            or replaying the traffic if asked to
+        """
+        if self.replay:
+            self.replay.baudrate = baudrate
+            self.replay.open()
+            return self.replay
+
+        ser = serial.Serial(port, baudrate, timeout=timeout)
+        recorder = self.recorders.get(port, self.recorder)
+        if recorder:
+            ser = recorder.tap(ser)
+        return ser
+
+    def _portStats(self, fileName):
+        """ Loads the port statistics with the health limits given
+        """
+        return PortStats.PortStats(fileName, self.logger,
+                                   thresholds={'nakRate': self.args.max_nak_rate,
+                                               'failureRate': self.args.max_failure_rate},
+                                   quarantineAfter=self.args.quarantine_after)
 
-        try :
-            if self.args.gpio:
-                self.at = AT.AT(self.ser, self.logger, self.args.gpio)
-            else:
-                self.at = AT.AT(self.ser, self.logger)
-        except Exception as e:
-            self.logger.error ("Failed to create AT class: {}".format(e))
-            sys.exit(1)
+    def on_execute(self):
+        self._initWireTap()
+        self.portStats = self._portStats(None if self.args.replay else self.args.port_stats)
 
-        try :
-            self.fw = FW.FW(self.at, self.ser, self.logger)
-        except serial.SerialException as e:
-            self.logger.error ("Failed to create FW class: {}".format(e))
-            sys.exit(1)
+        for port in self.args.release_port or []:
+            if self.portStats.release(port):
+                print("{} released from quarantine".format(port))
+        if not self.args.filename and not self.args.batch:
+            sys.exit(0)
 
-    def on_execute(self):
-        self._restartClasses(self.args.baudrate)
+        if self.args.batch:
+            self.runBatch()
 
         self.logger.info("Writing new firmware file {} to device {} with baudrate {}...".format(self.args.filename, self.args.device, self.args.baudrate));
         self.logger.info("Reading firmware file...")
 
-        self.firmwareFile = self.fw.prepareFirmwareFile(self.args.filename)
+        self.firmwareFile = FW.readFirmwareFile(self.args.filename, self.logger)
         if not self.firmwareFile:
-            self.at.endSerial()
             sys.exit(1)
 
-        self.firmwareLines = len(self.firmwareFile)
-        self.logger.info("Read {} lines from firmware file".format(self.firmwareLines))
-
-        if not self.at.enterATMode(): #if comm fails
-            self.logger.debug ("Failed enter AT mode, checking if device is in bootloader mode")
-
-            self.ser.close()
-            self._restartClasses(9600)
-
-            if self.fw.checkBootloaderVersion():
-                self.logger.debug ("Device in bootloader mode")
-                self.recordAndVerify()
-
-            self.logger.debug ("Device not in bootloader mode.")
-            self.fw.error("Failed to enter on AT mode")
-
-        if not self.fw.checkFWVersion() :
-            self.fw.error("Unable to check the FW version")
-
-        ################### Enters program download mode ######################
-        if not self.fw.enterProgramMode() :
-            self.fw.error("enterProgramMode: Invalid response received")
-
-        sleep(0.1) ######### need to wait for the reboot of the device ###############
-
-        if not self.fw.checkBootloaderVersion() :
-            self.fw.error("checkBootloaderVersion: Error on enter in Bootloader mode")
-
-        self.recordAndVerify()
-
-    def recordAndVerify(self) :
-        if not self.fw.enterWriteMode() :
-            self.fw.error("recordAndVerify: Error on enter in Write Mode")
-
-        self.logger.debug ("recordAndVerify: Writing FW on {}... Please wait..".format(self.args.device))
-
-        lines = self.fw.sendFirmware(self.firmwareFile, self.args.debug)
-        if  lines != self.firmwareLines:
-            self.fw.error ("recordAndVerify: Error while uploading file. Line {}".format(lines))
-
-        self.logger.debug ("recordAndVerify: Sent {} of {} lines...".format(lines, self.firmwareLines)) #debug
+        self.logger.info("Read {} lines from firmware file".format(len(self.firmwareFile)))
 
-        if not self.fw.waitResponse("R"):
-            self.fw.error("recordAndVerify: 'R' sent. Invalid response received")
+        firmware = self.firmwareFile
+        if not self.args.verify_only:
+            firmware, failed = self._flashPlan(self.firmwareFile, self.args.bootloader_update, self.args.then,
+                                               lambda fileName: FW.readFirmwareFile(fileName, self.logger))
+            if not firmware:
+                self.logger.error("Unable to read {}".format(failed))
+                sys.exit(1)
 
-        if not self.fw.waitResponse("y"):
-            self.fw.error("recordAndVerify: 'y' sent. Invalid response received")
-
-        if self.args.verify:
-            if not self.fw.enterVerifyMode():
-                self.fw.error("recordAndVerify: Error on enter in Verify Mode")
+        try :
+            lineControl = LineControl.openLineControl(self.args.line_control, self.logger)
+        except LineControl.LineControlError as e:
+            self.logger.error("{}".format(e))
+            sys.exit(1)
 
-            self.logger.info("recordAndVerify: Start the Verify process...")
-            lines = self.fw.sendFirmware(self.firmwareFile, self.args.debug)
+        skipIfCurrent = None
+        if self.args.skip_current:
+            status = self._loadCatalog()
+            if str(status) != '200':
+                sys.stderr.write("Error downloading JSON File\nError {}\n".format(status))
+                sys.exit(1)
+            skipIfCurrent = self.catalog.currentCheck(self.args.firmware)
+
+        job = FlashJob.FlashJob(self.args.device, firmware,
+                                baudrate=self.args.baudrate,
+                                verify=self.args.verify,
+                                timeout=self.args.timeout,
+                                logger=self.logger,
+                                serialFactory=self._openSerial,
+                                debug=self.args.debug,
+                                transferBaudrate=self.args.transfer_baudrate,
+                                portStats=self.portStats,
+                                retryPolicy=self._retryPolicy(),
+                                lineControl=lineControl,
+                                verifyOnly=self.args.verify_only,
+                                skipIfCurrent=skipIfCurrent,
+                                lowLatency=self.args.low_latency,
+                                measureLatency=self.args.measure_latency,
+                                force=self.args.include_quarantined)
+        try :
+            result = job.run()
+        finally:
+            if lineControl:
+                lineControl.close()
 
-            if  lines != self.firmwareLines:
-                self.fw.error ("recordAndVerify: Error while verifying file. Line {}".format(lines))
+        if result['status'] == 'skipped':
+            print("Device already on {}, skipped".format(result['fwVersion'].strip()))
+            sys.exit(0)
 
-            self.logger.debug ("recordAndVerify: Verified {} of {} lines...".format(lines, self.firmwareLines)) #debug
+        if result['status'] in ('busy', 'quarantined'):
+            sys.stderr.write("{}\n".format(result['error']))
+            sys.exit(1)
 
-        if not self.fw.sendCommit() :
-            self.fw.error("recordAndVerify: Error sending commit")
+        if result['status'] == 'mismatch':
+            sys.stderr.write("Device differs from {} at record {}\n".format(self.args.filename, result['firstMismatch']))
+            sys.exit(1)
 
-        self.logger.info("All OK, XRF successfully reprogrammed!")
-        self.logger.info("Waiting for device to settle...")
-        sleep(2)
+        if result['status'] != 'ok':
+            job.trace.dump()
+            sys.exit(1)
 
-        if self.isRFu: #if is RFu, change the port baudrate to given baudrate
-            self.ser.close()
-            self._restartClasses(self.args.baudrate)
+        if self.args.verify_only:
+            print("Device matches {}".format(self.args.filename))
 
-        self.ser.flushInput()
+        if result['recordRtt'] is not None:
+            self.logger.info("Average record round trip {}ms".format(result['recordRtt']))
+        self.logger.info("Success!")
+        sys.exit(0)
 
-        if not self.at.enterATMode() :
-            self.fw.error("recordAndVerify: Error entering AT mode")
+    def _readManifest(self, fileName):
+        """ Reads the batch manifest, a JSON list or a CSV file with a
+            header line, each entry having the port and either a firmware
+            file or a catalog firmware name, optionally with baudrate,
+            transferBaudrate, lineControl, device, version, verify, verifyOnly,
+            skipCurrent, bootloaderUpdate and then (files written once the
+            firmware has run, ';' separated in CSV)
+            An entry with a file and skipCurrent must also name its catalog
+            firmware, or any device current on its own firmware is skipped
+        """
+        import csv
+        import json
+        with open(fileName, 'rb') as f:
+            if fileName.lower().endswith('.json'):
+                entries = json.load(f)
+            else:
+                entries = [dict((k.strip(), v.strip()) for k, v in row.items() if k and v)
+                           for row in csv.DictReader(f)]
+
+        for entry in entries:
+            entry['baudrate'] = int(entry.get('baudrate') or self.args.baudrate)
+            entry['transferBaudrate'] = entry.get('transferBaudrate') or self.args.transfer_baudrate
+            if entry['transferBaudrate'] is not None:
+                entry['transferBaudrate'] = int(entry['transferBaudrate'])
+            entry['lineControl'] = entry.get('lineControl') or self.args.line_control
+            entry['bootloaderUpdate'] = entry.get('bootloaderUpdate') or self.args.bootloader_update
+            entry['then'] = entry.get('then') or []
+            if not isinstance(entry['then'], list):
+                entry['then'] = [fileName.strip() for fileName in entry['then'].split(';') if fileName.strip()]
+            for key, default in (('verify', self.args.verify), ('verifyOnly', self.args.verify_only),
+                                 ('skipCurrent', self.args.skip_current)):
+                value = entry.get(key, default)
+                if not isinstance(value, bool):
+                    value = str(value).lower() in ('1', 'true', 'yes', 'y')
+                entry[key] = value
+            if entry['skipCurrent'] and entry.get('file') and not entry.get('catalog'):
+                raise ValueError("skipCurrent for {} needs the catalog firmware of {}".format(entry.get('port'), entry['file']))
+        return entries
+
+    def _retryPolicy(self):
+        """ Returns a new retry policy for one device
+        """
+        return FW.RetryPolicy(recordRetries=self.args.retries, sessionBudget=self.args.retry_budget)
+
+    def _skipCheck(self, entry):
+        """ Returns the skip-if-current check of a manifest entry (or None),
+            the device is current when running the entry catalog firmware
+            at the entry version, or at the latest catalog version
+        """
+        if not entry['skipCurrent']:
+            return None
+        return self.catalog.currentCheck(entry.get('catalog'), entry.get('device'), entry.get('version'))
+
+    def _loadCatalog(self):
+        self._readConfig()
+        self.catalog = Catalog.Catalog(self.config.get('FirmwareUploader', 'url_path'),
+                                       self.config.get('FirmwareUploader', 'json_file'),
+                                       self.logger)
+        return self.catalog.load()
+
+    def _loadImage(self, entry):
+        """ Returns the lines of the firmware of a manifest entry and its name,
+            each distinct image is only read (or downloaded) once
+        """
+        if entry.get('file'):
+            return self.catalog.loadFile(entry['file']), entry['file']
+
+        path = self.catalog.resolve(entry.get('catalog'), entry.get('device'), entry.get('version'))
+        if path is None:
+            self.logger.error("No catalog entry for {}".format(entry.get('catalog')))
+            return False, entry.get('catalog')
+        status, firmware = self.catalog.getImage(path)
+        return firmware, path
+
+    def _flashPlan(self, firmware, updaterFile, chainedFiles, load):
+        """ Puts the bootloader update in front of the firmware and the
+            other images after it, images are read with load(fileName)
+            Returns the firmware alone when there is nothing else to write,
+            or False and the name of the file that can not be read
+        """
+        if not updaterFile and not chainedFiles:
+            return firmware, None
+
+        plan = FlashPlan.FlashPlan()
+        if updaterFile:
+            updater = load(updaterFile)
+            if not updater:
+                return False, updaterFile
+            plan = FlashPlan.FlashPlan.bootloaderUpdate(updater)
+
+        images = [('firmware', firmware)]
+        for fileName in chainedFiles:
+            lines = load(fileName)
+            if not lines:
+                return False, fileName
+            images.append((fileName, lines))
+        return FlashPlan.FlashPlan.chain(images, plan), None
+
+    def _unhealthyPorts(self, ports):
+        """ Returns the health of the ports that are not ok
+        """
+        unhealthy = {}
+        for port in sorted(ports):
+            health = self.portStats.health(port)
+            if health['state'] != 'ok':
+                unhealthy[port] = health
+        return unhealthy
+
+    def runBatch(self):
+        import csv
+        import json
+        try :
+            entries = self._readManifest(self.args.batch)
+        except (IOError, ValueError, csv.Error) as e:
+            sys.stderr.write("Failed to read manifest {}: {}\n".format(self.args.batch, e))
+            sys.exit(1)
 
-        if not self.fw.checkFWVersion() :
-            self.fw.error("recordAndVerify: Error checking FW version")
+        if self.replay and len(entries) != 1:
+            sys.stderr.write("--replay plays back a single session, the manifest must have a single entry\n")
+            sys.exit(1)
+        elif self.args.record:
+            self._recordPorts(set(entry['port'] for entry in entries if entry.get('port')))
+
+        self.catalog = Catalog.Catalog('', '', self.logger)
+        if any(not entry.get('file') or entry['skipCurrent'] for entry in entries):
+            status = self._loadCatalog()
+            if str(status) != '200':
+                sys.stderr.write("Error downloading JSON File\nError {}\n".format(status))
+                sys.exit(1)
+
+        started = time()
+        results = []
+        portJobs = OrderedDict() #port -> its jobs, run in order by one worker
+        order = self.portStats.schedulingOrder(range(len(entries)), lambda index: entries[index].get('port'))
+        for index in order: #degraded ports last
+            entry = entries[index]
+            result = {'index': index, 'port': entry.get('port'), 'status': 'failed', 'error': None}
+            firmware, image = self._loadImage(entry)
+            if firmware and not entry['verifyOnly']:
+                firmware, failed = self._flashPlan(firmware, entry['bootloaderUpdate'], entry['then'],
+                                                   self.catalog.loadFile)
+                image = failed or image
+            result['image'] = image
+            results.append(result)
+            if not entry.get('port'):
+                result['error'] = "No port given"
+            elif not firmware:
+                result['error'] = "Unable to load firmware {}".format(image)
+            else:
+                portJobs.setdefault(entry['port'], []).append((entry, firmware, result))
+        jobs = Queue.Queue()
+        for portJob in portJobs.values(): #only one job at a time on each port
+            jobs.put(portJob)
+
+        stop = threading.Event()
+        running = set()
+
+        def runEntry(entry, firmware, result):
+            result['startOffset'] = round(time() - started, 3)
+            try :
+                lineControl = LineControl.openLineControl(entry['lineControl'], self.logger)
+            except LineControl.LineControlError as e:
+                result['error'] = str(e)
+                return
+            job = FlashJob.FlashJob(entry['port'], firmware,
+                                    baudrate=entry['baudrate'],
+                                    verify=entry['verify'],
+                                    timeout=self.args.timeout,
+                                    logger=self.logger,
+                                    serialFactory=self._openSerial,
+                                    debug=self.args.debug,
+                                    transferBaudrate=entry['transferBaudrate'],
+                                    portStats=self.portStats,
+                                    retryPolicy=self._retryPolicy(),
+                                    lineControl=lineControl,
+                                    verifyOnly=entry['verifyOnly'],
+                                    skipIfCurrent=self._skipCheck(entry),
+                                    lowLatency=self.args.low_latency,
+                                    measureLatency=self.args.measure_latency,
+                                    force=self.args.include_quarantined)
+            running.add(job)
+            if stop.is_set():
+                job.cancel()
+            try :
+                result.update(job.run())
+            finally:
+                running.discard(job)
+                if lineControl:
+                    lineControl.close() #the next job on these lines opens them again
+
+        def worker():
+            # a worker takes all the jobs of a port, so none waits for a port
+            # while the jobs of another one are left
+            while not stop.is_set():
+                try :
+                    portJob = jobs.get_nowait()
+                except Queue.Empty:
+                    return
+                for entry, firmware, result in portJob:
+                    if stop.is_set():
+                        return
+                    runEntry(entry, firmware, result)
+
+        workers = [threading.Thread(target=worker) for w in range(max(1, self.args.jobs))]
+        for w in workers:
+            w.daemon = True
+            w.start()
+        try :
+            for w in workers:
+                while w.is_alive():
+                    w.join(1) #join with a timeout so Ctrl-C still works
+        except KeyboardInterrupt:
+            sys.stderr.write("Cancelling the running jobs\n")
+            stop.set()
+            for job in list(running):
+                job.cancel()
+            for w in workers:
+                w.join(5)
+            for result in results:
+                if result['error'] is None and result['status'] != 'ok' and 'startOffset' not in result:
+                    result['status'] = 'cancelled'
+
+        report = {
+            'manifest': self.args.batch,
+            'elapsed': round(time() - started, 3),
+            'ok': len([r for r in results if r['status'] == 'ok']),
+            'failed': len([r for r in results if r['status'] == 'failed']),
+            'mismatch': len([r for r in results if r['status'] == 'mismatch']),
+            'skipped': len([r for r in results if r['status'] == 'skipped']),
+            'busy': len([r for r in results if r['status'] == 'busy']),
+            'cancelled': len([r for r in results if r['status'] == 'cancelled']),
+            'quarantined': len([r for r in results if r['status'] == 'quarantined']),
+            'jobs': sorted(results, key=lambda r: r['index']),
+            'portHealth': self._unhealthyPorts(set(r['port'] for r in results if r['port'])),
+        }
+        if self.args.report:
+            with open(self.args.report, 'w') as f:
+                json.dump(report, f, indent=2)
+        else:
+            print(json.dumps(report, indent=2))
 
-        sleep(0.1)
-        self.at.endSerial()
-        self.logger.info("Success!")
-        sys.exit(0)
+        sys.exit(0 if report['ok'] + report['skipped'] == len(results) else 1)
 
 if __name__ == "__main__":
     app = FWUploader()
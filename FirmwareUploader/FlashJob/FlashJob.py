@@ -0,0 +1,501 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" FlashJob Class
+    Runs a complete firmware upload on one port and reports the result
+    instead of exiting the program, so it can be used by the command line
+    uploader as well as by long running tools
+    With verifyOnly the device is only compared with the image using the
+    bootloader verify pass, nothing is erased or written
+    skipIfCurrent(identity) can tell from the firmware version that the
+    device is already current, the job then ends as 'skipped' without
+    entering the bootloader
+    The outcome of each job is added to the port health in portStats,
+    a job on a quarantined port ends as 'quarantined' unless forced
+    firmware is the list of lines of the image or a FlashPlan, the stages
+    needed on the device are written in order, each one is committed and
+    the device identified again before the next stage
+    identity can be given for a device already identified and left in the
+    bootloader (by DeviceIdentity.identify), the job then starts writing
+    right away
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import serial
+import logging
+import threading
+from time import time
+import AT
+import FW
+import Trace
+import LineControl
+import SerialSession
+import PortLock
+import DeviceIdentity
+import FlashPlan
+
+class FlashJobError(Exception):
+    """ Aborts a FlashJob with the message reported in the result
+    """
+    pass
+
+def openSerial(port, baudrate, timeout):
+    """ Default way for a FlashJob to open the port
+    """
+    return serial.Serial(port, baudrate, timeout=timeout)
+
+class FlashJob():
+
+    def __init__(self, port, firmware, baudrate=9600, verify=False, timeout=1,
+                 logger=None, serialFactory=None, debug=False,
+                 transferBaudrate=None, portStats=None, retryPolicy=None,
+                 lineControl=None, verifyOnly=False, skipIfCurrent=None, lowLatency=True,
+                 force=False, identity=None, measureLatency=False):
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+        self.port = port
+        if isinstance(firmware, FlashPlan.FlashPlan):
+            self.plan = firmware
+        else:
+            self.plan = FlashPlan.FlashPlan.single(firmware)
+        self.firmware = self.plan.firmware() #image being written
+        self.baudrate = baudrate
+        self.verify = verify
+        self.verifyOnly = verifyOnly
+        self.skipIfCurrent = skipIfCurrent
+        self.lowLatency = lowLatency
+        self.measureLatency = measureLatency
+        self.force = force
+        self.identity = identity
+        self.timeout = timeout
+        self.debug = debug
+        self.transferBaudrate = transferBaudrate
+        self.portStats = portStats
+        self.retryPolicy = retryPolicy or FW.RetryPolicy()
+        self.lineControl = lineControl
+        self._serialFactory = serialFactory or openSerial
+
+        self.trace = Trace.Trace()
+        self._linesDone = 0 #lines of the stages already written
+        self.phase = None #'Write' or 'Verify' while a pass is running
+        self.cancelEvent = threading.Event()
+        self.session = None
+        self.ser = None
+        self.at = None
+        self.fw = None
+
+        self.result = {
+            'port': port,
+            'status': 'queued',
+            'error': None,
+            'lines': 0,
+            'totalLines': self.plan.totalLines(),
+            'previousVersion': None,
+            'fwVersion': None,
+            'transferBaudrate': 9600,
+            'retries': 0,
+            'recordRtt': None, #ms
+            'elapsed': None,
+        }
+        if verifyOnly:
+            self.result['match'] = None
+            self.result['firstMismatch'] = None #number of the first record that differs
+
+    def progress(self):
+        """ Returns the number of lines sent, on the current pass
+            of the stages already written
+        """
+        if self.fw:
+            return self._linesDone + self.fw._line_number
+        return 0
+
+    def cancel(self):
+        """ Stops the job from another thread, a running job
+            is interrupted and frees the port within milliseconds
+        """
+        self.cancelEvent.set()
+        if self.session:
+            self.session.cancel()
+
+    def run(self):
+        """ Flashes the device, returns the result dictionary
+        """
+        started = time()
+        if self.portStats and not self.force and self.portStats.isQuarantined(self.port):
+            self.result['status'] = 'quarantined'
+            self.result['error'] = "Port quarantined: {}".format(self.portStats.get(self.port, 'quarantined'))
+            self.result['elapsed'] = 0
+            self.logger.warning("{}: {}".format(self.port, self.result['error']))
+            return self.result
+
+        self.result['status'] = 'running'
+        try :
+            self._flash()
+            if self.result['device'].get('skipped'):
+                self.result['status'] = 'skipped'
+            elif self.result.get('match') is False:
+                self.result['status'] = 'mismatch'
+            else:
+                self.result['status'] = 'ok'
+        except AT.CancelledError:
+            self.logger.info("{}: Cancelled".format(self.port))
+            self.result['status'] = 'cancelled'
+            self.result['error'] = "Cancelled"
+        except PortLock.PortBusyError as e:
+            self.logger.warning("{}: {}".format(self.port, e))
+            self.result['status'] = 'busy'
+            self.result['error'] = str(e)
+            self.result['holder'] = e.holder
+        except FlashJobError as e:
+            self._fail(str(e))
+        except serial.SerialException as e:
+            self._fail("Communication Error: {}".format(e))
+        except LineControl.LineControlError as e:
+            self._fail("Line control: {}".format(e))
+        except SystemExit:
+            self._fail("Aborted while talking to the device")
+        finally:
+            self.result['retries'] = self.retryPolicy.used
+            self.result['elapsed'] = round(time() - started, 3)
+            self._closeSerial()
+            self._recordHealth()
+        return self.result
+
+    def _recordHealth(self):
+        """ Adds the outcome of the job to the health of the port,
+            jobs where the device never answered are left out, such as
+            a port that failed to open or has nothing attached
+        """
+        if not self.portStats or self.result['status'] not in ('ok', 'failed', 'mismatch', 'skipped'):
+            return
+        if not self.trace.deviceAnswered():
+            return
+        self.portStats.recordSession(self.port,
+                                     records=self.trace.count(Trace.Trace.FW_RECORD),
+                                     naks=self.trace.count(Trace.Trace.FW_NAK),
+                                     timeouts=self.trace.count(Trace.Trace.AT_TIMEOUT),
+                                     failed=self.result['status'] == 'failed',
+                                     recordRtt=self.result['recordRtt'])
+        self.result['portHealth'] = self.portStats.health(self.port)['state']
+
+    def _fail(self, message):
+        self.logger.error("{}: {}".format(self.port, message))
+        self.result['status'] = 'failed'
+        self.result['error'] = message
+        self.result['trace'] = self.trace.format()
+
+    def _closeSerial(self):
+        if self.session:
+            self.session.close()
+
+    def _openSerial(self):
+        """ Opens the port and creates the AT and FW classes for it
+        """
+        self.session = SerialSession.SerialSession(self.port, self.baudrate, self.timeout, self.logger,
+                                                   opener=self._serialFactory,
+                                                   lineControl=self.lineControl,
+                                                   trace=self.trace,
+                                                   retryPolicy=self.retryPolicy,
+                                                   event=self.cancelEvent,
+                                                   lowLatency=self.lowLatency)
+        if self.cancelEvent.is_set():
+            raise AT.CancelledError("Cancelled")
+        try :
+            self.ser = self.session.open()
+        except PortLock.PortBusyError:
+            raise
+        except serial.SerialException as e:
+            raise FlashJobError("Failed to open port {}: {}".format(self.port, e))
+        self.at = self.session.at
+        self.fw = self.session.fw
+
+    def _setBaudrate(self, baudrate):
+        """ Changes the baudrate of the open port
+        """
+        try :
+            self.ser = self.session.reconfigure(baudrate)
+        except serial.SerialException as e:
+            raise FlashJobError("Failed to set port {} to {}: {}".format(self.port, baudrate, e))
+
+    def _flash(self):
+        self._openSerial()
+
+        if self.verifyOnly:
+            self.logger.info("{}: Verifying {} lines with baudrate {}...".format(self.port, len(self.firmware), self.baudrate))
+
+        if self.identity:
+            identity = self._resume(self.identity)
+        else:
+            identity = self._identify(skip=self.skipIfCurrent)
+        self.result['previousVersion'] = identity.response
+        if identity.skipped:
+            self.result['fwVersion'] = identity.response
+            return
+
+        if self.verifyOnly:
+            self._checkIdentity(identity)
+            self._measureLatency()
+            self._verifyOnly()
+            return
+
+        stages = self.plan.stagesFor(identity)
+        if not stages:
+            self._checkIdentity(identity)
+            self.logger.info("{}: Nothing to write on this device".format(self.port))
+            self.result['fwVersion'] = identity.response
+            self.result['stages'] = []
+            self.fw.sendCommit() #nothing was written, this only starts the application again
+            return
+        # a bootloader too old to take the firmware is fine when it is updated first
+        self._checkIdentity(identity, oldBootloader=stages[0].bootloader)
+        self.result['totalLines'] = self.plan.totalLines(stages)
+        self.logger.info("{}: Writing {} lines with baudrate {}...".format(self.port, self.result['totalLines'], self.baudrate))
+        self.result['stages'] = []
+        self._measureLatency()
+
+        for index, stage in enumerate(stages):
+            self._writeStage(stage, last=index == len(stages) - 1)
+        if not stages[-1].bootloader:
+            self._checkNewVersion()
+
+    def _identify(self, skip=None):
+        """ Identifies the device, leaving it in the bootloader
+        """
+        identity = DeviceIdentity.identify(self.session, logger=self.logger, skip=skip)
+        self.result['device'] = identity.asDict()
+        if identity.inBootloader:
+            self.logger.debug("{}: Device in bootloader mode".format(self.port))
+        return identity
+
+    def _resume(self, identity):
+        """ Takes over a device identified before and left in the
+            bootloader, identifying it again if it stopped answering
+        """
+        self.result['device'] = identity.asDict()
+        self._setBaudrate(9600)
+        if self.fw.checkBootloaderVersion():
+            self.logger.debug("{}: Reusing the identification of the device".format(self.port))
+            return identity
+        self.logger.info("{}: Device no longer in the bootloader, identifying it again".format(self.port))
+        self._setBaudrate(self.baudrate)
+        return self._identify(skip=self.skipIfCurrent)
+
+    def _checkIdentity(self, identity, oldBootloader=False):
+        """ Fails the job for a device that can not be written,
+            with oldBootloader a bootloader needing an update is accepted
+        """
+        if identity.commFail:
+            raise FlashJobError(identity.error)
+        if identity.usbMode:
+            raise FlashJobError("Device is in USB mode")
+        if identity.oldDevice and not (oldBootloader and identity.needsBootloaderUpdate()):
+            raise FlashJobError("Device firmware or bootloader too old to be updated")
+
+    def _writeStage(self, stage, last=True):
+        """ Writes the image of one stage and commits it, unless it is the
+            last stage the device is then taken back into the bootloader
+        """
+        started = time()
+        self.firmware = stage.firmware
+        self.logger.info("{}: Writing the {} image, {} lines".format(self.port, stage.name, len(stage.firmware)))
+        self._writeImage()
+        self._commit()
+        self._linesDone += len(stage.firmware)
+        self.result['stages'].append({'name': stage.name, 'lines': len(stage.firmware),
+                                      'elapsed': round(time() - started, 3)})
+
+        if stage.bootloader:
+            self.logger.info("{}: Waiting for the bootloader update...".format(self.port))
+            identity = self._identifyAgain()
+            if identity.needsBootloaderUpdate():
+                raise FlashJobError("Bootloader still {}{} after the update".format(
+                    identity.bootloaderVersion, identity.bootloaderSubVersion or ''))
+            self.result['stages'][-1]['bootloader'] = identity.bootloaderVersion
+            self.logger.info("{}: Bootloader updated".format(self.port))
+        elif not last:
+            self.logger.info("{}: Waiting for the {} image to start...".format(self.port, stage.name))
+            self._identifyAgain()
+
+    def _identifyAgain(self):
+        """ Waits for the image just committed to start and takes the
+            device back into the bootloader
+        """
+        self.at._sleep(2)
+        self._setBaudrate(self.baudrate)
+        identity = self._identify()
+        self._checkIdentity(identity, oldBootloader=True)
+        return identity
+
+    def _measureLatency(self):
+        """ Reports the bootloader round trip time with the original port
+            settings and with the low latency ones, when they were changed
+            and the job was asked to
+        """
+        tuning = self.session.tuning
+        if not self.measureLatency or not tuning or not tuning.applied():
+            return
+        tuned = self.fw.measureRtt()
+        tuning.restore()
+        original = self.fw.measureRtt()
+        tuning.apply(self.ser)
+        self.result['latency'] = tuning.settings()
+        if tuned is not None and original is not None:
+            self.result['latency']['rtt'] = round(original * 1000, 1)
+            self.result['latency']['tunedRtt'] = round(tuned * 1000, 1)
+            self.logger.info("{}: Bootloader round trip {:.1f}ms, {:.1f}ms with the original port settings".format(
+                             self.port, tuned * 1000, original * 1000))
+
+    def _negotiateTransferBaudrate(self):
+        """ Moves the bootloader transfer to a faster baudrate when one is
+            configured (or, when none is, one worked before on the port),
+            the bootloader must answer the version probe at the new rate
+            otherwise the transfer stays at 9600
+        """
+        self._transferBaudrate = 9600
+        baudrate = self.transferBaudrate
+        if self.portStats:
+            baudrate = self.portStats.transferBaudrate(self.port, baudrate)
+        if baudrate in (None, 9600):
+            return
+
+        self._transferBaudrate = baudrate
+        self._setBaudrate(baudrate)
+        if self.fw.checkBootloaderVersion() in ["3", "4"]:
+            self.logger.debug("{}: Bootloader transfer at {}".format(self.port, baudrate))
+            return
+
+        self.logger.info("{}: Bootloader not answering at {}".format(self.port, baudrate))
+        self._transferFallback()
+
+    def _transferFallback(self):
+        """ Goes back to 9600 after an error at a faster transfer baudrate
+            and remembers that baudrate does not work on this port
+        """
+        if self.portStats:
+            self.portStats.recordTransfer(self.port, self._transferBaudrate, False)
+        self._transferBaudrate = 9600
+        self._setBaudrate(9600)
+        if not self.fw.checkBootloaderVersion():
+            raise FlashJobError("checkBootloaderVersion: Device lost after falling back to 9600")
+
+    def _transferPass(self, enterMode, mode, action, partial=False):
+        """ Runs a write or verify pass, retrying it at 9600
+            if it fails at a faster transfer baudrate
+            Returns the number of lines acknowledged, with partial a pass
+            stopped by a record the device NAKs returns instead of failing
+            the job, a timeout still fails it (or falls back to 9600)
+        """
+        totalLines = len(self.firmware)
+        self.phase = mode
+        while True:
+            if not enterMode():
+                error = "recordAndVerify: Error on enter in {} Mode".format(mode)
+                lines = None
+            else:
+                lines = self.fw.sendFirmware(self.firmware, self.debug)
+                self.result['lines'] = self._linesDone + lines
+                if self.fw.recordRtt() is not None:
+                    self.result['recordRtt'] = round(self.fw.recordRtt() * 1000, 1)
+                if lines == totalLines:
+                    return lines
+                if partial and self.fw.refusedRecord():
+                    return lines #a refused record is an answer, not a transfer error
+                error = "recordAndVerify: Error while {} file. Line {}".format(action, lines)
+
+            if self._transferBaudrate == 9600:
+                raise FlashJobError(error)
+            self.logger.warning("{}: {} at {}, falling back to 9600".format(self.port, error, self._transferBaudrate))
+            self._transferFallback()
+
+    def _verifyOnly(self):
+        """ Compares the device flash with the image, the bootloader does
+            not acknowledge a record that differs so the first record
+            it NAKs (after the retries) is reported, no answer at all
+            fails the job
+        """
+        self._negotiateTransferBaudrate()
+
+        self.logger.debug("{}: Verifying FW... Please wait..".format(self.port))
+        lines = self._transferPass(self.fw.enterVerifyMode, "Verify", "verifying", partial=True)
+        self.result['transferBaudrate'] = self._transferBaudrate
+
+        if lines == len(self.firmware):
+            self.result['match'] = True
+            self.logger.info("{}: Device matches the image".format(self.port))
+            self.fw.sendCommit() #nothing was written, this only starts the application again
+            return
+
+        self.result['match'] = False
+        self.result['firstMismatch'] = lines + 1
+        self.logger.warning("{}: Device differs from the image at record {}".format(self.port, lines + 1))
+        # the bootloader still waits for that record, restart the application if possible
+        if not (self.lineControl and self.lineControl.reset()):
+            self.logger.warning("{}: Device left in bootloader mode".format(self.port))
+
+    def _writeImage(self):
+        """ Writes (and verifies if asked to) the current image,
+            leaving the device in the bootloader
+        """
+        self._negotiateTransferBaudrate()
+
+        self.logger.debug("{}: Writing FW... Please wait..".format(self.port))
+        self._transferPass(self.fw.enterWriteMode, "Write", "uploading")
+
+        if not self.fw.waitResponse("R"):
+            raise FlashJobError("recordAndVerify: 'R' sent. Invalid response received")
+
+        if not self.fw.waitResponse("y"):
+            raise FlashJobError("recordAndVerify: 'y' sent. Invalid response received")
+
+        if self.verify:
+            self.logger.info("{}: Start the Verify process...".format(self.port))
+            self._transferPass(self.fw.enterVerifyMode, "Verify", "verifying")
+
+    def _commit(self):
+        """ Commits the image written, the device starts it
+        """
+        if not self.fw.sendCommit():
+            raise FlashJobError("recordAndVerify: Error sending commit")
+
+        self.result['transferBaudrate'] = self._transferBaudrate
+        if self.portStats:
+            self.portStats.recordTransfer(self.port, self._transferBaudrate, True)
+
+    def _checkNewVersion(self):
+        """ Reads the version of the firmware written
+        """
+        self.logger.info("{}: All OK, XRF successfully reprogrammed!".format(self.port))
+        self.logger.info("{}: Waiting for device to settle...".format(self.port))
+        self.at._sleep(2)
+
+        self._setBaudrate(self.baudrate) #change the port baudrate back to given baudrate
+
+        self.ser.flushInput()
+
+        if not self.at.enterATMode():
+            raise FlashJobError("recordAndVerify: Error entering AT mode")
+
+        self.result['fwVersion'] = self.fw.checkFWVersion()
+        if not self.result['fwVersion']:
+            raise FlashJobError("recordAndVerify: Error checking FW version")
+
+        self.at._sleep(0.1)
+        self.at.leaveATMode()
@@ -0,0 +1,3 @@
+from FlashJob import FlashJob, FlashJobError, openSerial
+
+__ALL__ = ['FlashJob', 'FlashJobError', 'openSerial']
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" FlashPlan Class
+    The images a FlashJob writes to a device, in order
+    A stage can depend on what was found on the device, so a bootloader
+    update image is only written to the devices that need it
+    Every image is a whole application, each stage is committed and runs
+    before the device is identified again for the next one, so a plan of
+    several images is only useful when an image has to run on the device
+    first, as the bootloader update does. Writing one firmware over
+    another uncommitted one leaves the device as writing the last alone
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+class FlashStage():
+
+    def __init__(self, name, firmware, condition=None, bootloader=False):
+        """ firmware is the list of lines of the image
+            condition(identity) tells if the stage is needed on a device
+            (always when None)
+            bootloader marks an image updating the bootloader, the new
+            bootloader is checked once the device is identified again
+        """
+        self.name = name
+        self.firmware = firmware
+        self.condition = condition
+        self.bootloader = bootloader
+
+    def applies(self, identity):
+        return self.condition is None or bool(self.condition(identity))
+
+class FlashPlan():
+
+    def __init__(self, stages=None):
+        self.stages = list(stages or [])
+
+    def add(self, name, firmware, condition=None, bootloader=False):
+        """ Appends a stage, returns the plan
+        """
+        self.stages.append(FlashStage(name, firmware, condition, bootloader))
+        return self
+
+    def stagesFor(self, identity):
+        """ Returns the stages needed on an identified device
+        """
+        return [stage for stage in self.stages if stage.applies(identity)]
+
+    def firmware(self):
+        """ Returns the image the device ends with
+        """
+        for stage in reversed(self.stages):
+            if not stage.bootloader:
+                return stage.firmware
+        return self.stages[-1].firmware
+
+    def totalLines(self, stages=None):
+        return sum(len(stage.firmware) for stage in (stages if stages is not None else self.stages))
+
+    @classmethod
+    def single(cls, firmware):
+        """ The plan of a plain upload
+        """
+        return cls().add('firmware', firmware)
+
+    @classmethod
+    def chain(cls, images, plan=None):
+        """ Writes a sequence of (name, firmware) images in one job, each
+            one runs before the next is written, appended to plan if given
+        """
+        plan = plan or cls()
+        for name, firmware in images:
+            plan.add(name, firmware)
+        return plan
+
+    @classmethod
+    def bootloaderUpdate(cls, updater, firmware=None):
+        """ Writes the bootloader update image first on the devices
+            whose bootloader is too old, then the firmware if given
+        """
+        plan = cls().add('bootloader', updater, lambda identity: identity.needsBootloaderUpdate(), True)
+        if firmware:
+            plan.add('firmware', firmware)
+        return plan
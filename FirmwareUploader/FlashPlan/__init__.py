@@ -0,0 +1,3 @@
+from FlashPlan import FlashPlan, FlashStage
+
+__ALL__ = ['FlashPlan', 'FlashStage']
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Inventory Class
+    Finds out what firmware is on every radio plugged into the host,
+    probing all the serial ports at the same time, and compares it
+    with the firmware catalog
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import sys
+import glob
+import logging
+import threading
+import Queue
+import serial
+import SerialSession
+import DeviceIdentity
+import Catalog
+import PortLock
+
+def listSerialPorts():
+    """Lists serial ports
+
+    :raises EnvironmentError:
+        On unsupported or unknown platforms
+    :returns:
+        A list of available serial ports, ports held by
+        another process are left out without being opened
+    """
+    result = []
+
+    if sys.platform.startswith('win'):
+        import _winreg
+        try:
+            path = "HARDWARE\\DEVICEMAP\\SERIALCOMM"
+            key = _winreg.OpenKey(_winreg.HKEY_LOCAL_MACHINE, path)
+        except WindowsError:
+            return result
+        i = 0
+        while True:
+            try:
+                port = _winreg.EnumValue(key, i)
+                result.append(str(port[1]))
+                i += 1
+            except EnvironmentError:
+                # if reachs here, means the key is empty now
+                return sorted(result)
+    elif sys.platform.startswith('linux') or sys.platform.startswith('cygwin'):
+        # this is to exclude your current terminal "/dev/tty"
+        ports = glob.glob('/dev/tty[A-Za-z]*')
+
+    elif sys.platform.startswith('darwin'):
+        ports = glob.glob('/dev/tty.*')
+
+    else:
+        raise EnvironmentError('Unsupported platform')
+
+    for port in ports:
+        if port == '/dev/ttyprintk': ## don't need to check for this port
+            continue
+        if PortLock.holder(port): # opening it would disturb the upload using it
+            continue
+        try:
+            s = serial.Serial(port)
+            s.close()
+            result.append(port)
+        except (OSError, serial.SerialException):
+            pass
+    return sorted(result)
+
+def probePort(port, baudrate=9600, timeout=1, bootTimeout=1.0, logger=None, opener=None, lineControl=None):
+    """ Reads the firmware version of the device on a port (ATVR), looking
+        for a device sitting in the bootloader when AT mode does not answer
+        The device is not restarted into the bootloader
+        Returns a DeviceIdentity
+    """
+    session = SerialSession.SerialSession(port, baudrate, timeout, logger,
+                                          opener=opener, lineControl=lineControl)
+    try :
+        session.open()
+    except PortLock.PortBusyError as e:
+        identity = DeviceIdentity.DeviceIdentity(port)
+        identity.commFail = True
+        identity.error = str(e)
+        identity.busy = e.holder or "unknown"
+        return identity
+    except serial.SerialException as e:
+        identity = DeviceIdentity.DeviceIdentity(port)
+        identity.commFail = True
+        identity.error = "Failed to open port: {}".format(e)
+        return identity
+    try :
+        return DeviceIdentity.identify(session, enterBootloader=False, bootTimeout=bootTimeout, logger=logger)
+    except serial.SerialException as e:
+        identity = DeviceIdentity.DeviceIdentity(port)
+        identity.commFail = True
+        identity.error = "Communication Error: {}".format(e)
+        return identity
+    finally:
+        session.close()
+
+class Inventory():
+
+    def __init__(self, catalog=None, baudrate=9600, timeout=1, jobs=8, logger=None, opener=None,
+                 portStats=None):
+        """ catalog is a loaded Catalog, without it the
+            device names and updates are not reported
+            with portStats the health of each port is reported
+        """
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+        self.catalog = catalog
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.jobs = jobs
+        self.portStats = portStats
+        self._opener = opener
+
+    def probe(self, ports=None):
+        """ Probes the ports (all the serial ports by default) at the
+            same time, returns the describe() of each one sorted by port
+        """
+        if ports is None:
+            ports = listSerialPorts()
+        pending = Queue.Queue()
+        for port in ports:
+            pending.put(port)
+        results = []
+
+        def worker():
+            while True:
+                try :
+                    port = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                identity = probePort(port, self.baudrate, self.timeout, logger=self.logger, opener=self._opener)
+                results.append(self.describe(identity))
+
+        workers = [threading.Thread(target=worker) for w in range(max(1, min(self.jobs, len(ports))))]
+        for w in workers:
+            w.daemon = True
+            w.start()
+        for w in workers:
+            while w.is_alive():
+                w.join(1) #join with a timeout so Ctrl-C still works
+        return sorted(results, key=lambda r: r['port'])
+
+    def describe(self, identity):
+        """ Joins the identity of a device with the catalog
+        """
+        entry = {
+            'port': identity.port,
+            'found': not identity.commFail,
+            'version': identity.fwVersion,
+            'response': identity.response.strip() if identity.response else None,
+            'firmware': identity.fwName or None,
+            'device': None,
+            'inBootloader': identity.inBootloader,
+            'bootloader': identity.bootloaderVersion,
+            'latest': None,
+            'updateAvailable': None,
+            'busy': identity.busy,
+            'error': identity.error,
+            'health': None,
+        }
+        if self.portStats:
+            entry['health'] = self.portStats.health(identity.port)
+        if identity.commFail:
+            return entry
+        if identity.inBootloader: #no firmware running, it needs one
+            entry['updateAvailable'] = True
+            return entry
+        if not self.catalog or not self.catalog.loaded:
+            return entry
+
+        names = self.catalog.deviceNames(identity.fwName)
+        if not names:
+            return entry
+        entry['device'] = '/'.join(names)
+        deviceClass = self.catalog.devices[identity.fwName]['Device Class']
+        entry['latest'] = Catalog.versionNumber(self.catalog.latestVersion(deviceClass))
+        entry['updateAvailable'] = Catalog.isOlder(identity.fwVersion, entry['latest'])
+        return entry
+
+    @staticmethod
+    def formatTable(entries):
+        """ Returns the entries as a text table
+        """
+        def text(value):
+            if value is None:
+                return '-'
+            if value is True:
+                return 'yes'
+            if value is False:
+                return 'no'
+            return str(value)
+
+        header = ('Port', 'Version', 'Firmware', 'Device', 'Bootloader', 'Latest', 'Update', 'Port health')
+        rows = [header]
+        for e in entries:
+            health = e['health']['state'] if e['health'] else '-'
+            if e['busy']:
+                rows.append((e['port'], 'busy', '', '', '', '', '', health))
+                continue
+            if not e['found']:
+                rows.append((e['port'], 'no device', '', '', '', '', '', health))
+                continue
+            version = 'bootloader' if e['inBootloader'] else e['version']
+            rows.append(tuple(text(v) for v in (e['port'], version, e['firmware'], e['device'],
+                                                e['bootloader'], e['latest'], e['updateAvailable'], health)))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        return '\n'.join('  '.join(value.ljust(w) for value, w in zip(row, widths)).rstrip() for row in rows)
@@ -0,0 +1,3 @@
+from Inventory import Inventory, listSerialPorts, probePort
+
+__ALL__ = ['Inventory', 'listSerialPorts', 'probePort']
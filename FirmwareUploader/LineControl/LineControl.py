@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" LineControl Classes
+    Drive the configuration and reset lines of a radio so it can be put
+    in AT mode or restarted into the bootloader without going through
+    the +++ guard times
+
+    Drivers:
+        SysfsGPIO    GPIO pins through /sys/class/gpio (Raspberry Pi)
+        GpioChip     GPIO lines through /dev/gpiochipN (needs the gpiod module)
+        SerialLines  DTR/RTS lines of a USB serial adapter
+        FakeLineControl  records what would be done, for testing
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import os
+import logging
+from time import sleep
+
+class LineControlError(Exception):
+    """ Raised when a line driver can not be set up
+    """
+    pass
+
+class LineControl():
+    """ Base class of the line drivers, the subclasses only
+        have to set a line with _setLine(name, asserted)
+        name is 'at' or 'reset'
+    """
+
+    resetPulse = 0.01 #seconds the reset line is held
+    bootTime = 0.05 #seconds to wait for the bootloader after a reset
+
+    def __init__(self, logger=None):
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+    def _setLine(self, name, asserted):
+        raise NotImplementedError
+
+    def hasLine(self, name):
+        return True
+
+    def attach(self, serialHandle):
+        """ Called each time the port is (re)opened
+        """
+        pass
+
+    def atMode(self, on=True):
+        """ Asserts (or releases) the line that keeps the radio in AT mode
+        """
+        if not self.hasLine('at'):
+            return False
+        self._setLine('at', on)
+        return True
+
+    def reset(self, bootloader=False):
+        """ Pulses the reset line, holding the AT line while the radio
+            restarts when the bootloader is wanted
+        """
+        if not self.hasLine('reset'):
+            return False
+        if bootloader:
+            self.atMode(True)
+        self._setLine('reset', True)
+        sleep(self.resetPulse)
+        self._setLine('reset', False)
+        sleep(self.bootTime)
+        if bootloader:
+            self.atMode(False)
+        return True
+
+    def close(self):
+        pass
+
+
+class SysfsGPIO(LineControl):
+
+    _base = "/sys/class/gpio"
+
+    def __init__(self, atPin=None, resetPin=None, invert=False, logger=None):
+        LineControl.__init__(self, logger)
+        self._pins = {}
+        self._invert = invert
+        for name, pin in (('at', atPin), ('reset', resetPin)):
+            if pin is not None:
+                self._export(pin)
+                self._pins[name] = pin
+
+    def _write(self, path, value):
+        try :
+            with open(path, 'w') as f:
+                f.write(value)
+        except IOError as e:
+            raise LineControlError("Unable to write {}: {}".format(path, e.strerror))
+
+    def _export(self, pin):
+        if not os.path.exists("{}/gpio{}".format(self._base, pin)):
+            self._write("{}/export".format(self._base), str(pin))
+        # start released so the radio is not held in AT mode or reset
+        self._write("{}/gpio{}/direction".format(self._base, pin), "high" if self._invert else "low")
+
+    def hasLine(self, name):
+        return name in self._pins
+
+    def _setLine(self, name, asserted):
+        self._write("{}/gpio{}/value".format(self._base, self._pins[name]),
+                    "1" if asserted != self._invert else "0")
+
+
+class GpioChip(LineControl):
+
+    def __init__(self, chip=0, atLine=None, resetLine=None, invert=False, logger=None):
+        LineControl.__init__(self, logger)
+        try :
+            import gpiod
+        except ImportError:
+            raise LineControlError("The gpiod module is needed to use /dev/gpiochip{}".format(chip))
+        self._invert = invert
+        self._lines = {}
+        self._chip = gpiod.Chip("gpiochip{}".format(chip))
+        try :
+            for name, offset in (('at', atLine), ('reset', resetLine)):
+                if offset is not None:
+                    line = self._chip.get_line(offset)
+                    line.request(consumer="FirmwareUploader", type=gpiod.LINE_REQ_DIR_OUT,
+                                 default_vals=[1 if invert else 0])
+                    self._lines[name] = line
+        except (OSError, IOError):
+            self.close() #frees the lines already requested
+            raise
+
+    def hasLine(self, name):
+        return name in self._lines
+
+    def _setLine(self, name, asserted):
+        self._lines[name].set_value(1 if asserted != self._invert else 0)
+
+    def close(self):
+        for line in self._lines.values():
+            line.release()
+        self._chip.close()
+
+
+class SerialLines(LineControl):
+    """ Uses the modem control lines of the serial port,
+        by default DTR for AT mode and RTS for reset
+    """
+
+    def __init__(self, atLine='dtr', resetLine='rts', invert=False, logger=None):
+        LineControl.__init__(self, logger)
+        self._names = {'at': atLine, 'reset': resetLine}
+        self._invert = invert
+        self._serial = None
+
+    def attach(self, serialHandle):
+        self._serial = serialHandle
+        # opening the port raises both lines, release them
+        for name in ('at', 'reset'):
+            if self.hasLine(name):
+                self._setLine(name, False)
+
+    def hasLine(self, name):
+        return self._serial is not None and self._names.get(name) in ('dtr', 'rts')
+
+    def _setLine(self, name, asserted):
+        try :
+            if self._names[name] == 'dtr':
+                self._serial.setDTR(asserted != self._invert)
+            else:
+                self._serial.setRTS(asserted != self._invert)
+        except (IOError, ValueError) as e:
+            raise LineControlError("Unable to set {} on the port: {}".format(self._names[name], e))
+
+
+class FakeLineControl(LineControl):
+    """ Keeps every line change in self.events as (line, asserted)
+        onChange is called with the same arguments if given
+    """
+
+    resetPulse = 0
+    bootTime = 0
+
+    def __init__(self, onChange=None, logger=None):
+        LineControl.__init__(self, logger)
+        self.events = []
+        self._onChange = onChange
+
+    def _setLine(self, name, asserted):
+        self.events.append((name, asserted))
+        if self._onChange:
+            self._onChange(name, asserted)
+
+
+def openLineControl(spec, logger=None):
+    """ Creates a driver from a command line/config description
+            gpio:AT[,RESET]             sysfs GPIO pins
+            gpiochip:CHIP:AT[,RESET]    /dev/gpiochipCHIP line offsets
+            serial[:AT[,RESET]]         dtr/rts of the port (default dtr,rts)
+            fake
+        a leading '!' inverts the lines, empty pins are not used
+        Returns None for an empty spec, the driver holds the lines
+        until close() is called
+    """
+    if not spec:
+        return None
+    invert = spec.startswith('!')
+    kind, _, args = spec.lstrip('!').partition(':')
+
+    def pins(text, convert=int):
+        values = [convert(p) if p else None for p in text.split(',')] + [None]
+        return values[0], values[1]
+
+    try :
+        if kind == 'gpio':
+            atPin, resetPin = pins(args)
+            return SysfsGPIO(atPin, resetPin, invert, logger)
+        elif kind == 'gpiochip':
+            chip, _, lines = args.partition(':')
+            atLine, resetLine = pins(lines)
+            return GpioChip(int(chip), atLine, resetLine, invert, logger)
+        elif kind == 'serial':
+            if args:
+                atLine, resetLine = pins(args, str.lower)
+                return SerialLines(atLine, resetLine, invert, logger)
+            return SerialLines(invert=invert, logger=logger)
+        elif kind == 'fake':
+            return FakeLineControl(logger=logger)
+    except ValueError:
+        pass
+    except (OSError, IOError) as e: #a line already in use is EBUSY
+        raise LineControlError("Unable to open line control {}: {}".format(spec, e))
+    raise LineControlError("Invalid line control {}".format(spec))
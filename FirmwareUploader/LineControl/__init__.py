@@ -0,0 +1,3 @@
+from LineControl import LineControl, LineControlError, SysfsGPIO, GpioChip, SerialLines, FakeLineControl, openLineControl
+
+__ALL__ = ['LineControl', 'LineControlError', 'SysfsGPIO', 'GpioChip', 'SerialLines', 'FakeLineControl', 'openLineControl']
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" LogView Class
+    Debug text of the upload screen that keeps memory and redraws bounded
+    Messages can be written from any thread, they are applied to the text
+    widget in one batch per refresh and only the last maxLines lines are
+    kept on screen, every message is also spooled to a temporary file so
+    the full log of the session can still be saved
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import shutil
+import tempfile
+import threading
+from collections import deque
+import Tkinter as tk
+import tkFileDialog
+import tkMessageBox
+from ScrolledText import ScrolledText
+
+class LogView(tk.Frame):
+
+    maxLines = 500 #lines kept in the widget
+    refresh = 200 #ms between batches
+
+    def __init__(self, master, maxLines=None, logger=None, **textOptions):
+        tk.Frame.__init__(self, master)
+        self.logger = logger
+        if maxLines:
+            self.maxLines = maxLines
+
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._spool = tempfile.TemporaryFile(prefix='FirmwareUploader', suffix='.log')
+        self._lines = 1
+
+        self.text = ScrolledText(self, state=tk.DISABLED, **textOptions)
+        self.text.pack(fill=tk.BOTH, expand=True)
+        tk.Button(self, text='Save full log', command=self.save).pack(side=tk.RIGHT)
+
+        self._job = self.after(self.refresh, self._refresh)
+
+    def write(self, message):
+        """ Queues a message, safe to call from any thread
+        """
+        with self._lock:
+            self._pending.append(message)
+
+    def _refresh(self):
+        self.flush()
+        self._job = self.after(self.refresh, self._refresh)
+
+    def flush(self):
+        """ Applies the queued messages, called from the Tk thread
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            batch = ''.join(self._pending)
+            self._pending.clear()
+        self._spool.write(batch)
+
+        follow = self.text.yview()[1] >= 1.0 #only scroll if the end was already shown
+        self.text.config(state=tk.NORMAL)
+        self.text.insert(tk.END, batch)
+        self._lines += batch.count('\n')
+        if self._lines > self.maxLines:
+            excess = self._lines - self.maxLines
+            self.text.delete('1.0', '{}.0'.format(excess + 1))
+            self._lines -= excess
+        self.text.config(state=tk.DISABLED)
+        if follow:
+            self.text.see(tk.END)
+
+    def clear(self):
+        """ Drops every message, shown, spooled or still queued,
+            so the next session starts with an empty log
+        """
+        with self._lock:
+            self._pending.clear()
+        self._spool.seek(0)
+        self._spool.truncate()
+        self.text.config(state=tk.NORMAL)
+        self.text.delete('1.0', tk.END)
+        self.text.config(state=tk.DISABLED)
+        self._lines = 1
+
+    def save(self, fileName=None):
+        """ Writes every message of the session to fileName,
+            asks for it when not given
+        """
+        self.flush()
+        if fileName is None:
+            fileName = tkFileDialog.asksaveasfilename(parent=self, defaultextension='.log',
+                                                      initialfile='FirmwareUploader_upload.log')
+            if not fileName:
+                return False
+        try :
+            self._spool.flush()
+            self._spool.seek(0)
+            with open(fileName, 'wb') as f:
+                shutil.copyfileobj(self._spool, f)
+        except IOError as e:
+            if self.logger:
+                self.logger.error("Unable to save the log to {}: {}".format(fileName, e.strerror))
+            tkMessageBox.showerror('Error', "Unable to save the log:\n{}".format(e.strerror), parent=self)
+            return False
+        finally:
+            self._spool.seek(0, 2)
+        return True
+
+    def destroy(self):
+        self.after_cancel(self._job)
+        self._spool.close()
+        tk.Frame.destroy(self)
@@ -0,0 +1,3 @@
+from LogView import LogView
+
+__ALL__ = ['LogView']
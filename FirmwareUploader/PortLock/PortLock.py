@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" PortLock Class
+    Keeps a serial port to one uploader at a time, two uploads on the
+    same device corrupt each other and the device has to be recovered
+
+    The port is locked with a UUCP lock file (/var/lock/LCK..ttyUSB0,
+    holding the pid) when the lock directory is writable, then with
+    flock() and TIOCEXCL on the open port, so other programs using
+    either convention, and any other open of the tty, are kept out
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import os
+import errno
+import glob
+import logging
+import serial
+
+TIOCEXCL = 0x540C
+
+_lockDirs = ["/var/lock", "/run/lock"]
+
+class PortBusyError(serial.SerialException):
+    """ Raised when another process (or session) holds the port,
+        holder describes it when known
+    """
+
+    def __init__(self, port, holder=None):
+        serial.SerialException.__init__(self, "Port {} is busy{}".format(
+            port, ", held by {}".format(holder) if holder else ""))
+        self.port = port
+        self.holder = holder
+
+def _pidAlive(pid):
+    try :
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+def _describe(pid):
+    try :
+        with open("/proc/{}/cmdline".format(pid)) as f:
+            command = f.read().replace('\0', ' ').strip()
+    except IOError:
+        command = ''
+    if len(command) > 60:
+        command = command[:57] + '...'
+    if command:
+        return "pid {} ({})".format(pid, command)
+    return "pid {}".format(pid)
+
+def _lockFileName(port, lockDir):
+    device = os.path.realpath(port)
+    if device.startswith("/dev/"):
+        name = device[len("/dev/"):].replace('/', '_') #/dev/pts/1 is LCK..pts_1
+    else:
+        name = os.path.basename(device)
+    return os.path.join(lockDir, "LCK..{}".format(name))
+
+def _lockFilePid(fileName):
+    """ Returns the pid of a live lock file owner, None if there is none
+    """
+    try :
+        with open(fileName) as f:
+            pid = int(f.read().strip() or 0)
+    except (IOError, ValueError):
+        return None
+    if pid > 0 and _pidAlive(pid):
+        return pid
+    return None
+
+def _openers(port):
+    """ Returns the pids of the processes with the port open
+    """
+    device = os.path.realpath(port)
+    pids = []
+    for fd in glob.glob("/proc/[0-9]*/fd/*"):
+        try :
+            if os.readlink(fd) == device:
+                pid = int(fd.split('/')[2])
+                if pid not in pids:
+                    pids.append(pid)
+        except (OSError, ValueError):
+            pass
+    return pids
+
+def holder(port):
+    """ Describes who holds the port (None if it looks free) without
+        opening it, so busy ports can be skipped without disturbing them
+        Only other processes are seen
+    """
+    for lockDir in _lockDirs:
+        pid = _lockFilePid(_lockFileName(port, lockDir))
+        if pid is not None:
+            return _describe(pid)
+    pids = [pid for pid in _openers(port) if pid != os.getpid()]
+    if pids:
+        return ', '.join(_describe(pid) for pid in pids)
+    return None
+
+def openError(port, error):
+    """ Returns the error to raise for a port that failed to open, a
+        PortBusyError when the port is opened exclusively (TIOCEXCL)
+        by another process, which fails with EBUSY, else error itself
+    """
+    if getattr(error, 'errno', None) == errno.EBUSY or os.strerror(errno.EBUSY) in str(error):
+        return PortBusyError(port, holder(port))
+    return error
+
+def _holderOf(port):
+    """ Describes who holds a port that could not be locked
+    """
+    return holder(port) or "another session of this process"
+
+class PortLock():
+
+    def __init__(self, port, logger=None):
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+        self.port = port
+        self._lockFile = None
+
+    def acquire(self):
+        """ Takes the lock file, before the port is opened
+            Raises PortBusyError if another live process has it
+        """
+        for lockDir in _lockDirs:
+            if not os.path.isdir(lockDir):
+                continue
+            fileName = _lockFileName(self.port, lockDir)
+            for attempt in range(2):
+                try :
+                    fd = os.open(fileName, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                except OSError as e:
+                    if e.errno != errno.EEXIST:
+                        break #lock directory not writable, rely on flock
+                    pid = _lockFilePid(fileName)
+                    if pid is not None:
+                        raise PortBusyError(self.port, _describe(pid))
+                    self.logger.debug("{}: Removing stale lock file {}".format(self.port, fileName))
+                    try :
+                        os.unlink(fileName)
+                    except OSError:
+                        break
+                    continue
+                os.write(fd, "{:10d}\n".format(os.getpid()))
+                os.close(fd)
+                self._lockFile = fileName
+                return
+            return
+
+    def attach(self, serialHandle):
+        """ Locks the open port with flock() and TIOCEXCL
+            Raises PortBusyError if another process has it locked
+        """
+        try :
+            import fcntl
+            fd = serialHandle.fileno()
+        except (ImportError, AttributeError, ValueError): #no file descriptor (replay) or not posix
+            return
+        try :
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as e:
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                raise PortBusyError(self.port, _holderOf(self.port))
+            self.logger.debug("{}: flock not supported: {}".format(self.port, e))
+        try :
+            fcntl.ioctl(fd, TIOCEXCL)
+        except IOError as e:
+            self.logger.debug("{}: TIOCEXCL not supported: {}".format(self.port, e))
+
+    def release(self):
+        """ Removes the lock file, after the port is closed (closing
+            the port drops the flock and TIOCEXCL locks)
+        """
+        if self._lockFile:
+            try :
+                os.unlink(self._lockFile)
+            except OSError:
+                pass
+            self._lockFile = None
@@ -0,0 +1,3 @@
+from PortLock import PortLock, PortBusyError, holder, openError
+
+__ALL__ = ['PortLock', 'PortBusyError', 'holder', 'openError']
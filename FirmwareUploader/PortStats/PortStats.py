@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" PortStats Class
+    Keeps what was learnt about each serial port between runs
+    in a small JSON file
+
+    The health of each port is kept from its last sessions (NAK rate,
+    AT timeouts, failed sessions and record round trip), a port past
+    a threshold is 'degraded' and flashed last, a port failing
+    quarantineAfter sessions in a row is 'quarantined' and not used
+    until released
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import os
+import copy
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from time import time
+try :
+    import fcntl
+except ImportError: #not posix, the processes sharing the file are not locked out
+    fcntl = None
+
+class PortStats():
+
+    # past any of these limits a port is degraded
+    thresholds = {
+        'nakRate': 0.02, #NAKs per record sent
+        'timeouts': 3.0, #AT timeouts per session
+        'failureRate': 0.25, #failed sessions
+        'recordRtt': 100.0, #ms
+    }
+    quarantineAfter = 3 #failed sessions in a row
+    window = 20 #sessions kept per port
+    minSessions = 3 #sessions needed before the rates are judged
+    transferRetryAfter = 24 * 3600 #seconds before a failed transfer baudrate is tried again
+
+    def __init__(self, fileName=None, logger=None, thresholds=None, quarantineAfter=None):
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+        self._fileName = fileName
+        self.thresholds = dict(self.thresholds, **(thresholds or {}))
+        if quarantineAfter is not None:
+            self.quarantineAfter = quarantineAfter
+        self._lock = threading.Lock()
+        self._ports = {}
+        self._fileState = None #inode, mtime and size of the file when last read or written
+        self._load()
+
+    def _load(self):
+        if not self._fileName or not os.path.exists(self._fileName):
+            return
+        import json
+        try :
+            fileState = self._stat()
+            with open(self._fileName) as f:
+                self._ports = json.load(f)
+            self._fileState = fileState
+        except (IOError, OSError, ValueError) as e:
+            self.logger.warning("PortStats: Could not read {}: {}".format(self._fileName, e))
+
+    def _stat(self):
+        st = os.stat(self._fileName)
+        return (st.st_ino, st.st_mtime, st.st_size)
+
+    def _refresh(self):
+        """ Reads the file again if another process changed it
+        """
+        try :
+            if self._fileName and self._stat() != self._fileState:
+                self._load()
+        except OSError:
+            pass
+
+    def _save(self):
+        """ Writes a temporary file renamed over the file, so a reader
+            never sees it half written
+        """
+        if not self._fileName:
+            return
+        import json
+        directory = os.path.dirname(os.path.abspath(self._fileName))
+        try :
+            fd, tempName = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self._fileName), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._ports, f, indent=2, sort_keys=True)
+            if os.name == 'nt' and os.path.exists(self._fileName):
+                os.remove(self._fileName) #no atomic replace there
+            os.rename(tempName, self._fileName)
+            self._fileState = self._stat()
+        except (IOError, OSError) as e:
+            self.logger.warning("PortStats: Could not write {}: {}".format(self._fileName, e.strerror))
+
+    @contextmanager
+    def _updating(self):
+        """ Holds the lock of this object and an flock shared by every process
+            using the file, reads the file again so the changes of the other
+            processes are merged with this one, then saves it
+        """
+        with self._lock:
+            lockFile = None
+            if self._fileName and fcntl:
+                try :
+                    lockFile = open(self._fileName + '.lock', 'a')
+                    fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX)
+                except IOError as e:
+                    self.logger.warning("PortStats: Could not lock {}: {}".format(self._fileName, e.strerror))
+            try :
+                self._load()
+                yield
+                self._save()
+            finally:
+                if lockFile:
+                    lockFile.close() #drops the flock
+
+    def get(self, port, key, default=None):
+        with self._lock:
+            self._refresh()
+            return self._ports.get(port, {}).get(key, default)
+
+    def set(self, port, key, value):
+        with self._updating():
+            self._ports.setdefault(port, {})[key] = value
+
+    def export(self, port):
+        """ Returns a copy of everything known about a port
+        """
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._ports.get(port, {}))
+
+    def restore(self, port, stats):
+        """ Replaces what is known about a port with an export(),
+            taken from a copy updated in another process
+        """
+        with self._updating():
+            self._ports[port] = copy.deepcopy(stats)
+
+    def snapshot(self, port):
+        """ Returns a new PortStats knowing only about port, with its own
+            lock and no file, for a process forked off this one
+        """
+        stats = PortStats(logger=self.logger, thresholds=self.thresholds, quarantineAfter=self.quarantineAfter)
+        stats._ports[port] = self.export(port)
+        return stats
+
+    def transferBaudrate(self, port, baudrate=None):
+        """ Returns the baudrate to try for the bootloader transfer on a port,
+            the last one that worked there when none is asked for (None),
+            9600 if the baudrate failed there within transferRetryAfter
+        """
+        with self._lock:
+            self._refresh()
+            stats = self._ports.get(port, {})
+            if baudrate is None:
+                baudrate = stats.get('transferBaudrate', 9600)
+            if baudrate != 9600 and stats.get('failedTransferBaudrate') == baudrate and \
+                    time() - stats.get('failedTransferAt', 0) < self.transferRetryAfter:
+                return 9600
+            return baudrate
+
+    def recordTransfer(self, port, baudrate, success):
+        """ Records the result of a bootloader transfer at a baudrate
+        """
+        if baudrate == 9600:
+            return
+        with self._updating():
+            stats = self._ports.setdefault(port, {})
+            if success:
+                stats['transferBaudrate'] = baudrate
+                if stats.get('failedTransferBaudrate') == baudrate:
+                    del stats['failedTransferBaudrate']
+                    stats.pop('failedTransferAt', None)
+            else:
+                stats['failedTransferBaudrate'] = baudrate
+                stats['failedTransferAt'] = time()
+                if stats.get('transferBaudrate') == baudrate:
+                    stats['transferBaudrate'] = 9600
+
+    def recordSession(self, port, records, naks, timeouts, failed, recordRtt=None):
+        """ Records the outcome of one session on a port,
+            quarantining the port after too many failures in a row
+        """
+        with self._updating():
+            stats = self._ports.setdefault(port, {})
+            sessions = stats.setdefault('sessions', [])
+            sessions.append({'records': records, 'naks': naks, 'timeouts': timeouts,
+                             'failed': bool(failed), 'recordRtt': recordRtt})
+            del sessions[:-self.window]
+            if failed:
+                stats['consecutiveFailures'] = stats.get('consecutiveFailures', 0) + 1
+                if stats['consecutiveFailures'] >= self.quarantineAfter and not stats.get('quarantined'):
+                    stats['quarantined'] = "{} failed sessions in a row".format(stats['consecutiveFailures'])
+                    self.logger.warning("PortStats: {} quarantined, {}".format(port, stats['quarantined']))
+            else:
+                stats['consecutiveFailures'] = 0
+
+    def health(self, port):
+        """ Returns the health of a port from its last sessions,
+            state is 'ok', 'degraded' or 'quarantined' and reasons
+            lists the thresholds passed
+        """
+        with self._lock:
+            self._refresh()
+            stats = self._ports.get(port, {})
+            sessions = list(stats.get('sessions', []))
+            quarantined = stats.get('quarantined')
+
+        records = sum(s['records'] for s in sessions)
+        rtts = [s['recordRtt'] for s in sessions if s.get('recordRtt') is not None]
+        health = {
+            'sessions': len(sessions),
+            'nakRate': round(float(sum(s['naks'] for s in sessions)) / records, 4) if records else None,
+            'timeouts': round(float(sum(s['timeouts'] for s in sessions)) / len(sessions), 2) if sessions else None,
+            'failureRate': round(float(len([s for s in sessions if s['failed']])) / len(sessions), 2) if sessions else None,
+            'recordRtt': round(sum(rtts) / len(rtts), 1) if rtts else None,
+            'quarantined': quarantined,
+        }
+
+        reasons = []
+        if len(sessions) >= self.minSessions:
+            for key in ('nakRate', 'timeouts', 'failureRate', 'recordRtt'):
+                if health[key] is not None and health[key] > self.thresholds[key]:
+                    reasons.append("{} {} over {}".format(key, health[key], self.thresholds[key]))
+        if quarantined:
+            health['state'] = 'quarantined'
+            reasons.insert(0, quarantined)
+        elif reasons:
+            health['state'] = 'degraded'
+        else:
+            health['state'] = 'ok'
+        health['reasons'] = reasons
+        return health
+
+    def ports(self):
+        """ Returns the ports known
+        """
+        with self._lock:
+            self._refresh()
+            return sorted(self._ports.keys())
+
+    def isQuarantined(self, port):
+        return bool(self.get(port, 'quarantined'))
+
+    def release(self, port):
+        """ Takes a port out of quarantine, forgetting its past sessions
+        """
+        with self._updating():
+            stats = self._ports.get(port)
+            if not stats:
+                return False
+            released = bool(stats.pop('quarantined', None))
+            stats.pop('sessions', None)
+            stats.pop('consecutiveFailures', None)
+        return released
+
+    def schedulingOrder(self, items, port=lambda item: item):
+        """ Sorts ports, or items whose port is port(item),
+            so the degraded ports come last
+        """
+        return sorted(items, key=lambda item: self.health(port(item))['state'] != 'ok')
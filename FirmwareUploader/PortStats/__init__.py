@@ -0,0 +1,3 @@
+from PortStats import PortStats
+
+__ALL__ = ['PortStats']
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" PortTuning Class
+    Lowers the latency of USB serial adapters while the uploader uses them
+    The bootloader answers every record, and adapters such as the FTDI ones
+    hold each answer for their latency timer (16ms by default), which takes
+    longer than the record itself at 9600
+
+    On Linux the latency_timer of the usb-serial driver is lowered through
+    sysfs and ASYNC_LOW_LATENCY is set with TIOCSSERIAL, where permitted
+    The original settings are restored when the port is closed, ports that
+    can not be tuned (ptys, other drivers, other systems) are left alone
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import os
+import sys
+import array
+import logging
+
+TIOCGSERIAL = 0x541E
+TIOCSSERIAL = 0x541F
+ASYNC_LOW_LATENCY = 0x2000
+_FLAGS = 4 #index of flags in struct serial_struct read as ints
+
+class PortTuning():
+
+    _sysTty = "/sys/class/tty"
+
+    def __init__(self, port, latencyTimer=1, logger=None):
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+        self.port = port
+        self.latencyTimer = latencyTimer
+        self.driver = None
+        self._name = os.path.basename(os.path.realpath(port))
+        self._serial = None
+        self._savedTimer = None #latency_timer before apply(), None if not changed
+        self._savedFlags = None #serial_struct flags before apply(), None if not changed
+
+    def applied(self):
+        """ True when a setting of the port was changed
+        """
+        return self._savedTimer is not None or self._savedFlags is not None
+
+    def settings(self):
+        """ Returns what was changed, for the reports
+        """
+        return {
+            'driver': self.driver,
+            'latencyTimer': self._readTimer() if self._savedTimer is not None else None,
+            'originalLatencyTimer': self._savedTimer,
+            'lowLatency': self._savedFlags is not None,
+        }
+
+    def _timerPath(self):
+        return os.path.join(self._sysTty, self._name, "device", "latency_timer")
+
+    def _readTimer(self):
+        try :
+            with open(self._timerPath()) as f:
+                return int(f.read().strip())
+        except (IOError, ValueError):
+            return None
+
+    def _writeTimer(self, value):
+        try :
+            with open(self._timerPath(), 'w') as f:
+                f.write(str(value))
+            return True
+        except IOError as e:
+            self.logger.debug("{}: Unable to set the latency timer: {}".format(self.port, e.strerror))
+            return False
+
+    def _findDriver(self):
+        try :
+            return os.path.basename(os.readlink(os.path.join(self._sysTty, self._name, "device", "driver")))
+        except OSError:
+            return None
+
+    def _ioctl(self, request, buf):
+        import fcntl
+        fcntl.ioctl(self._serial.fileno(), request, buf, True)
+
+    def apply(self, serialHandle):
+        """ Tunes the port, called each time it is opened
+            Returns True when a setting was changed
+        """
+        self._serial = serialHandle
+        if not sys.platform.startswith('linux'):
+            return False
+
+        self.driver = self._findDriver()
+        if self.driver is None: #not a hardware port (pty, socket, replay)
+            return False
+
+        timer = self._readTimer()
+        if timer is not None and timer > self.latencyTimer:
+            if self._writeTimer(self.latencyTimer):
+                self._savedTimer = timer
+
+        try :
+            buf = array.array('i', [0] * 32)
+            self._ioctl(TIOCGSERIAL, buf)
+            if not buf[_FLAGS] & ASYNC_LOW_LATENCY:
+                flags = buf[_FLAGS]
+                buf[_FLAGS] |= ASYNC_LOW_LATENCY
+                self._ioctl(TIOCSSERIAL, buf)
+                self._savedFlags = flags
+        except (IOError, OSError, AttributeError, ImportError) as e:
+            self.logger.debug("{}: Unable to set low latency mode: {}".format(self.port, e))
+
+        if self.applied():
+            self.logger.debug("{}: Low latency set on {} port".format(self.port, self.driver))
+        return self.applied()
+
+    def restore(self):
+        """ Puts back the original settings, called before the port is closed
+        """
+        if self._savedFlags is not None:
+            try :
+                buf = array.array('i', [0] * 32)
+                self._ioctl(TIOCGSERIAL, buf)
+                buf[_FLAGS] = self._savedFlags
+                self._ioctl(TIOCSSERIAL, buf)
+            except (IOError, OSError, ValueError) as e:
+                self.logger.debug("{}: Unable to restore the serial flags: {}".format(self.port, e))
+            self._savedFlags = None
+
+        if self._savedTimer is not None:
+            self._writeTimer(self._savedTimer)
+            self._savedTimer = None
@@ -0,0 +1,3 @@
+from PortTuning import PortTuning
+
+__ALL__ = ['PortTuning']
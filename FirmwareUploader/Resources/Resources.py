@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Resources
+    Locates the files shipped next to the uploader (icons and config files)
+    so they are found whatever the current directory is
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import os
+import sys
+
+def resourcePath(name):
+    """ Returns the full path of a file in the uploader directory
+        (the directory of the executable when frozen by py2exe)
+        Absolute paths are returned unchanged
+    """
+    if os.path.isabs(name):
+        return name
+    if getattr(sys, 'frozen', False):
+        base = os.path.dirname(sys.executable)
+    else:
+        base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base, name)
+
+def statePath(name):
+    """ Returns the full path of a file kept between runs for the user
+        (~/.local/state/FirmwareUploader, or $XDG_STATE_HOME, on Linux
+        and %LOCALAPPDATA%\FirmwareUploader on Windows), creating the
+        directory if needed
+        Absolute paths are returned unchanged
+    """
+    if os.path.isabs(name):
+        return name
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    base = os.path.join(base, 'FirmwareUploader')
+    if not os.path.isdir(base):
+        try :
+            os.makedirs(base)
+        except OSError:
+            pass #reported when the file is written
+    return os.path.join(base, name)
@@ -0,0 +1,3 @@
+from Resources import resourcePath, statePath
+
+__ALL__ = ['resourcePath', 'statePath']
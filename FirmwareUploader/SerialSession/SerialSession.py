@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" SerialSession Class
+    Owns the open port of one device together with the AT and FW classes
+    using it, baudrate and timeout changes are made on the open port
+    instead of closing and opening it again
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import sys
+import serial
+import threading
+import logging
+import AT
+import FW
+import PortTuning
+import PortLock
+
+class SerialSession():
+
+    # the OSX USB serial drivers do not always pick up a baudrate change on
+    # the open port, there the port is reopened twice as the GUI always did
+    reopenOnBaudChange = sys.platform == 'darwin'
+
+    def __init__(self, port, baudrate=9600, timeout=1, logger=None, opener=None,
+                 lineControl=None, trace=None, retryPolicy=None, wireRecorder=None, event=None,
+                 lowLatency=True, exclusive=True):
+        """ opener is called as opener(port, baudrate, timeout) and returns
+            an open serial handle, by default a serial.Serial recorded by
+            wireRecorder if one is given
+            With lowLatency the latency of USB serial adapters is lowered
+            while the port is open (see PortTuning)
+            With exclusive the port is locked while it is open (see PortLock),
+            opening a port held elsewhere raises PortLock.PortBusyError
+        """
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.lineControl = lineControl
+        self.trace = trace
+        self.retryPolicy = retryPolicy
+        self.wireRecorder = wireRecorder
+        self.event = event or threading.Event()
+        self.tuning = PortTuning.PortTuning(port, logger=self.logger) if lowLatency else None
+        self.lock = PortLock.PortLock(port, self.logger) if exclusive else None
+        self._opener = opener or self._openSerial
+
+        self.ser = None
+        self.at = None
+        self.fw = None
+
+    def _openSerial(self, port, baudrate, timeout):
+        ser = serial.Serial(port, baudrate, timeout=timeout)
+        if self.wireRecorder:
+            ser = self.wireRecorder.tap(ser)
+        return ser
+
+    def _connect(self):
+        if self.lock:
+            self.lock.acquire()
+        try :
+            self.ser = self._opener(self.port, self.baudrate, self.timeout)
+            if self.lock:
+                self.lock.attach(self.ser)
+        except PortLock.PortBusyError:
+            self.close()
+            raise
+        except serial.SerialException as e:
+            self.close()
+            raise PortLock.openError(self.port, e)
+        if self.tuning:
+            self.tuning.apply(self.ser)
+        if self.lineControl:
+            self.lineControl.attach(self.ser)
+
+    def open(self):
+        """ Opens the port and creates the AT and FW classes for it,
+            returns the serial handle
+        """
+        self._connect()
+        self.at = AT.AT(self.ser, self.logger, event=self.event, trace=self.trace,
+                        lineControl=self.lineControl)
+        self.fw = FW.FW(self.at, self.ser, self.logger, event=self.event,
+                        wireRecorder=self.wireRecorder, retryPolicy=self.retryPolicy)
+        return self.ser
+
+    def reopen(self):
+        """ Closes and opens the port again, keeping the AT and FW classes
+        """
+        self.close()
+        self._connect()
+        self.at.setSerial(self.ser)
+        self.fw.setSerial(self.ser)
+        return self.ser
+
+    def reconfigure(self, baudrate=None, timeout=None):
+        """ Changes the baudrate and/or the timeout of the open port
+            and drops any input received at the old settings
+        """
+        if baudrate is None:
+            baudrate = self.baudrate
+        if timeout is None:
+            timeout = self.timeout
+        if baudrate == self.baudrate and timeout == self.timeout:
+            return self.ser
+
+        baudrateChanged = baudrate != self.baudrate
+        self.baudrate = baudrate
+        self.timeout = timeout
+        if baudrateChanged and self.reopenOnBaudChange:
+            self.reopen()
+            self.reopen()
+        else:
+            self.ser.baudrate = baudrate
+            self.ser.timeout = timeout
+        self.ser.flushInput()
+        return self.ser
+
+    def cancel(self):
+        """ Called from another thread to stop what is using the session,
+            waits and reads in AT and FW raise AT.CancelledError right away
+            and the thread using the session is left to close the port
+        """
+        self.event.set()
+        if self.ser and hasattr(self.ser, 'cancel_read'):
+            try :
+                self.ser.cancel_read()
+                self.ser.cancel_write()
+            except (serial.SerialException, OSError):
+                pass
+
+    def close(self):
+        if self.tuning:
+            self.tuning.restore()
+        if self.ser:
+            try :
+                self.ser.close()
+            except serial.SerialException:
+                pass
+            self.ser = None
+        if self.lock:
+            self.lock.release()
@@ -0,0 +1,3 @@
+from SerialSession import SerialSession
+
+__ALL__ = ['SerialSession']
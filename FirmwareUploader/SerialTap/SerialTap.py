@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Serial Tap Classes
+    Records the traffic of a serial.Serial handle to a compact binary file
+    and replays a recorded session back to the AT/FW classes
+
+    File layout:
+        header  'WTWR' + version (B) + wall clock start time (d)
+        record  type (B) + microseconds since previous record (I) + length (H)
+                followed by length bytes of data
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import os
+import sys
+import time
+import struct
+import threading
+import logging
+
+_MAGIC = 'WTWR'
+_VERSION = 1
+_HEADER = struct.Struct('<4sBd')
+_RECORD = struct.Struct('<BIH')
+
+TX = 0
+RX = 1
+OPEN = 2
+CLOSE = 3
+
+_TYPES = {TX: 'TX', RX: 'RX', OPEN: 'OPEN', CLOSE: 'CLOSE'}
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+class WireRecorder():
+    """ Writes timestamped serial chunks to a recording file
+        One recorder can be shared by every handle opened during a session
+    """
+
+    def __init__(self, fileName):
+        self._lock = threading.Lock()
+        self._open(fileName)
+
+    def _open(self, fileName):
+        self.fileName = fileName
+        self._file = open(fileName, 'wb')
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, time.time()))
+        self._last = _monotonic()
+
+    def forked(self, fileName):
+        """ Called in a child process right after fork(), drops the file
+            and the lock shared with the parent without writing to them
+            and records the child to its own file
+        """
+        self._lock = threading.Lock() #another thread of the parent may hold the old one
+        inherited = self._file
+        if inherited is not None:
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, inherited.fileno()) #what it still buffers goes nowhere
+            os.close(devnull)
+            inherited.close()
+        self._open(fileName)
+
+    def record(self, recordType, data):
+        """ Append one chunk to the file
+            Chunks longer than the length field are split
+        """
+        with self._lock:
+            if self._file is None:
+                return
+            now = _monotonic()
+            delta = min(int((now - self._last) * 1000000), 0xFFFFFFFF)
+            self._last = now
+            while True:
+                chunk = data[:0xFFFF]
+                data = data[0xFFFF:]
+                self._file.write(_RECORD.pack(recordType, delta, len(chunk)))
+                self._file.write(chunk)
+                delta = 0
+                if not data:
+                    break
+
+    def tap(self, serialHandle):
+        """ Wraps an open serial handle so its traffic gets recorded
+        """
+        self.record(OPEN, "{}@{}".format(serialHandle.port, serialHandle.baudrate))
+        return SerialTap(serialHandle, self)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SerialTap():
+    """ Proxy around a serial.Serial handle that reports every
+        read and write to a WireRecorder
+        Anything not handled here is passed straight to the real handle
+    """
+
+    def __init__(self, serialHandle, recorder):
+        self.__dict__['_serial'] = serialHandle
+        self.__dict__['_recorder'] = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._serial, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._serial, name, value)
+
+    def read(self, size=1):
+        data = self._serial.read(size)
+        if data:
+            self._recorder.record(RX, data)
+        return data
+
+    def write(self, data):
+        self._recorder.record(TX, data)
+        return self._serial.write(data)
+
+    def close(self):
+        self._recorder.record(CLOSE, '')
+        self._serial.close()
+
+
+def readRecording(fileName):
+    """ Loads a recording file
+        Returns the wall clock start time and a list of
+        (type, seconds since start, data) tuples
+    """
+    with open(fileName, 'rb') as f:
+        magic, version, started = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("{} is not a wire recording".format(fileName))
+        records = []
+        offset = 0.0
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                break
+            recordType, delta, length = _RECORD.unpack(head)
+            offset += delta / 1000000.0
+            records.append((recordType, offset, f.read(length)))
+    return started, records
+
+
+class SerialReplay():
+    """ Stands in for a serial.Serial handle and plays back the RX side
+        of a recording, keeping the recorded timing divided by speed
+        (speed=0 plays back as fast as possible)
+        TX data is compared against the recording and differences are logged
+    """
+
+    def __init__(self, fileName, speed=1.0, logger=None):
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+        self._started, self._records = readRecording(fileName)
+        self._speed = speed
+        self._index = 0
+        self._pending = ''
+        self._origin = None
+        self.port = None
+        self.baudrate = 9600
+        self.timeout = 1
+        self.isOpen = True
+        self.mismatches = 0
+
+    def _waitUntil(self, offset):
+        if not self._speed:
+            return
+        if self._origin is None:
+            self._origin = _monotonic() - offset / self._speed
+        delay = self._origin + offset / self._speed - _monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _skipMarkers(self):
+        while (self._index < len(self._records) and
+               self._records[self._index][0] in (OPEN, CLOSE)):
+            self._index += 1
+
+    def open(self):
+        self.isOpen = True
+
+    def close(self):
+        self.isOpen = False
+
+    def flushInput(self):
+        self._pending = ''
+
+    def flushOutput(self):
+        pass
+
+    def setDTR(self, level=True):
+        pass
+
+    def setRTS(self, level=True):
+        pass
+
+    @property
+    def in_waiting(self):
+        return len(self._pending)
+
+    def inWaiting(self):
+        return self.in_waiting
+
+    def read(self, size=1):
+        data = self._pending[:size]
+        self._pending = self._pending[size:]
+        while len(data) < size:
+            self._skipMarkers()
+            if self._index >= len(self._records) or self._records[self._index][0] != RX:
+                # the host is expected to talk next (or the recording ended), act as a timeout
+                if self._speed and self.timeout:
+                    time.sleep(self.timeout / self._speed)
+                break
+            recordType, offset, chunk = self._records[self._index]
+            self._index += 1
+            self._waitUntil(offset)
+            need = size - len(data)
+            data += chunk[:need]
+            self._pending += chunk[need:]
+        return data
+
+    def write(self, data):
+        expected = ''
+        while len(expected) < len(data):
+            self._skipMarkers()
+            if self._index >= len(self._records) or self._records[self._index][0] != TX:
+                break
+            expected += self._records[self._index][2]
+            self._index += 1
+        if expected != data:
+            self.mismatches += 1
+            self.logger.debug("Replay: TX {!r} differs from recorded {!r}".format(data, expected))
+        return len(data)
+
+
+if __name__ == "__main__":
+    started, records = readRecording(sys.argv[1])
+    print("Recording started {}".format(time.ctime(started)))
+    for recordType, offset, data in records:
+        print("{:12.6f} {:<5} {!r}".format(offset, _TYPES.get(recordType, recordType), data))
@@ -0,0 +1,3 @@
+from SerialTap import WireRecorder, SerialTap, SerialReplay, readRecording
+
+__ALL__ = ['WireRecorder', 'SerialTap', 'SerialReplay', 'readRecording']
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" SerialWorker Class
+    Runs a FlashJob in a child process so the timing of the bootloader
+    handshake no longer depends on how busy the GUI is, the child sends
+    its log records, progress and result back over a pipe
+    Where there is no fork (Windows) the job runs in a thread of this
+    process instead, with the same events
+
+    Events returned by poll():
+        ('log', record)                           log record of the job
+        ('progress', phase, lines, totalLines)    see FlashJob.progress()
+        ('result', result)                        the job ended
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import os
+import logging
+import threading
+import multiprocessing
+import AsyncLog
+
+class _PipeQueue():
+    """ Lets an AsyncLog.QueueHandler send the records over the pipe
+    """
+
+    def __init__(self, send):
+        self._send = send
+
+    def put_nowait(self, record):
+        self._send('log', record)
+
+class _ThreadFilter(logging.Filter):
+    """ Keeps the records logged by the thread that created it
+    """
+
+    def __init__(self):
+        logging.Filter.__init__(self)
+        self.thread = threading.current_thread().ident
+
+    def filter(self, record):
+        return record.thread == self.thread
+
+class SerialWorker():
+
+    # without fork the job would have to be pickled for a new interpreter
+    useProcess = hasattr(os, 'fork')
+    interval = 0.1 #seconds between progress events
+
+    def __init__(self, job, priority=0, logger=None, wireRecorder=None):
+        """ job is the FlashJob to run, the child works on its own copy
+            priority is taken off the niceness of the child, raising it
+            needs the permission to do so (root or CAP_SYS_NICE), without
+            it the child runs at the normal priority
+            wireRecorder is the SerialTap.WireRecorder used by the serial
+            factory of the job, if any, a child process records to its
+            own file next to it (session-worker<pid>.wtr)
+        """
+        if logger == None:
+            logging.basicConfig(level=logging.DEBUG)
+            self.logger = logging.getLogger()
+        else:
+            self.logger = logger
+
+        self.job = job
+        self.priority = priority
+        self.wireRecorder = wireRecorder
+        self.result = None
+        self._conn, self._childConn = multiprocessing.Pipe()
+        self._sendLock = threading.Lock()
+        self._priorityError = None
+        self._worker = None
+        self._handler = None #child process only, see start()
+        self._portStats = None
+
+    def start(self):
+        if self.useProcess:
+            if self.wireRecorder:
+                self.wireRecorder.flush() #or the child writes it out again
+            # what the child needs is made here, see _child()
+            self._handler = AsyncLog.QueueHandler(_PipeQueue(self._send))
+            if self.job.portStats:
+                self._portStats = self.job.portStats.snapshot(self.job.port)
+            self._worker = multiprocessing.Process(target=self._child, name='SerialWorker')
+        else:
+            self._worker = threading.Thread(target=self._run, name='SerialWorker')
+        self._worker.daemon = True
+        self._worker.start()
+        if self.useProcess:
+            self._childConn.close()
+
+    def poll(self):
+        """ Returns the events received since the last call, the records
+            of a child process are also handed to the logger
+            self.result is set once the job ended
+        """
+        events = []
+        try :
+            while self.result is None and self._conn.poll():
+                event = self._conn.recv()
+                if event[0] == 'log' and self.useProcess:
+                    self.logger.handle(event[1])
+                elif event[0] == 'result':
+                    self.result = event[1]
+                    if self.useProcess and event[2] is not None:
+                        self.job.portStats.restore(self.job.port, event[2])
+                    event = event[:2]
+                events.append(event)
+        except (EOFError, IOError):
+            self.result = dict(self.job.result, status='failed', error="Serial worker ended unexpectedly")
+            self.logger.error("{}: {}".format(self.job.port, self.result['error']))
+            events.append(('result', self.result))
+        return events
+
+    def done(self):
+        return self.result is not None
+
+    def cancel(self):
+        """ Asks the job to stop, it ends with a 'cancelled' result
+        """
+        try :
+            self._conn.send('cancel')
+        except (EOFError, IOError):
+            pass
+
+    def stop(self, timeout=5.0):
+        """ Cancels the job and waits for it to end
+        """
+        if not self._worker:
+            return
+        self.cancel()
+        self._worker.join(timeout)
+        if self.useProcess and self._worker.is_alive():
+            self.logger.warning("{}: Serial worker not ending, terminating it".format(self.job.port))
+            self._worker.terminate()
+
+    def _send(self, *event):
+        with self._sendLock:
+            self._childConn.send(event)
+
+    def _child(self):
+        """ Runs in the child process
+        """
+        self._conn.close()
+        # another thread of the parent may have held the logging lock or the
+        # port stats lock when forking, neither is taken here: the handlers
+        # of the parent (and their threads) are dropped without removeHandler()
+        # and the job gets the copy of the port stats made by start()
+        for logger in (logging.root, self.logger, self.job.logger):
+            logger.handlers = []
+        self.job.logger.handlers = [self._handler]
+        self.job.logger.propagate = False
+        self.job.portStats = self._portStats
+        if self.wireRecorder:
+            base, ext = os.path.splitext(self.wireRecorder.fileName)
+            self.wireRecorder.forked("{}-worker{}{}".format(base, os.getpid(), ext))
+        self._setPriority()
+        try :
+            self._run()
+        finally:
+            if self.wireRecorder:
+                self.wireRecorder.close()
+
+    def _setPriority(self):
+        if not self.priority or not hasattr(os, 'nice'):
+            return
+        try :
+            os.nice(-self.priority)
+        except OSError as e:
+            self._priorityError = e.strerror
+
+    def _run(self):
+        handler = None
+        if not self.useProcess:
+            # in a thread the records already reach the handlers, they are
+            # only sent so the events are the same as from a child process
+            handler = AsyncLog.QueueHandler(_PipeQueue(self._send))
+            handler.addFilter(_ThreadFilter())
+            self.job.logger.addHandler(handler)
+        if self.useProcess and self.wireRecorder:
+            self.job.logger.info("{}: Serial worker recording to {}".format(self.job.port, self.wireRecorder.fileName))
+        if self._priorityError:
+            self.job.logger.info("{}: Unable to raise the serial worker priority: {}".format(self.job.port, self._priorityError))
+
+        done = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(done,), name='SerialWorkerReport')
+        reporter.daemon = True
+        reporter.start()
+        try :
+            result = self.job.run()
+        except Exception as e:
+            self.job.logger.exception("{}: Serial worker failed".format(self.job.port))
+            result = dict(self.job.result, status='failed', error=str(e))
+        finally:
+            done.set()
+            reporter.join()
+            if handler:
+                self.job.logger.removeHandler(handler)
+
+        portStats = None
+        if self.useProcess and self.job.portStats:
+            portStats = self.job.portStats.export(self.job.port)
+        self._send('result', result, portStats)
+        self._childConn.close()
+
+    def _report(self, done):
+        """ Sends the progress of the job and passes a cancel on to it
+        """
+        last = None
+        while not done.wait(self.interval):
+            try :
+                if self._childConn.poll() and self._childConn.recv() == 'cancel':
+                    self.job.cancel()
+            except (EOFError, IOError):
+                self.job.cancel() #the GUI is gone
+                return
+            progress = (self.job.phase, self.job.progress(), self.job.result['totalLines'])
+            if progress != last:
+                self._send('progress', *progress)
+                last = progress
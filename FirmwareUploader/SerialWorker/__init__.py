@@ -0,0 +1,3 @@
+from SerialWorker import SerialWorker
+
+__ALL__ = ['SerialWorker']
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Trace Class
+    Fixed size ring buffer of protocol events used by the AT and FW classes
+    Recording an event only stores an event code, a timestamp and two small
+    integers, the text is only formatted when the buffer is dumped
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+
+import sys
+import time
+from array import array
+
+_clock = getattr(time, 'monotonic', time.time)
+
+class Trace():
+    """ Always on, fixed size, in memory trace of protocol events
+    """
+
+    NONE = -1 #argument used when nothing was received
+
+    # event codes
+    AT_ENTER = 1
+    AT_SEND = 2
+    AT_WAIT_OK = 3
+    AT_OK = 4
+    AT_ERR = 5
+    AT_TIMEOUT = 6
+    AT_RESPONSE = 7
+    AT_LINE = 8
+    FW_SEND = 20
+    FW_RECEIVED = 21
+    FW_READY = 22
+    FW_RECORD = 23
+    FW_ACK = 24
+    FW_NAK = 25
+    FW_UNEXPECTED = 26
+    FW_PROGRESS = 27
+    FW_COMMIT = 28
+    FW_RETRY = 29
+    FW_RESYNC = 30
+    FW_GIVE_UP = 31
+    FW_RESET = 32
+
+    # how each event is shown when dumped
+    # {s} is an interned string argument, {c} a received character
+    _formats = {
+        AT_ENTER: "AT: Enter Command Mode (try {a})",
+        AT_SEND: "AT: Send command: {s}",
+        AT_WAIT_OK: "AT: Wait for OK",
+        AT_OK: "AT: Got OK",
+        AT_ERR: "AT: Got ERR",
+        AT_TIMEOUT: "AT: OK timed out",
+        AT_RESPONSE: "AT: Got response: {s}",
+        AT_LINE: "AT: AT line set to {a}",
+        FW_SEND: "FW: Sent {s}",
+        FW_RECEIVED: "FW: Received {c}",
+        FW_READY: "FW: Got R for line {a}",
+        FW_RECORD: "FW: Sent line {a}",
+        FW_ACK: "FW: Got A for line {a}",
+        FW_NAK: "FW: Got {c} for line {b}",
+        FW_UNEXPECTED: "FW: Received {c} at line {b}",
+        FW_PROGRESS: "FW: {a}% Completed",
+        FW_COMMIT: "FW: Commit sent",
+        FW_RETRY: "FW: Retry {a} of line {b}",
+        FW_RESYNC: "FW: Waiting for R to resend line {a}",
+        FW_GIVE_UP: "FW: Giving up on line {a} after {b} retries this session",
+        FW_RESET: "FW: Reset into the bootloader by the reset line",
+    }
+
+    def __init__(self, size=4096):
+        self._size = size
+        self._codes = array('H', [0]) * size
+        self._times = array('d', [0.0]) * size
+        self._argsA = array('l', [0]) * size
+        self._argsB = array('l', [0]) * size
+        self._count = 0
+        self._counts = array('L', [0]) * 64 #events recorded per code, never dropped
+        self._strings = {}
+        self._stringList = []
+
+    def record(self, code, a=0, b=0):
+        """ Stores one event, overwriting the oldest one when full
+        """
+        i = self._count % self._size
+        self._codes[i] = code
+        self._times[i] = _clock()
+        self._argsA[i] = a
+        self._argsB[i] = b
+        self._count += 1
+        self._counts[code] += 1
+
+    def intern(self, text):
+        """ Returns a small int standing for text
+            to be passed as an event argument
+        """
+        try:
+            return self._strings[text]
+        except KeyError:
+            self._stringList.append(text)
+            self._strings[text] = len(self._stringList) - 1
+            return self._strings[text]
+
+    def char(self, data):
+        """ Returns a received character as an event argument
+        """
+        if data:
+            return ord(data[0])
+        return self.NONE
+
+    def count(self, code):
+        """ Returns how many events of a code were recorded
+            since the trace was created or cleared
+        """
+        return self._counts[code]
+
+    def deviceAnswered(self):
+        """ Returns True when the device answered since the trace was
+            created or cleared: an AT OK, ERR or response, or a bootloader
+            prompt, acknowledgement or reply
+        """
+        if any(self._counts[code] for code in (self.AT_OK, self.AT_ERR, self.AT_RESPONSE,
+                                               self.FW_READY, self.FW_ACK, self.FW_NAK)):
+            return True
+        if not self._counts[self.FW_RECEIVED]: #a bootloader probe, answered or not
+            return False
+        for n in range(max(0, self._count - self._size), self._count):
+            i = n % self._size
+            if self._codes[i] == self.FW_RECEIVED and self._argsA[i] != self.NONE:
+                return True
+        return False
+
+    def clear(self):
+        self._count = 0
+        self._counts = array('L', [0]) * 64
+
+    def _formatArg(self, value, isString=False):
+        if isString:
+            if 0 <= value < len(self._stringList):
+                return repr(self._stringList[value])
+            return '?'
+        if value == self.NONE:
+            return 'nothing'
+        return repr(chr(value & 0xFF))
+
+    def format(self):
+        """ Returns the buffer contents, oldest first, as text lines
+        """
+        lines = []
+        first = max(0, self._count - self._size)
+        if first:
+            lines.append("... {} older events dropped".format(first))
+        start = None
+        for n in range(first, self._count):
+            i = n % self._size
+            if start is None:
+                start = self._times[i]
+            code = self._codes[i]
+            a = self._argsA[i]
+            b = self._argsB[i]
+            text = self._formats.get(code, "Event {} ({}, {})".format(code, a, b)).format(
+                        a=a, b=b,
+                        s=self._formatArg(a, True),
+                        c=self._formatArg(a))
+            lines.append("{:10.4f} {}".format(self._times[i] - start, text))
+        return lines
+
+    def dump(self, stream=sys.stderr):
+        """ Writes the buffer as human readable text
+        """
+        stream.write("Protocol trace:\n")
+        for line in self.format():
+            stream.write(line + "\n")
+
+    def log(self, logger):
+        """ Sends the buffer to a logger as error messages
+        """
+        logger.error("Protocol trace:\n" + "\n".join(self.format()))
@@ -0,0 +1,3 @@
+from Trace import Trace
+
+__ALL__ = ['Trace']
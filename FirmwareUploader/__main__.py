@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" FirmwareUploader entry point
+    Runs the wizard, or the headless tools when the first argument is
+    --noUI, --daemon or --inventory, without starting a second interpreter
+
+        $ python FirmwareUploader
+        $ python FirmwareUploader --noUI -D /dev/ttyAMA0 -f firmware.bin
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+import os
+import sys
+
+def main():
+    packageDir = os.path.dirname(os.path.abspath(__file__))
+    if packageDir not in sys.path:
+        sys.path.insert(0, packageDir)
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else None
+    if mode == '--noUI':
+        del sys.argv[1]
+        import FirmwareUploader_noUI
+        app = FirmwareUploader_noUI.FWUploader()
+    elif mode == '--daemon':
+        del sys.argv[1]
+        import FirmwareUploader_daemon
+        app = FirmwareUploader_daemon.FWDaemon()
+    elif mode == '--inventory':
+        del sys.argv[1]
+        import FirmwareUploader_inventory
+        app = FirmwareUploader_inventory.FWInventory()
+    else:
+        import FirmwareUploader
+        app = FirmwareUploader.FirmwareUploader()
+    app.on_execute()
+
+if __name__ == "__main__":
+    main()
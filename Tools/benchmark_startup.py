@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Startup benchmark
+    Measures how long the headless uploader takes to import, over a bare
+    interpreter start, and checks the modules only needed by the GUI or by
+    catalog downloads are not loaded. Exits with 1 if the budget is exceeded
+
+        $ python Tools/benchmark_startup.py --runs 20 --budget 0.15
+
+    Copyright 2016 Ciseco Ltd.
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+
+"""
+import os
+import sys
+import argparse
+import subprocess
+from time import time
+
+PACKAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'FirmwareUploader')
+
+# modules the headless uploader must not import at startup
+LAZY = ['Tkinter', 'ttk', 'tkMessageBox', 'urllib2', 'httplib', 'ssl', 'json', 'csv', 'ConfigParser']
+
+HEADLESS = """
+import sys
+sys.path.insert(0, {!r})
+import FirmwareUploader_noUI
+print(','.join(m for m in {!r} if m in sys.modules))
+""".format(PACKAGE, LAZY)
+
+def timeRun(code):
+    started = time()
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return time() - started, output.strip()
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless startup benchmark")
+    parser.add_argument("-r", "--runs", type=int, default=10,
+                        help="Number of interpreter starts to measure")
+    parser.add_argument("-b", "--budget", type=float, default=0.15,
+                        help="Maximum import time in seconds, over a bare interpreter start")
+    args = parser.parse_args()
+
+    baseline = median([timeRun('pass')[0] for r in range(args.runs)])
+    runs = [timeRun(HEADLESS) for r in range(args.runs)]
+    headless = median([t for t, loaded in runs])
+    loaded = runs[-1][1]
+
+    overhead = headless - baseline
+    print("Interpreter start:    {:.3f}s".format(baseline))
+    print("Headless uploader:    {:.3f}s".format(headless))
+    print("Import overhead:      {:.3f}s (budget {:.3f}s)".format(overhead, args.budget))
+
+    failed = False
+    if loaded:
+        print("Loaded at startup:    {}".format(loaded))
+        failed = True
+    if overhead > args.budget:
+        print("Over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()